@@ -1,5 +1,12 @@
 import dash
+import flask
 import dash_bootstrap_components as dbc
+from common.cache import FigureCache
+from common.compression import PayloadCompressor
+from common.database import Database
+from common.instrumentation import CallbackMetrics, prometheus_lines
+from models.pipeline import current_pipeline, reloader
+from models.source import DataSource
 
 
 external_stylesheets = [dbc.themes.BOOTSTRAP]
@@ -11,4 +18,36 @@ app = dash.Dash(__name__,
                 ],
                 suppress_callback_exceptions=True)
 
-# server = app.server
+server = app.server
+
+# per-callback phase timings, wraps every app.callback registered by the apps
+CallbackMetrics.instrument(app)
+
+# br/gzip callback and layout responses, repeated payloads are encoded once per worker
+PayloadCompressor.init_app(server)
+
+# model frames preloaded and reloaded by a watcher thread per worker, started on the worker's first request
+reloader.init_app(server)
+
+# figure JSON shared by every worker, keyed on the version of the data the figures are built from
+FigureCache.init_app(server, version=lambda: current_pipeline().version)
+
+
+# health check for the load balancer: Mongo round trip plus this worker's connection pool counters
+# (no round trip when DATA_BACKEND reads local files)
+@server.route('/health')
+def health():
+    mongo = Database.ping() if DataSource.uses_mongo() else None
+    body = {'mongo': mongo, 'pool': Database.pool_stats(), 'figure_cache': FigureCache.snapshot(),
+            'data_backend': DataSource.backend(), 'data_version': current_pipeline().version}
+    return flask.jsonify(body), 200 if mongo is None or mongo['ok'] else 503
+
+
+# Prometheus scrape target, counters are per worker process and labeled with its pid; callback counters are
+# summed over every worker with METRICS_DIR
+@server.route('/metrics')
+def metrics():
+    extra = prometheus_lines('mongo_pool', Database.pool_stats()) + \
+        prometheus_lines('figure_cache', FigureCache.snapshot()) + \
+        prometheus_lines('response_compression', PayloadCompressor.snapshot())
+    return flask.Response(CallbackMetrics.prometheus(extra), mimetype='text/plain; version=0.0.4')
@@ -1,53 +1,79 @@
-import json
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output, State
+from dash.dependencies import ClientsideFunction, Input, Output, State
 
 import dash_table
 from dash_table.Format import Format
 import dash_table.FormatTemplate as FormatTemplate
 import plotly.express as px
 
+from common.cache import FigureCache
+from common.downsample import RESOLUTIONS, default_date_range, downsample_frame, target_points
+from common.figures import CLIENTSIDE_METRICS, compact_figure, metric_variants
+from common.geojson import GeoJson
+from common.instrumentation import CallbackMetrics
 from models.covid_counties import CovidCounties
-from models.stats import Stats
+from models.pipeline import current_pipeline
 
 from app import app
 
-# build base dataframes
-df_complete_counties_agg = CovidCounties.agg_complete_counties()
-df_counties_ts = CovidCounties.ts_complete_counties()
-df_state_location = Stats.states_stats()
+# approximate pixel width of the half-width county line chart
+LINE_CHART_WIDTH = 700
+
+METRIC_OPTIONS = [
+    {'label': 'Confirmed Cases', 'value': 'confirmed'},
+    {'label': 'Deaths', 'value': 'deaths'},
+    {'label': 'Cases per 1000', 'value': 'Cases per 1000'},
+    {'label': 'Death Rate (%)', 'value': 'Death Rate (%)'},
+    {'label': 'New Cases (7-day avg)', 'value': 'New Cases (7-day avg)'},
+    {'label': 'New Deaths (7-day avg)', 'value': 'New Deaths (7-day avg)'},
+    {'label': 'New Cases per 100k (7-day avg)', 'value': 'New Cases per 100k (7-day avg)'},
+]
 
 
 # ---------------- Section 1: Define functions to generate Dash figures and datatables ------------------ #
 
 def create_us_bubble_map_counties(metric_name):
-    # remove counties without lat and long
-    df_counties = df_complete_counties_agg[
-        (df_complete_counties_agg['Lat'] != 0) & (df_complete_counties_agg['Lat'] != 0)]
+    with CallbackMetrics.phase('data'):
+        df_complete_counties_agg = current_pipeline().get('counties_agg')
+
+        # remove counties without lat and long
+        df_counties = df_complete_counties_agg[
+            (df_complete_counties_agg['Lat'] != 0) & (df_complete_counties_agg['Lat'] != 0)]
+        # formatted hover columns are only built for the plotted rows
+        df_counties = CovidCounties.display_columns(df_counties)
+
+        hover_data = {'Confirmed Cases': True,
+                      'Deaths': True,
+                      'Death Rate (%)': True,
+                      'Cases per 1000': True,
+                      'Est Pop': True,
+                      'confirmed': False,
+                      'Lat': False,
+                      'Long_': False,
+                      'deaths': False}
+
+        # bubbles cannot be negative or missing in size, like a daily series after a correction of the source
+        size_name = metric_name
+        if df_counties[metric_name].min() < 0 or df_counties[metric_name].isnull().any():
+            size_name = 'bubble size'
+            df_counties[size_name] = df_counties[metric_name].clip(lower=0).fillna(0)
+            hover_data[size_name] = False
 
     # create figure
     fig = px.scatter_mapbox(df_counties,
                             lat = 'Lat',
                             lon = 'Long_',
                             color = metric_name,
-                            size = metric_name,
+                            size = size_name,
                             mapbox_style = 'carto-positron',
                             color_continuous_scale = px.colors.diverging.balance,
                             size_max = 80,
                             zoom = 3.2,
                             center = {"lat": 37.0002, "lon": -95.7129},
                             opacity = 0.5,
-                            hover_data = {'Confirmed Cases': True,
-                                          'Deaths': True,
-                                          'Death Rate (%)': True,
-                                          'Cases per 1000': True,
-                                          'Est Pop': True,
-                                          'confirmed': False,
-                                          'Lat': False,
-                                          'Long_': False,
-                                          'deaths': False},
+                            hover_data = hover_data,
                             hover_name = 'County-State',
                             labels = {'confirmed': 'Cases'})
 
@@ -57,10 +83,12 @@ def create_us_bubble_map_counties(metric_name):
         height = 600
     )
 
-    return fig
+    return compact_figure(fig)
 
 
 def create_state_map_counties(state_name, metric_name):
+    state_index = current_pipeline().get('state_index')
+
     if state_name == 'Alaska':
         zoom_num = 2.7
     elif state_name in ['California', 'Texas']:
@@ -76,40 +104,29 @@ def create_state_map_counties(state_name, metric_name):
     else:
         zoom_num = 5.2
 
-    # grab geojson for US counties
-    jsonfile = open('data/geojson/us-counties-fips-geojson.json', 'r')
-    counties_json = json.loads(jsonfile.read())
-
-    # df_state_location for lat and lon per state
-    lat = df_state_location[df_state_location['State/Territory'] == state_name]['lat'].iloc[0]
-    lon = df_state_location[df_state_location['State/Territory'] == state_name]['lon'].iloc[0]
-
-    # Grab the state FIPS with most count if there are more than one state FIPS per state
-    if state_name == 'District of Columbia':
-        max_state_fips = '11'
-    else:
-        state_fips = df_complete_counties_agg[df_complete_counties_agg['State/Territory'] == state_name][
-            'State FIPS'].value_counts()
-        max_state_fips = state_fips.idxmax()
+    # lat and lon per state, the state FIPS most of its counties carry and the range_color of the metric,
+    # all precomputed per state when the model frames are built
+    with CallbackMetrics.phase('data'):
+        lat, lon = state_index.center(state_name)
+        max_state_fips = state_index.state_fips(state_name)
+        min_rcolor, max_rcolor = state_index.color_range(state_name, metric_name)
+        # geojson ids are zero-padded FIPS strings
+        df_state_counties = CovidCounties.display_columns(state_index.state_counties(state_name))
 
-    # define the start and end of range_color based on min and max confirmed cases per state
-    max_rcolor = df_complete_counties_agg[df_complete_counties_agg['State FIPS'] == max_state_fips][metric_name].max()
-    min_rcolor = df_complete_counties_agg[df_complete_counties_agg['State FIPS'] == max_state_fips][metric_name].min()
+    # county geojson of the state, parsed once per process and simplified for the zoom level
+    with CallbackMetrics.phase('geojson'):
+        state_geojson = GeoJson.state_counties(max_state_fips, zoom_num)
 
-    # parsing geojson models per state
-    state_counties = [county for county in counties_json['features'] if county['id'][:2] == max_state_fips]
-    state_geojson = {'type': 'FeatureCollection', 'features': state_counties}
-
-    fig = px.choropleth_mapbox(df_complete_counties_agg[df_complete_counties_agg['State/Territory'] == state_name],
+    fig = px.choropleth_mapbox(df_state_counties,
                                geojson = state_geojson,
-                               locations = 'FIPS',
+                               locations = 'FIPS Code',
                                mapbox_style = 'carto-positron',
                                zoom = zoom_num,
                                color = metric_name,
                                color_continuous_scale = 'matter',
                                range_color = (min_rcolor, max_rcolor),
                                hover_name = 'State/Territory',
-                               hover_data = {'County': True, 'confirmed': True, 'Est Pop': True, 'FIPS': False},
+                               hover_data = {'County': True, 'confirmed': True, 'Est Pop': True, 'FIPS Code': False},
                                center = {"lat": lat, "lon": lon},
                                opacity = 0.5,
                                labels = {'confirmed': 'Cases', 'deaths': 'Deaths'})
@@ -119,10 +136,10 @@ def create_state_map_counties(state_name, metric_name):
         height = 700,
     )
 
-    return fig
+    return compact_figure(fig)
 
 
-def create_state_line_counties(state_name, metric_name):
+def create_state_line_counties(state_name, metric_name, resolution='D', start_date=None, end_date=None):
     if metric_name == 'confirmed':
         metric_name = 'Confirmed Cases'
     elif metric_name == 'deaths':
@@ -132,7 +149,17 @@ def create_state_line_counties(state_name, metric_name):
     else:
         metric_name = metric_name
 
-    fig = px.line(df_counties_ts[df_counties_ts['State/Territory'] == state_name], x = 'Date', y = metric_name,
+    # long frame only for the state's rows and picked dates of the county x day matrices, one date per period;
+    # daily series are sliced from the ones computed over the whole history
+    with CallbackMetrics.phase('data'):
+        county_matrix = current_pipeline().get('county_matrix').between(start_date, end_date).resample(resolution)
+        daily_metrics = [metric_name] if metric_name in county_matrix.DAILY_METRICS \
+            or metric_name in county_matrix.PER_100K_METRICS else []
+        df_state_counties_ts = county_matrix.long_frame(county_matrix.state_rows(state_name), daily_metrics)
+        df_state_counties_ts = downsample_frame(df_state_counties_ts, 'FIPS', 'Date', metric_name,
+                                                target_points(LINE_CHART_WIDTH))
+
+    fig = px.line(df_state_counties_ts, x = 'Date', y = metric_name,
                   color = 'County',
                   labels = {
                       "Confirmed Cases": "Confirmed Cases (Cumulative)",
@@ -146,175 +173,225 @@ def create_state_line_counties(state_name, metric_name):
         margin = dict(l=50, r=50, b=0, t=0)
     )
 
-    return fig
+    return compact_figure(fig)
 
 
 def create_state_datatable_counties(state_name):
-    df_counties_data_table = df_complete_counties_agg[
-                                 df_complete_counties_agg['State/Territory'] == state_name
-                                 ].loc[:, ['County-State',
-                                           'confirmed',
-                                           'deaths',
-                                           'Death Rate (%)',
-                                           'Population',
-                                           'Cases per 1000']]
-    df_counties_data_table['Death Rate (%)'] = df_counties_data_table['Death Rate (%)'].div(100)
+    with CallbackMetrics.phase('data'):
+        state_index = current_pipeline().get('state_index')
+        df_counties_data_table = state_index.state_counties(state_name).loc[:, ['County-State',
+                                                                                'confirmed',
+                                                                                'deaths',
+                                                                                'Death Rate (%)',
+                                                                                'Population',
+                                                                                'Cases per 1000']]
+        df_counties_data_table['Death Rate (%)'] = df_counties_data_table['Death Rate (%)'].div(100)
 
     return df_counties_data_table
 
 
 # ---------------- Section 2: Create Dash layout object ------------------ #
 
-layout = html.Div([
-    html.Br(),
-    # row with one column and column contains a div with dropdown
-    dbc.Row(
-        dbc.Col(
-            html.Div([
-                dcc.Dropdown(
-                    id = 't2_covid_us_map_dropdown',
-                    options = [
-                        {'label': 'Confirmed Cases', 'value': 'confirmed'},
-                        {'label': 'Deaths', 'value': 'deaths'},
-                        {'label': 'Cases per 1000', 'value': 'Cases per 1000'},
-                        {'label': 'Death Rate (%)', 'value': 'Death Rate (%)'},
-                    ],
-                    value = 'confirmed',
-                    clearable = False
-                )
-            ], style = {'padding-left': '20px', 'padding-right': '20px'}),
-            lg = 3
-        )
-    ),
-    # row with one column and column contains one div with graph
-    dbc.Row(
-        dbc.Col(
-            html.Div([
-                dcc.Graph(
-                    id = 't2_covid_counties_heatmap',
-                    figure = create_us_bubble_map_counties('confirmed')
-                )
-            ])
-        )
-    ),
-    html.Br(),
-    html.Hr(),
-    html.Br(),
-    # row with three columns and each column as a div with dropdown
-    dbc.Row([
-        dbc.Col(
-            html.Div([
-                dcc.Dropdown(
-                    id = 't2_geo_select_state_show_counties',
-                    options = [{'label': i, 'value': i} for i in df_state_location['State/Territory'].unique()],
-                    value = 'California',
-                    clearable = False
-                )
-            ], style = {'padding-left': '20px', 'padding-right': '20px'}),
-            lg = 3
+def create_layout():
+    # figures and the counties datatable are left empty, their callbacks fill them when the tab first renders
+    df_state_location = current_pipeline().get('states_stats')
+    dates = current_pipeline().get('county_matrix').dates
+    start_date, end_date = default_date_range(dates)
+
+    return html.Div([
+        # every metric's bubble map for the clientside metric switch
+        html.Div([dcc.Store(id = 't2_covid_counties_heatmap_store')] if CLIENTSIDE_METRICS else []),
+        html.Br(),
+        # row with one column and column contains a div with dropdown
+        dbc.Row(
+            dbc.Col(
+                html.Div([
+                    dcc.Dropdown(
+                        id = 't2_covid_us_map_dropdown',
+                        options = METRIC_OPTIONS,
+                        value = 'confirmed',
+                        clearable = False
+                    )
+                ], style = {'padding-left': '20px', 'padding-right': '20px'}),
+                lg = 3
+            )
         ),
-        # div 4
-        dbc.Col(
-            html.Div([
-                dcc.Dropdown(
-                    id = 't2_select_metric_show_counties',
-                    options = [
-                        {'label': 'Confirmed Cases', 'value': 'confirmed'},
-                        {'label': 'Deaths', 'value': 'deaths'},
-                        {'label': 'Cases per 1000', 'value': 'Cases per 1000'},
-                        {'label': 'Death Rate (%)', 'value': 'Death Rate (%)'},
-                    ],
-                    value = 'confirmed',
-                    clearable = False
-                )
-            ], style = {'padding-left': '20px', 'padding-right': '20px'}),
-            lg = 3
+        # row with one column and column contains one div with graph
+        dbc.Row(
+            dbc.Col(
+                html.Div([
+                    dcc.Graph(
+                        id = 't2_covid_counties_heatmap'
+                    )
+                ])
+            )
         ),
-        # div 5
-        dbc.Col(
-            html.Div([
-                dbc.Button(
-                    'Submit',
-                    id = 't2_submit_button',
-                    n_clicks = 0,
-                    color = 'secondary',
-                    className = 'mr-1'
-                )
-            ], style = {'padding-left': '20px', 'padding-right': '20px'}),
-            lg = 3
-        )
-    ]),
-    html.Br(),
-    # row with two columns and each column contains a graph with xl=6
-    dbc.Row([
-        dbc.Col(
-            dcc.Graph(
-                id = 't2_geo_state_map_show_counties',
-                figure = create_state_map_counties('California', 'confirmed')
+        html.Br(),
+        html.Hr(),
+        html.Br(),
+        # row with three columns and each column as a div with dropdown
+        dbc.Row([
+            dbc.Col(
+                html.Div([
+                    dcc.Dropdown(
+                        id = 't2_geo_select_state_show_counties',
+                        options = [{'label': i, 'value': i} for i in df_state_location['State/Territory'].unique()],
+                        value = 'California',
+                        clearable = False
+                    )
+                ], style = {'padding-left': '20px', 'padding-right': '20px'}),
+                lg = 3
             ),
-            xl = 6,
-        ),
-        dbc.Col(
-            dcc.Graph(
-                id = 't2_select_state_line_chart',
-                figure = create_state_line_counties('California', 'Confirmed Cases')
+            # div 4
+            dbc.Col(
+                html.Div([
+                    dcc.Dropdown(
+                        id = 't2_select_metric_show_counties',
+                        options = METRIC_OPTIONS,
+                        value = 'confirmed',
+                        clearable = False
+                    )
+                ], style = {'padding-left': '20px', 'padding-right': '20px'}),
+                lg = 3
             ),
-            xl = 6,
-        )
-    ]),
-    html.Br(),
-    # row with one column and column contains datatable
-    dbc.Row(
-        dbc.Col(
-            dash_table.DataTable(
-                id = 't2_state_counties_datatable',
-                columns = [
-                    {'name': 'County', 'id': 'County-State'},
-                    {'name': 'Cases', 'id': 'confirmed', 'type': 'numeric', 'format': Format(group=',')},
-                    {'name': 'Deaths', 'id': 'deaths', 'type': 'numeric', 'format': Format(group=',')},
-                    {'name': 'Cases/1000', 'id': 'Cases per 1000', 'type': 'numeric', 'format': Format(group=',')},
-                    {'name': 'Death Rate', 'id': 'Death Rate (%)', 'type': 'numeric',
-                     'format': FormatTemplate.percentage(2)},
-                    {'name': 'Population', 'id': 'Population', 'type': 'numeric', 'format': Format(group=',')},
-                ],
-                style_table = {'padding-left': 50, 'padding-right': 50, 'overflowX': 'auto'},
-                data = create_state_datatable_counties('California').to_dict('records'),
-                sort_action = 'native',
-                style_cell = {'fontSize': 14, 'textAlign': 'left'},
-                style_header = {
-                    'backgroundColor': 'rgb(230, 230, 230)',
-                    'fontWeight': 'bold'
-                }
+            # line chart resolution
+            dbc.Col(
+                html.Div([
+                    dcc.Dropdown(
+                        id = 't2_line_resolution_dropdown',
+                        options = RESOLUTIONS,
+                        value = 'D',
+                        clearable = False
+                    )
+                ], style = {'padding-left': '20px', 'padding-right': '20px'}),
+                lg = 2
+            ),
+            # line chart dates, the last LINE_CHART_DAYS days when the tab opens
+            dbc.Col(
+                html.Div([
+                    dcc.DatePickerRange(
+                        id = 't2_line_date_range',
+                        min_date_allowed = dates[0].strftime('%Y-%m-%d'),
+                        max_date_allowed = dates[-1].strftime('%Y-%m-%d'),
+                        start_date = start_date,
+                        end_date = end_date,
+                        display_format = 'MMM D, YYYY'
+                    )
+                ], style = {'padding-left': '20px', 'padding-right': '20px'}),
+                lg = 4
+            ),
+            # div 5
+            dbc.Col(
+                html.Div([
+                    dbc.Button(
+                        'Submit',
+                        id = 't2_submit_button',
+                        n_clicks = 0,
+                        color = 'secondary',
+                        className = 'mr-1'
+                    )
+                ], style = {'padding-left': '20px', 'padding-right': '20px'}),
+                lg = 3
             )
-        )
-    ),
-    # row with one column and column contains a div with markdown and div styling
-    dbc.Row(
-        dbc.Col(
-            html.Div(
-                dcc.Markdown('''
-                >
-                > The data powering the dashboard comes from [Johns Hopkins CSSE](https://github.com/CSSEGISandData/COVID-19)
-                > and [U.S. Census](https://www.census.gov). The U.S. COVID-19 metrics dashboard is only for educational purposes.
-                > This dashboard is not be used for any medical reasons and contents should not be interpreted as professional or medical guidance.
-                >
-                '''),
-                style = {'marginLeft': 40, 'marginRight': 40, 'marginTop': 60, 'marginBottom': 40,
-                         'textAlign': 'left', 'padding': '6px 0px 0px 8px', 'border': 'thin grey dashed'}
+        ]),
+        html.Br(),
+        # row with two columns and each column contains a graph with xl=6
+        dbc.Row([
+            dbc.Col(
+                dcc.Graph(
+                    id = 't2_geo_state_map_show_counties'
+                ),
+                xl = 6,
+            ),
+            dbc.Col(
+                dcc.Graph(
+                    id = 't2_select_state_line_chart'
+                ),
+                xl = 6,
+            )
+        ]),
+        html.Br(),
+        # row with one column and column contains datatable
+        dbc.Row(
+            dbc.Col(
+                dash_table.DataTable(
+                    id = 't2_state_counties_datatable',
+                    columns = [
+                        {'name': 'County', 'id': 'County-State'},
+                        {'name': 'Cases', 'id': 'confirmed', 'type': 'numeric', 'format': Format(group=',')},
+                        {'name': 'Deaths', 'id': 'deaths', 'type': 'numeric', 'format': Format(group=',')},
+                        {'name': 'Cases/1000', 'id': 'Cases per 1000', 'type': 'numeric', 'format': Format(group=',')},
+                        {'name': 'Death Rate', 'id': 'Death Rate (%)', 'type': 'numeric',
+                         'format': FormatTemplate.percentage(2)},
+                        {'name': 'Population', 'id': 'Population', 'type': 'numeric', 'format': Format(group=',')},
+                    ],
+                    style_table = {'padding-left': 50, 'padding-right': 50, 'overflowX': 'auto'},
+                    sort_action = 'native',
+                    style_cell = {'fontSize': 14, 'textAlign': 'left'},
+                    style_header = {
+                        'backgroundColor': 'rgb(230, 230, 230)',
+                        'fontWeight': 'bold'
+                    }
+                )
+            )
+        ),
+        # row with one column and column contains a div with markdown and div styling
+        dbc.Row(
+            dbc.Col(
+                html.Div(
+                    dcc.Markdown('''
+                    >
+                    > The data powering the dashboard comes from [Johns Hopkins CSSE](https://github.com/CSSEGISandData/COVID-19)
+                    > and [U.S. Census](https://www.census.gov). The U.S. COVID-19 metrics dashboard is only for educational purposes.
+                    > This dashboard is not be used for any medical reasons and contents should not be interpreted as professional or medical guidance.
+                    >
+                    '''),
+                    style = {'marginLeft': 40, 'marginRight': 40, 'marginTop': 60, 'marginBottom': 40,
+                             'textAlign': 'left', 'padding': '6px 0px 0px 8px', 'border': 'thin grey dashed'}
+                )
             )
         )
-    )
-])
+    ])
+
+
+# layouts of the data version being served, built once per version
+_layouts = {}
+
+
+def serve_layout():
+    version = current_pipeline().version
+    layout = _layouts.get(version)
+    if layout is None:
+        layout = create_layout()
+        _layouts.clear()
+        _layouts[version] = layout
+    return layout
 
 
 # ---------------- Section 3: Define Dash callback functions ------------------ #
 
 # callback 1
-@app.callback(Output('t2_covid_counties_heatmap', 'figure'),
-              [Input('t2_covid_us_map_dropdown', 'value')])
-def update_bubble_heatmap_counties(selected_metric):
-    fig = create_us_bubble_map_counties(selected_metric)
-    return fig
+if CLIENTSIDE_METRICS:
+    # the dropdown's options are only a trigger for the tab's first render, the metrics are METRIC_OPTIONS
+    @app.callback(Output('t2_covid_counties_heatmap_store', 'data'),
+                  [Input('t2_covid_us_map_dropdown', 'options')])
+    @FigureCache.memoize(ignore=['options'])
+    def update_bubble_heatmap_counties_store(options):
+        return metric_variants({option['value']: create_us_bubble_map_counties(option['value'])
+                                for option in METRIC_OPTIONS})
+
+    app.clientside_callback(ClientsideFunction(namespace='metrics', function_name='apply'),
+                            Output('t2_covid_counties_heatmap', 'figure'),
+                            [Input('t2_covid_us_map_dropdown', 'value'),
+                             Input('t2_covid_counties_heatmap_store', 'data')])
+
+else:
+    @app.callback(Output('t2_covid_counties_heatmap', 'figure'),
+                  [Input('t2_covid_us_map_dropdown', 'value')])
+    @FigureCache.memoize()
+    def update_bubble_heatmap_counties(selected_metric):
+        fig = create_us_bubble_map_counties(selected_metric)
+        return fig
 
 
 # callback 2
@@ -322,6 +399,7 @@ def update_bubble_heatmap_counties(selected_metric):
               [Input('t2_submit_button', 'n_clicks')],
               [State('t2_geo_select_state_show_counties', 'value'),
                State('t2_select_metric_show_counties', 'value')])
+@FigureCache.memoize(ignore=['n_clicks'])
 def update_state_counties_map(n_clicks, state_name, metric_name):
     fig = create_state_map_counties(state_name, metric_name)
     return fig
@@ -329,11 +407,15 @@ def update_state_counties_map(n_clicks, state_name, metric_name):
 
 # callback 3
 @app.callback(Output('t2_select_state_line_chart', 'figure'),
-              [Input('t2_submit_button', 'n_clicks')],
+              [Input('t2_submit_button', 'n_clicks'),
+               Input('t2_line_resolution_dropdown', 'value'),
+               Input('t2_line_date_range', 'start_date'),
+               Input('t2_line_date_range', 'end_date')],
               [State('t2_geo_select_state_show_counties', 'value'),
                State('t2_select_metric_show_counties', 'value')])
-def update_state_counties_line(n_clicks, state_name, metric_name):
-    fig = create_state_line_counties(state_name, metric_name)
+@FigureCache.memoize(ignore=['n_clicks'])
+def update_state_counties_line(n_clicks, resolution, start_date, end_date, state_name, metric_name):
+    fig = create_state_line_counties(state_name, metric_name, resolution, start_date, end_date)
     return fig
 
 
@@ -341,6 +423,7 @@ def update_state_counties_line(n_clicks, state_name, metric_name):
 @app.callback(Output('t2_state_counties_datatable', 'data'),
               [Input('t2_submit_button', 'n_clicks')],
               [State('t2_geo_select_state_show_counties', 'value')])
+@FigureCache.memoize(ignore=['n_clicks'])
 def update_state_counties_datatable(n_clicks, state_name):
     data = create_state_datatable_counties(state_name)
     data_dict = data.to_dict('records')
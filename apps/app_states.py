@@ -1,36 +1,58 @@
-import json
 import plotly.express as px
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output
+from dash.dependencies import ClientsideFunction, Input, Output
 
 import dash_table
 from dash_table.Format import Format
 import dash_table.FormatTemplate as FormatTemplate
 
+from common.cache import FigureCache
+from common.downsample import RESOLUTIONS, default_date_range, downsample_frame, resample_frame, target_points
+from common.figures import CLIENTSIDE_METRICS, compact_figure, metric_variants
+from common.geojson import GeoJson
+from common.instrumentation import CallbackMetrics
+from models.county_matrix import CountyMatrix
 from models.covid_states import CovidStates
+from models.pipeline import current_pipeline
 from app import app
 
+# approximate pixel width of the full-width states line chart
+LINE_CHART_WIDTH = 1400
 
-# initiate base dataframe builds
-df_states_ts = CovidStates.ts_complete_states()
-df_states_agg = CovidStates.agg_complete_states()
-df_snapshot = CovidStates.latest_national_snapshot()
+METRIC_OPTIONS = [
+    {'label': 'Confirmed Cases', 'value': 'confirmed'},
+    {'label': 'Deaths', 'value': 'deaths'},
+    {'label': 'Cases per 100k', 'value': 'cc_per_100k'},
+    {'label': 'Deaths per 100k', 'value': 'd_per_100k'},
+    {'label': 'Death Rate (%)', 'value': 'Death Rate (%)'},
+    {'label': 'New Cases', 'value': 'New Cases'},
+    {'label': 'New Deaths', 'value': 'New Deaths'},
+    {'label': 'New Cases (7-day avg)', 'value': 'New Cases (7-day avg)'},
+    {'label': 'New Deaths (7-day avg)', 'value': 'New Deaths (7-day avg)'},
+    {'label': 'New Cases (14-day avg)', 'value': 'New Cases (14-day avg)'},
+    {'label': 'New Deaths (14-day avg)', 'value': 'New Deaths (14-day avg)'},
+    {'label': 'New Cases per 100k (7-day avg)', 'value': 'New Cases per 100k (7-day avg)'},
+    {'label': 'New Deaths per 100k (7-day avg)', 'value': 'New Deaths per 100k (7-day avg)'},
+    {'label': 'Cases WoW Growth (%)', 'value': 'Cases WoW Growth (%)'},
+    {'label': 'Deaths WoW Growth (%)', 'value': 'Deaths WoW Growth (%)'},
+]
 
 
 # ---------------- Section 1: Define functions to generate Dash figures and datatables ------------------ #
 
 def create_us_heatmap_states(metric_name):
-    jsonfile = open('data/geojson/us-states-geojson.json', 'r')
-    states_geojson = json.loads(jsonfile.read())
-
+    # formatted hover columns are only built for the figure
+    with CallbackMetrics.phase('data'):
+        df_states_agg = CovidStates.display_columns(current_pipeline().get('states_agg'))
     fig = px.choropleth_mapbox(df_states_agg,
-                               geojson=states_geojson,
+                               geojson=GeoJson.states(),
                                locations='State FIPS',
                                color=metric_name,
                                color_continuous_scale='matter',
-                               range_color=(0, df_states_agg[metric_name].max()),
+                               # daily series and their growth can be negative
+                               range_color=(min(0, df_states_agg[metric_name].min()), df_states_agg[metric_name].max()),
                                mapbox_style='carto-positron',
                                zoom=3,
                                center={"lat": 37.0902, "lon": -95.7129},
@@ -56,11 +78,13 @@ def create_us_heatmap_states(metric_name):
         height = 600
     )
 
-    return fig
+    return compact_figure(fig)
 
 
 def create_states_bar_chart(metric_name):
-    df_states_agg['Death Rate (%)'] = df_states_agg['Death Rate (%)'].round(2)
+    with CallbackMetrics.phase('data'):
+        df_states_agg = current_pipeline().get('states_agg')
+        df_states_agg['Death Rate (%)'] = df_states_agg['Death Rate (%)'].round(2)
     fig = px.bar(df_states_agg,
                  y=metric_name,
                  x='State/Territory',
@@ -90,10 +114,10 @@ def create_states_bar_chart(metric_name):
         autosize = True
     )
 
-    return fig
+    return compact_figure(fig)
 
 
-def create_states_line_chart(metric_name):
+def create_states_line_chart(metric_name, resolution='D', start_date=None, end_date=None):
     if metric_name == 'confirmed':
         metric_name = 'Confirmed Cases'
     elif metric_name == 'deaths':
@@ -105,6 +129,16 @@ def create_states_line_chart(metric_name):
     else:
         metric_name = metric_name
 
+    # the picked dates, one point per period (daily counts summed over it) and at most a few points per pixel
+    # of the full-width chart
+    with CallbackMetrics.phase('data'):
+        df_states_ts = current_pipeline().get('states_ts')
+        df_states_ts = df_states_ts[CovidStates.date_mask(df_states_ts, start_date, end_date)]
+        summed = [metric_name] if metric_name in CountyMatrix.SUMMED_METRICS else []
+        df_states_ts = resample_frame(df_states_ts, 'Date', resolution, 'State/Territory', summed)
+        df_states_ts = downsample_frame(df_states_ts, 'State/Territory', 'Date', metric_name,
+                                        target_points(LINE_CHART_WIDTH))
+
     fig = px.line(df_states_ts, x='Date', y=metric_name, color='State/Territory',
                   labels={
                       "Confirmed Cases": "Confirmed Cases (Cumulative)",
@@ -121,10 +155,11 @@ def create_states_line_chart(metric_name):
         autosize = True
     )
 
-    return fig
+    return compact_figure(fig)
 
 
 def create_df_metric_datatable():
+    df_states_agg = current_pipeline().get('states_agg')
     df_states_data_table = df_states_agg.loc[:, ['State/Territory', 'confirmed', 'deaths',
                                                  'cc_per_100k', 'd_per_100k',
                                                  'Death Rate (%)', 'Population']]
@@ -135,202 +170,283 @@ def create_df_metric_datatable():
 
 # ---------------- Section 2: Create Dash layout object ------------------ #
 
-layout = html.Div([
-    html.Br(),
-    # row with six columns and each column contains a datatable with xl=2
-    dbc.Row([
-        dbc.Col(
-            dash_table.DataTable(
-                id='t1_national_datatable',
-                columns=[{"name": 'U.S. Population', "id": 'U.S. Population'}],
-                data = [{'U.S. Population': df_snapshot.loc[:, 'U.S. Population']}],
-                style_header = {'fontSize': 18, 'border': '1px solid white', 'color': 'lightslategray'},
-                style_cell = {'fontSize': 34, 'textAlign': 'center', 'fontWeight': 'bold', 'font-family': 'sans-serif', 'color': 'lightslategray'},
-                style_data={'border': '1px solid white'}
-            ), xl=2
+def create_layout():
+    # figures are left empty, their callbacks fill them when the tab first renders
+    df_snapshot = current_pipeline().get('national_snapshot')
+    dates = current_pipeline().get('county_matrix').dates
+    start_date, end_date = default_date_range(dates)
+
+    return html.Div([
+        # every metric's figure for the clientside metric switch
+        html.Div([dcc.Store(id='t1_covid_states_heatmap_store'),
+                  dcc.Store(id='t1_covid_states_bar_chart_store'),
+                  dcc.Store(id='t1_covid_states_line_chart_store')] if CLIENTSIDE_METRICS else []),
+        html.Br(),
+        # row with six columns and each column contains a datatable with xl=2
+        dbc.Row([
+            dbc.Col(
+                dash_table.DataTable(
+                    id='t1_national_datatable',
+                    columns=[{"name": 'U.S. Population', "id": 'U.S. Population'}],
+                    data = [{'U.S. Population': df_snapshot.loc[:, 'U.S. Population']}],
+                    style_header = {'fontSize': 18, 'border': '1px solid white', 'color': 'lightslategray'},
+                    style_cell = {'fontSize': 34, 'textAlign': 'center', 'fontWeight': 'bold', 'font-family': 'sans-serif', 'color': 'lightslategray'},
+                    style_data={'border': '1px solid white'}
+                ), xl=2
+            ),
+            dbc.Col(
+                dash_table.DataTable(
+                    id = 't1_national_datatable',
+                    columns = [{"name": 'Confirmed Cases', "id": 'Confirmed Cases'}],
+                    data = [{'Confirmed Cases': df_snapshot.loc[:, 'Confirmed Cases']}],
+                    style_header = {'fontSize': 18, 'border': '1px solid white', 'color': 'lightslategray'},
+                    style_cell = {'fontSize': 34, 'textAlign': 'center', 'fontWeight': 'bold', 'font-family': 'sans-serif',
+                                  'color': 'lightslategray'},
+                    style_data = {'border': '1px solid white'}
+                ), xl=2
+            ),
+            dbc.Col(
+                dash_table.DataTable(
+                    id = 't1_national_datatable',
+                    columns = [{"name": 'Deaths', "id": 'Deaths'}],
+                    data = [{'Deaths': df_snapshot.loc[:, 'Deaths']}],
+                    style_header = {'fontSize': 18, 'border': '1px solid white', 'color': 'lightslategray'},
+                    style_cell = {'fontSize': 34, 'textAlign': 'center', 'fontWeight': 'bold', 'font-family': 'sans-serif',
+                                  'color': 'lightslategray'},
+                    style_data = {'border': '1px solid white'}
+                ), xl=2
+            ),
+            dbc.Col(
+                dash_table.DataTable(
+                    id = 't1_national_datatable',
+                    columns = [{"name": 'Cases per 100k', "id": 'Cases per 100k'}],
+                    data = [{'Cases per 100k': df_snapshot.loc[:, 'Cases per 100k']}],
+                    style_header = {'fontSize': 18, 'border': '1px solid white', 'color': 'lightslategray'},
+                    style_cell = {'fontSize': 34, 'textAlign': 'center', 'fontWeight': 'bold', 'font-family': 'sans-serif',
+                                  'color': 'lightslategray'},
+                    style_data = {'border': '1px solid white'}
+                ), xl=2
+            ),
+            dbc.Col(
+                dash_table.DataTable(
+                    id = 't1_national_datatable',
+                    columns = [{"name": 'Deaths per 100k', "id": 'Deaths per 100k'}],
+                    data = [{'Deaths per 100k': df_snapshot.loc[:, 'Deaths per 100k']}],
+                    style_header = {'fontSize': 18, 'border': '1px solid white', 'color': 'lightslategray'},
+                    style_cell = {'fontSize': 34, 'textAlign': 'center', 'fontWeight': 'bold', 'font-family': 'sans-serif',
+                                  'color': 'lightslategray'},
+                    style_data = {'border': '1px solid white'}
+                ), xl=2
+            ),
+            dbc.Col(
+                dash_table.DataTable(
+                    id = 't1_national_datatable',
+                    columns = [{"name": 'Death Rate', "id": 'Death Rate'}],
+                    data = [{'Death Rate': df_snapshot.loc[:, 'Death Rate']}],
+                    style_header = {'fontSize': 18, 'border': '1px solid white', 'color': 'lightslategray'},
+                    style_cell = {'fontSize': 34, 'textAlign': 'center', 'fontWeight': 'bold', 'font-family': 'sans-serif',
+                                  'color': 'lightslategray'},
+                    style_data = {'border': '1px solid white'}
+                ), xl=2
+            )
+        ]),
+        html.Br(),
+        html.Br(),
+        # row with one column and column contains a div with dropdown
+        dbc.Row(
+            dbc.Col(
+                html.Div([
+                    dcc.Dropdown(
+                        id='t1_covid_metric_dropdown',
+                        options=METRIC_OPTIONS,
+                        value='confirmed',
+                        clearable=False)
+                ], style={'padding-left': '20px', 'padding-right': '20px', 'padding-bottom': '20px'}),
+                lg=3
+            )
         ),
-        dbc.Col(
-            dash_table.DataTable(
-                id = 't1_national_datatable',
-                columns = [{"name": 'Confirmed Cases', "id": 'Confirmed Cases'}],
-                data = [{'Confirmed Cases': df_snapshot.loc[:, 'Confirmed Cases']}],
-                style_header = {'fontSize': 18, 'border': '1px solid white', 'color': 'lightslategray'},
-                style_cell = {'fontSize': 34, 'textAlign': 'center', 'fontWeight': 'bold', 'font-family': 'sans-serif',
-                              'color': 'lightslategray'},
-                style_data = {'border': '1px solid white'}
-            ), xl=2
+        # row with one column and column contains a graph
+        dbc.Row(
+            dbc.Col(
+                dcc.Graph(id = 't1_covid_states_heatmap')
+            )
         ),
-        dbc.Col(
-            dash_table.DataTable(
-                id = 't1_national_datatable',
-                columns = [{"name": 'Deaths', "id": 'Deaths'}],
-                data = [{'Deaths': df_snapshot.loc[:, 'Deaths']}],
-                style_header = {'fontSize': 18, 'border': '1px solid white', 'color': 'lightslategray'},
-                style_cell = {'fontSize': 34, 'textAlign': 'center', 'fontWeight': 'bold', 'font-family': 'sans-serif',
-                              'color': 'lightslategray'},
-                style_data = {'border': '1px solid white'}
-            ), xl=2
+        # row with one column and column contains a graph
+        dbc.Row(
+            dbc.Col(
+                dcc.Graph(id='t1_covid_states_bar_chart',
+                          config={'displayModeBar': False, 'scrollZoom': False})
+            )
         ),
-        dbc.Col(
-            dash_table.DataTable(
-                id = 't1_national_datatable',
-                columns = [{"name": 'Cases per 100k', "id": 'Cases per 100k'}],
-                data = [{'Cases per 100k': df_snapshot.loc[:, 'Cases per 100k']}],
-                style_header = {'fontSize': 18, 'border': '1px solid white', 'color': 'lightslategray'},
-                style_cell = {'fontSize': 34, 'textAlign': 'center', 'fontWeight': 'bold', 'font-family': 'sans-serif',
-                              'color': 'lightslategray'},
-                style_data = {'border': '1px solid white'}
-            ), xl=2
+        html.Br(),
+        # row with two columns: line chart resolution dropdown and date range
+        dbc.Row([
+            dbc.Col(
+                html.Div([
+                    dcc.Dropdown(
+                        id='t1_line_resolution_dropdown',
+                        options=RESOLUTIONS,
+                        value='D',
+                        clearable=False)
+                ], style={'padding-left': '20px', 'padding-right': '20px', 'padding-bottom': '20px'}),
+                lg=2
+            ),
+            # line chart dates, the last LINE_CHART_DAYS days when the tab opens
+            dbc.Col(
+                html.Div([
+                    dcc.DatePickerRange(
+                        id='t1_line_date_range',
+                        min_date_allowed=dates[0].strftime('%Y-%m-%d'),
+                        max_date_allowed=dates[-1].strftime('%Y-%m-%d'),
+                        start_date=start_date,
+                        end_date=end_date,
+                        display_format='MMM D, YYYY')
+                ], style={'padding-left': '20px', 'padding-right': '20px', 'padding-bottom': '20px'}),
+                lg=4
+            )
+        ]),
+        # row with one column and column contains a graph
+        dbc.Row(
+            dbc.Col(
+                dcc.Graph(id = 't1_covid_states_line_chart',
+                          config = {'displayModeBar': False, 'scrollZoom': False})
+            )
         ),
-        dbc.Col(
-            dash_table.DataTable(
-                id = 't1_national_datatable',
-                columns = [{"name": 'Deaths per 100k', "id": 'Deaths per 100k'}],
-                data = [{'Deaths per 100k': df_snapshot.loc[:, 'Deaths per 100k']}],
-                style_header = {'fontSize': 18, 'border': '1px solid white', 'color': 'lightslategray'},
-                style_cell = {'fontSize': 34, 'textAlign': 'center', 'fontWeight': 'bold', 'font-family': 'sans-serif',
-                              'color': 'lightslategray'},
-                style_data = {'border': '1px solid white'}
-            ), xl=2
+        html.Hr(),
+        html.Br(),
+        dbc.Row(
+            dbc.Col(
+                html.Div([
+                    html.H2("U.S. States COVID-19 Summary")
+                    ], style={'padding-left': '20px', 'padding-right': '20px',
+                              'fontWeight': 'bold', 'font-family': 'sans-serif'}
+                ),
+                xl=6
+            )
         ),
-        dbc.Col(
-            dash_table.DataTable(
-                id = 't1_national_datatable',
-                columns = [{"name": 'Death Rate', "id": 'Death Rate'}],
-                data = [{'Death Rate': df_snapshot.loc[:, 'Death Rate']}],
-                style_header = {'fontSize': 18, 'border': '1px solid white', 'color': 'lightslategray'},
-                style_cell = {'fontSize': 34, 'textAlign': 'center', 'fontWeight': 'bold', 'font-family': 'sans-serif',
-                              'color': 'lightslategray'},
-                style_data = {'border': '1px solid white'}
-            ), xl=2
-        )
-    ]),
-    html.Br(),
-    html.Br(),
-    # row with one column and column contains a div with dropdown
-    dbc.Row(
-        dbc.Col(
-            html.Div([
-                dcc.Dropdown(
-                    id='t1_covid_metric_dropdown',
-                    options=[
-                        {'label': 'Confirmed Cases', 'value': 'confirmed'},
-                        {'label': 'Deaths', 'value': 'deaths'},
-                        {'label': 'Cases per 100k', 'value': 'cc_per_100k'},
-                        {'label': 'Deaths per 100k', 'value': 'd_per_100k'},
-                        {'label': 'Death Rate (%)', 'value': 'Death Rate (%)'},
+        html.Br(),
+        # row with one column and column contains a datatable
+        dbc.Row(
+            dbc.Col(
+                dash_table.DataTable(
+                    id = 't1_states_covid_summary',
+                    columns = [
+                        {'name': 'State/Territory', 'id': 'State/Territory'},
+                        {'name': 'Cases', 'id': 'confirmed', 'type': 'numeric', 'format': Format(group=',')},
+                        {'name': 'Deaths', 'id': 'deaths', 'type': 'numeric', 'format': Format(group=',')},
+                        {'name': 'Cases/100k', 'id': 'cc_per_100k', 'type': 'numeric', 'format': Format(group=',')},
+                        {'name': 'Deaths/100k', 'id': 'd_per_100k', 'type': 'numeric', 'format': Format(group=',')},
+                        {'name': 'Death Rate', 'id': 'Death Rate', 'type': 'numeric',
+                         'format': FormatTemplate.percentage(2)},
+                        {'name': 'Population', 'id': 'Population', 'type': 'numeric', 'format': Format(group=',')},
                     ],
-                    value='confirmed',
-                    clearable=False)
-            ], style={'padding-left': '20px', 'padding-right': '20px', 'padding-bottom': '20px'}),
-            lg=3
-        )
-    ),
-    # row with one column and column contains a graph
-    dbc.Row(
-        dbc.Col(
-            dcc.Graph(id = 't1_covid_states_heatmap',
-                      figure = create_us_heatmap_states('confirmed'))
-        )
-    ),
-    # row with one column and column contains a graph
-    dbc.Row(
-        dbc.Col(
-            dcc.Graph(id='t1_covid_states_bar_chart',
-                      figure=create_states_bar_chart('confirmed'),
-                      config={'displayModeBar': False, 'scrollZoom': False})
-        )
-    ),
-    html.Br(),
-    # row with one column and column contains a graph
-    dbc.Row(
-        dbc.Col(
-            dcc.Graph(id = 't1_covid_states_line_chart',
-                      figure = create_states_line_chart('Confirmed Cases'),
-                      config = {'displayModeBar': False, 'scrollZoom': False})
-        )
-    ),
-    html.Hr(),
-    html.Br(),
-    dbc.Row(
-        dbc.Col(
-            html.Div([
-                html.H2("U.S. States COVID-19 Summary")
-                ], style={'padding-left': '20px', 'padding-right': '20px',
-                          'fontWeight': 'bold', 'font-family': 'sans-serif'}
-            ),
-            xl=6
-        )
-    ),
-    html.Br(),
-    # row with one column and column contains a datatable
-    dbc.Row(
-        dbc.Col(
-            dash_table.DataTable(
-                id = 't1_states_covid_summary',
-                columns = [
-                    {'name': 'State/Territory', 'id': 'State/Territory'},
-                    {'name': 'Cases', 'id': 'confirmed', 'type': 'numeric', 'format': Format(group=',')},
-                    {'name': 'Deaths', 'id': 'deaths', 'type': 'numeric', 'format': Format(group=',')},
-                    {'name': 'Cases/100k', 'id': 'cc_per_100k', 'type': 'numeric', 'format': Format(group=',')},
-                    {'name': 'Deaths/100k', 'id': 'd_per_100k', 'type': 'numeric', 'format': Format(group=',')},
-                    {'name': 'Death Rate', 'id': 'Death Rate', 'type': 'numeric',
-                     'format': FormatTemplate.percentage(2)},
-                    {'name': 'Population', 'id': 'Population', 'type': 'numeric', 'format': Format(group=',')},
-                ],
-                style_table = {'padding-left': 50, 'padding-right': 50, 'overflowX': 'auto'},
-                data = create_df_metric_datatable().to_dict('records'),
-                sort_action = 'native',
-                style_cell = {'fontSize': 14, 'textAlign': 'left'},
-                style_header = {
-                    'backgroundColor': 'rgb(230, 230, 230)',
-                    'fontWeight': 'bold'
-                }
+                    style_table = {'padding-left': 50, 'padding-right': 50, 'overflowX': 'auto'},
+                    data = create_df_metric_datatable().to_dict('records'),
+                    sort_action = 'native',
+                    style_cell = {'fontSize': 14, 'textAlign': 'left'},
+                    style_header = {
+                        'backgroundColor': 'rgb(230, 230, 230)',
+                        'fontWeight': 'bold'
+                    }
+                )
             )
-        )
-    ),
-    html.Br(),
-    html.Br(),
-    # row with one column and column contains markdown
-    dbc.Row(
-        dbc.Col(
-            html.Div(
-                dcc.Markdown('''
-                >
-                > The data powering the dashboard comes from [Johns Hopkins CSSE](https://github.com/CSSEGISandData/COVID-19)
-                > and [U.S. Census](https://www.census.gov). The U.S. COVID-19 metrics dashboard is only for educational purposes.
-                > This dashboard is not be used for any medical reasons and contents should not be interpreted as professional or medical guidance.
-                >
-                '''),
-                style={'marginLeft': 40, 'marginRight': 40, 'marginTop': 0, 'marginBottom': 30,
-                       'textAlign': 'left', 'padding': '6px 0px 0px 8px', 'border': 'thin grey dashed'}
+        ),
+        html.Br(),
+        html.Br(),
+        # row with one column and column contains markdown
+        dbc.Row(
+            dbc.Col(
+                html.Div(
+                    dcc.Markdown('''
+                    >
+                    > The data powering the dashboard comes from [Johns Hopkins CSSE](https://github.com/CSSEGISandData/COVID-19)
+                    > and [U.S. Census](https://www.census.gov). The U.S. COVID-19 metrics dashboard is only for educational purposes.
+                    > This dashboard is not be used for any medical reasons and contents should not be interpreted as professional or medical guidance.
+                    >
+                    '''),
+                    style={'marginLeft': 40, 'marginRight': 40, 'marginTop': 0, 'marginBottom': 30,
+                           'textAlign': 'left', 'padding': '6px 0px 0px 8px', 'border': 'thin grey dashed'}
+                )
             )
         )
-    )
-])
+    ])
+
+
+# layouts of the data version being served, built once per version
+_layouts = {}
+
+
+def serve_layout():
+    version = current_pipeline().version
+    layout = _layouts.get(version)
+    if layout is None:
+        layout = create_layout()
+        _layouts.clear()
+        _layouts[version] = layout
+    return layout
 
 
 # ---------------- Section 3: Define Dash callback functions ------------------ #
 
-# callback 1
-@app.callback(Output('t1_covid_states_heatmap', 'figure'),
-              [Input('t1_covid_metric_dropdown', 'value')])
-def update_states_heatmap(selected_metric):
-    fig = create_us_heatmap_states(selected_metric)
-    return fig
+if CLIENTSIDE_METRICS:
+    # the metric dropdown's options are only a trigger for the tab's first render, the metrics are METRIC_OPTIONS
+    @app.callback(Output('t1_covid_states_heatmap_store', 'data'),
+                  [Input('t1_covid_metric_dropdown', 'options')])
+    @FigureCache.memoize(ignore=['options'])
+    def update_states_heatmap_store(options):
+        return metric_variants({option['value']: create_us_heatmap_states(option['value'])
+                                for option in METRIC_OPTIONS})
+
+    @app.callback(Output('t1_covid_states_bar_chart_store', 'data'),
+                  [Input('t1_covid_metric_dropdown', 'options')])
+    @FigureCache.memoize(ignore=['options'])
+    def update_states_bar_chart_store(options):
+        return metric_variants({option['value']: create_states_bar_chart(option['value'])
+                                for option in METRIC_OPTIONS})
+
+    # a new resolution or date range needs new data, a new metric does not
+    @app.callback(Output('t1_covid_states_line_chart_store', 'data'),
+                  [Input('t1_line_resolution_dropdown', 'value'),
+                   Input('t1_line_date_range', 'start_date'),
+                   Input('t1_line_date_range', 'end_date')])
+    @FigureCache.memoize()
+    def update_states_line_chart_store(resolution, start_date, end_date):
+        return metric_variants({option['value']: create_states_line_chart(option['value'], resolution,
+                                                                          start_date, end_date)
+                                for option in METRIC_OPTIONS})
+
+    for graph_id in ['t1_covid_states_heatmap', 't1_covid_states_bar_chart', 't1_covid_states_line_chart']:
+        app.clientside_callback(ClientsideFunction(namespace='metrics', function_name='apply'),
+                                Output(graph_id, 'figure'),
+                                [Input('t1_covid_metric_dropdown', 'value'),
+                                 Input(graph_id + '_store', 'data')])
+
+else:
+    # callback 1
+    @app.callback(Output('t1_covid_states_heatmap', 'figure'),
+                  [Input('t1_covid_metric_dropdown', 'value')])
+    @FigureCache.memoize()
+    def update_states_heatmap(selected_metric):
+        fig = create_us_heatmap_states(selected_metric)
+        return fig
 
 
-# callback 2
-@app.callback(Output('t1_covid_states_bar_chart', 'figure'),
-              [Input('t1_covid_metric_dropdown', 'value')])
-def update_states_bar_chart(selected_metric):
-    fig = create_states_bar_chart(selected_metric)
-    return fig
+    # callback 2
+    @app.callback(Output('t1_covid_states_bar_chart', 'figure'),
+                  [Input('t1_covid_metric_dropdown', 'value')])
+    @FigureCache.memoize()
+    def update_states_bar_chart(selected_metric):
+        fig = create_states_bar_chart(selected_metric)
+        return fig
 
 
-# callback 3
-@app.callback(Output('t1_covid_states_line_chart', 'figure'),
-              [Input('t1_covid_metric_dropdown', 'value')])
-def update_states_line_chart(selected_metric):
-    fig = create_states_line_chart(selected_metric)
-    return fig
+    # callback 3
+    @app.callback(Output('t1_covid_states_line_chart', 'figure'),
+                  [Input('t1_covid_metric_dropdown', 'value'),
+                   Input('t1_line_resolution_dropdown', 'value'),
+                   Input('t1_line_date_range', 'start_date'),
+                   Input('t1_line_date_range', 'end_date')])
+    @FigureCache.memoize()
+    def update_states_line_chart(selected_metric, resolution, start_date, end_date):
+        fig = create_states_line_chart(selected_metric, resolution, start_date, end_date)
+        return fig
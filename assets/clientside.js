@@ -0,0 +1,46 @@
+/*
+ * Clientside callbacks, registered with CLIENTSIDE_METRICS=1 (see common/figures.py).
+ * Metric dropdowns switch a figure from the variants a dcc.Store received once:
+ * the base figure plus, per metric, the values that differ from it.
+ */
+(function() {
+    function isObject(value) {
+        return value !== null && typeof value === 'object' && !Array.isArray(value);
+    }
+
+    // copy of base with patch applied: nested objects merged, null removes a key
+    function mergePatch(base, patch) {
+        var merged = Object.assign({}, base);
+        Object.keys(patch || {}).forEach(function(key) {
+            var value = patch[key];
+            if (value === null) {
+                delete merged[key];
+            } else if (isObject(value) && isObject(merged[key])) {
+                merged[key] = mergePatch(merged[key], value);
+            } else {
+                merged[key] = value;
+            }
+        });
+        return merged;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        metrics: {
+            apply: function(metric, variants) {
+                if (!variants || !variants.patches[metric]) {
+                    return window.dash_clientside.no_update;
+                }
+                var patch = variants.patches[metric];
+                if (patch.figure) {
+                    return patch.figure;
+                }
+                return {
+                    data: variants.base.data.map(function(trace, i) {
+                        return mergePatch(trace, patch.data[i]);
+                    }),
+                    layout: mergePatch(variants.base.layout, patch.layout)
+                };
+            }
+        }
+    });
+})();
@@ -0,0 +1,97 @@
+import json
+import inspect
+
+import plotly
+
+from benchmarks.fixtures import dashboard
+from common.downsample import default_date_range
+from common.figures import CLIENTSIDE_METRICS
+
+"""
+asv benchmarks of the figure builders and Dash callbacks on top of the local Mongo stand-in.
+Callbacks are called undecorated, so neither Dash nor the figure cache is involved;
+serialize_* times the JSON encoding of the response.
+
+Usage: asv run --python=same --bench bench_callbacks
+"""
+
+
+def serialize(value) -> str:
+    return json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+class CountyCallbacks:
+    params = (['California', 'Texas', 'Delaware'], ['confirmed', 'Death Rate (%)'])
+    param_names = ['state', 'metric']
+    timeout = 600
+
+    def setup(self, state, metric):
+        self.app_counties, _ = dashboard()
+        self.state_map = self.app_counties.create_state_map_counties(state, metric)
+
+    def time_state_map(self, state, metric):
+        self.app_counties.create_state_map_counties(state, metric)
+
+    def time_state_line(self, state, metric):
+        self.app_counties.create_state_line_counties(state, metric)
+
+    def time_state_line_weekly(self, state, metric):
+        self.app_counties.create_state_line_counties(state, metric, 'W')
+
+    def time_state_datatable_callback(self, state, metric):
+        inspect.unwrap(self.app_counties.update_state_counties_datatable)(1, state)
+
+    def time_serialize_state_map(self, state, metric):
+        serialize(self.state_map)
+
+    def peakmem_state_line(self, state, metric):
+        self.app_counties.create_state_line_counties(state, metric)
+
+
+class NationalCallbacks:
+    params = ['confirmed', 'deaths', 'Death Rate (%)']
+    param_names = ['metric']
+    timeout = 600
+
+    def setup(self, metric):
+        self.app_counties, self.app_states = dashboard()
+        self.bubble_map = self.app_counties.create_us_bubble_map_counties(metric)
+
+    def time_us_bubble_map(self, metric):
+        self.app_counties.create_us_bubble_map_counties(metric)
+
+    def time_serialize_us_bubble_map(self, metric):
+        serialize(self.bubble_map)
+
+    def time_states_heatmap(self, metric):
+        self.app_states.create_us_heatmap_states(metric)
+
+    def time_states_bar_chart(self, metric):
+        self.app_states.create_states_bar_chart(metric)
+
+    def time_states_line_chart(self, metric):
+        self.app_states.create_states_line_chart(metric)
+
+
+class StatesCallbacks:
+    """
+    Server callbacks of the states tab, on the date range the tab opens with and on every date.
+    With CLIENTSIDE_METRICS=1 the metric switch runs in the browser and these callbacks do not exist.
+    """
+    params = ['confirmed', 'deaths', 'Death Rate (%)']
+    param_names = ['metric']
+    timeout = 600
+
+    def setup(self, metric):
+        if CLIENTSIDE_METRICS:
+            # asv marks the benchmarks skipped
+            raise NotImplementedError('CLIENTSIDE_METRICS=1 has no update_states_line_chart callback')
+        self.app_counties, self.app_states = dashboard()
+        from models.pipeline import current_pipeline
+        self.start_date, self.end_date = default_date_range(current_pipeline().get('county_matrix').dates)
+
+    def time_states_line_chart_callback(self, metric):
+        inspect.unwrap(self.app_states.update_states_line_chart)(metric, 'D', self.start_date, self.end_date)
+
+    def time_states_line_chart_callback_all_dates(self, metric):
+        inspect.unwrap(self.app_states.update_states_line_chart)(metric, 'D', None, None)
@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.fixtures import read_inputs
+from models.covid_counties import CovidCounties
+
+"""
+Per-method wall time of the CovidCounties model transforms on the bundled JHU csv files.
+Frames are read once from data/covid and passed in, so MongoDB is not needed and only the
+pandas work is measured.
+
+Usage: python benchmarks/bench_counties.py [--repeat 5]
+"""
+
+
+def run(repeat: int):
+    df_confirmed_us, df_deaths_us = read_inputs()
+
+    methods = [
+        ('agg_confirmed_counties', lambda: CovidCounties.agg_confirmed_counties(df_confirmed_us)),
+        ('agg_deaths_counties', lambda: CovidCounties.agg_deaths_counties(df_deaths_us)),
+        ('agg_complete_counties', lambda: CovidCounties.agg_complete_counties(df_confirmed_us, df_deaths_us)),
+        ('ts_matrix_counties', lambda: CovidCounties.ts_matrix_counties(df_confirmed_us, df_deaths_us)),
+        ('ts_complete_counties', lambda: CovidCounties.ts_complete_counties(df_confirmed_us, df_deaths_us)),
+    ]
+
+    print('{:<26}{:>10}{:>10}'.format('method', 'best (s)', 'mean (s)'))
+    for name, method in methods:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            method()
+            timings.append(time.perf_counter() - start)
+        print('{:<26}{:>10.3f}{:>10.3f}'.format(name, min(timings), sum(timings) / len(timings)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark CovidCounties model methods.')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    run(args.repeat)
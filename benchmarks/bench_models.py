@@ -0,0 +1,94 @@
+from benchmarks.fixtures import local_mongo, scaled_inputs
+from models.covid_counties import CovidCounties
+from models.covid_states import CovidStates
+from models.pipeline import ModelPipeline
+from models.source import DataSource
+from models.stats import Stats
+
+"""
+asv benchmarks of the model layer: wall time (time_*) and peak RSS (peakmem_*) of every
+CovidCounties / CovidStates transform, on the bundled csv files stretched over more days and
+repeated over more counties.
+
+Usage: asv run --python=same --bench bench_models
+"""
+
+
+class CountiesModels:
+    params = ([1, 2, 4], [1, 4])
+    param_names = ['days', 'rows']
+    timeout = 600
+
+    def setup(self, days, rows):
+        self.df_confirmed_us, self.df_deaths_us = scaled_inputs(days, rows)
+
+    def time_agg_complete_counties(self, days, rows):
+        CovidCounties.agg_complete_counties(self.df_confirmed_us, self.df_deaths_us)
+
+    def time_ts_matrix_counties(self, days, rows):
+        CovidCounties.ts_matrix_counties(self.df_confirmed_us, self.df_deaths_us)
+
+    def time_ts_complete_counties(self, days, rows):
+        CovidCounties.ts_complete_counties(self.df_confirmed_us, self.df_deaths_us)
+
+    def time_county_daily_series(self, days, rows):
+        county_matrix = CovidCounties.ts_matrix_counties(self.df_confirmed_us, self.df_deaths_us)
+        for metric in list(county_matrix.DAILY_METRICS) + list(county_matrix.PER_100K_METRICS):
+            county_matrix.series(metric)
+
+    def peakmem_agg_complete_counties(self, days, rows):
+        CovidCounties.agg_complete_counties(self.df_confirmed_us, self.df_deaths_us)
+
+    def peakmem_ts_complete_counties(self, days, rows):
+        CovidCounties.ts_complete_counties(self.df_confirmed_us, self.df_deaths_us)
+
+
+class StatesModels:
+    params = ([1, 2, 4], [1, 4])
+    param_names = ['days', 'rows']
+    timeout = 600
+
+    def setup(self, days, rows):
+        local_mongo()
+        df_confirmed_us, df_deaths_us = scaled_inputs(days, rows)
+        self.df_states_stats = Stats.states_stats()
+        self.df_counties_agg = CovidCounties.agg_complete_counties(df_confirmed_us, df_deaths_us)
+        self.county_matrix = CovidCounties.ts_matrix_counties(df_confirmed_us, df_deaths_us)
+        self.df_states_ts = CovidStates.ts_complete_states(self.county_matrix, self.df_states_stats)
+        self.df_national_ts = CovidStates.ts_complete_national(self.df_states_ts)
+
+    def time_agg_complete_states(self, days, rows):
+        CovidStates.agg_complete_states(self.df_counties_agg, self.df_states_stats, self.df_states_ts)
+
+    def time_ts_complete_states(self, days, rows):
+        CovidStates.ts_complete_states(self.county_matrix, self.df_states_stats)
+
+    def time_ts_complete_national(self, days, rows):
+        CovidStates.ts_complete_national(self.df_states_ts)
+
+    def time_latest_national_snapshot(self, days, rows):
+        CovidStates.latest_national_snapshot(self.df_national_ts)
+
+    def peakmem_ts_complete_states(self, days, rows):
+        CovidStates.ts_complete_states(self.county_matrix, self.df_states_stats)
+
+
+class Pipeline:
+    """
+    Every model frame built from the local Mongo stand-in, reads included
+    """
+    params = ([1, 2], [1, 4])
+    param_names = ['days', 'rows']
+    timeout = 600
+
+    def setup(self, days, rows):
+        local_mongo(*scaled_inputs(days, rows))
+
+    def time_read_confirmed(self, days, rows):
+        DataSource.read('confirmed_ts')
+
+    def time_build_all(self, days, rows):
+        ModelPipeline().build_all()
+
+    def peakmem_build_all(self, days, rows):
+        ModelPipeline().build_all()
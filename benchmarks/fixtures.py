@@ -0,0 +1,110 @@
+import os
+import sys
+import tempfile
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# benchmarks never read a snapshot, write the figure cache or start the data reload thread
+os.environ.setdefault('COVID_SNAPSHOT_DIR', tempfile.mkdtemp(prefix='covid-bench-snapshot-'))
+os.environ.setdefault('CACHE_TYPE', 'null')
+os.environ.setdefault('DATA_RELOAD_INTERVAL', '0')
+os.environ.setdefault('DATA_PRELOAD', 'off')
+
+"""
+Offline inputs shared by the benchmarks: the bundled JHU and stats csv files, optionally scaled up,
+loaded into mongomock in place of MongoDB.
+"""
+
+DATA_PATH = os.path.join(ROOT, 'data')
+
+
+def read_inputs() -> Tuple[pd.DataFrame, pd.DataFrame]:
+    df_deaths_us = pd.read_csv(os.path.join(DATA_PATH, 'covid', 'time_series_covid19_deaths_US.csv'))
+
+    confirmed_file = os.path.join(DATA_PATH, 'covid', 'time_series_covid19_confirmed_US.csv')
+    if os.path.exists(confirmed_file):
+        df_confirmed_us = pd.read_csv(confirmed_file)
+    else:
+        # only the deaths file is bundled; it has the confirmed layout plus a Population column
+        df_confirmed_us = df_deaths_us.drop(['Population'], axis=1)
+
+    return df_confirmed_us, df_deaths_us
+
+
+def scale_frame(df: pd.DataFrame, days: int = 1, rows: int = 1) -> pd.DataFrame:
+    """
+    Larger synthetic JHU frame: every date stretched over `days` consecutive dates (so series stay
+    cumulative), and `rows` copies of every county under suffixed county names.
+    """
+    from common.snapshot import split_columns
+
+    meta_columns, date_columns = split_columns(df.columns.tolist())
+    values = df.loc[:, date_columns].to_numpy()
+    if days > 1:
+        values = np.repeat(values, days, axis=1)
+        first_date = pd.to_datetime(date_columns[0], format='%m/%d/%y')
+        dates = pd.date_range(first_date, periods=values.shape[1], freq='D')
+        # JHU header format, e.g. 1/22/20
+        date_columns = ['{}/{}/{}'.format(date.month, date.day, date.strftime('%y')) for date in dates]
+
+    df = pd.concat([df.loc[:, meta_columns].reset_index(drop=True),
+                    pd.DataFrame(values, columns=date_columns)], axis=1)
+    if rows > 1:
+        copies = []
+        for copy in range(rows):
+            df_copy = df.copy()
+            if copy:
+                df_copy['Admin2'] = df_copy['Admin2'].fillna('') + ' #{}'.format(copy)
+                df_copy['UID'] = df_copy['UID'] + copy * 10 ** 9
+            copies.append(df_copy)
+        df = pd.concat(copies, ignore_index=True)
+
+    return df
+
+
+def scaled_inputs(days: int = 1, rows: int = 1) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    df_confirmed_us, df_deaths_us = read_inputs()
+    return scale_frame(df_confirmed_us, days, rows), scale_frame(df_deaths_us, days, rows)
+
+
+def local_mongo(df_confirmed_us: pd.DataFrame = None, df_deaths_us: pd.DataFrame = None):
+    """
+    Point Database at a mongomock client loaded with the stats csv files, plus the time series when given
+    """
+    try:
+        import mongomock
+    except ImportError:
+        # asv skips a benchmark whose setup raises NotImplementedError
+        raise NotImplementedError('the benchmarks need mongomock: pip install mongomock')
+
+    from common.database import Database
+
+    Database.set_client(mongomock.MongoClient('mongodb://localhost/covid'))
+    collections = {'states_stats': pd.read_csv(os.path.join(DATA_PATH, 'stats', 'states_stats.csv')),
+                   'counties_stats': pd.read_csv(os.path.join(DATA_PATH, 'stats', 'counties_stats.csv'))}
+    if df_confirmed_us is not None:
+        collections['confirmed_ts'] = df_confirmed_us
+    if df_deaths_us is not None:
+        collections['deaths_ts'] = df_deaths_us
+
+    for collection, df in collections.items():
+        Database.insert(collection, df.to_dict('records'))
+
+
+def dashboard(days: int = 1, rows: int = 1):
+    """
+    Import the Dash app on top of mongomock data
+    :return: (app_counties, app_states) modules
+    """
+    local_mongo(*scaled_inputs(days, rows))
+
+    from models.pipeline import reloader
+    from apps import app_counties, app_states
+
+    reloader.preload()
+    return app_counties, app_states
@@ -0,0 +1,251 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import inspect
+import time
+import tempfile
+import functools
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+import plotly
+from flask_caching import Cache
+from common.instrumentation import CallbackMetrics
+
+logger = logging.getLogger(__name__)
+
+
+class FigureCache:
+    """
+    Serialized figure and datatable JSON of the Dash callbacks, keyed by (callback, arguments, data version).
+
+    Three layers: a small in-process LRU of decoded payloads, the prebuilt figures written by warmup.py
+    for the current data version, and a flask-caching backend shared by every worker ('filesystem' by
+    default, 'redis' with CACHE_REDIS_URL, 'simple' or 'null' for local runs). Every ingest changes
+    the data version, so entries built from older data are never read again and age out under the
+    backend's threshold and timeout.
+    """
+    CONFIG = {
+        'CACHE_TYPE': os.environ.get('CACHE_TYPE', 'filesystem'),
+        'CACHE_DIR': os.environ.get('CACHE_DIR', os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'cache')),
+        'CACHE_REDIS_URL': os.environ.get('CACHE_REDIS_URL'),
+        'CACHE_KEY_PREFIX': os.environ.get('CACHE_KEY_PREFIX', 'covid19:'),
+        # entries kept by the filesystem and simple backends before the oldest are pruned
+        'CACHE_THRESHOLD': int(os.environ.get('CACHE_THRESHOLD', 2000)),
+        'CACHE_DEFAULT_TIMEOUT': int(os.environ.get('CACHE_DEFAULT_TIMEOUT', 2 * 24 * 3600)),
+    }
+    # decoded payloads kept per worker
+    LOCAL_SIZE = int(os.environ.get('CACHE_LOCAL_SIZE', 256))
+    # one directory of prebuilt payloads per data version, see warmup.py
+    PREBUILT_DIR = os.environ.get('FIGURE_PREBUILT_DIR', os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'prebuilt'))
+    MANIFEST = 'manifest.json'
+    KEEP_PREBUILT = 2
+    # seconds before a version without prebuilt figures looks for its manifest again
+    PREBUILT_RECHECK = 60
+
+    cache = Cache()
+    _version = None
+    _lock = threading.Lock()
+    _local = OrderedDict()
+    _local_version = None
+    _prebuilt = {}
+    _prebuilt_checked = 0.0
+    stats = {'local_hits': 0, 'prebuilt_hits': 0, 'shared_hits': 0, 'misses': 0, 'errors': 0}
+
+    @classmethod
+    def init_app(cls, server, version: Callable[[], Optional[str]]):
+        """
+        :param server: flask server of the Dash app
+        :param version: returns the version of the data the figures are built from, only called by requests;
+                        the prebuilt keys of a version are read on its first lookup
+        """
+        cls.cache.init_app(server, config=dict(cls.CONFIG))
+        cls._version = version
+
+    @classmethod
+    def data_version(cls) -> str:
+        return str(cls._version() if cls._version is not None else None)
+
+    @classmethod
+    def key(cls, name: str, args: Iterable, version: str = None) -> str:
+        version = cls.data_version() if version is None else version
+        return '{}:{}:{}'.format(name, version, json.dumps(list(args), default=str))
+
+    @classmethod
+    def _local_get(cls, key: str, version: str):
+        with cls._lock:
+            # the first lookup under a new data version drops every older payload
+            if version != cls._local_version:
+                cls._local.clear()
+                cls._local_version = version
+            if key in cls._local:
+                cls._local.move_to_end(key)
+                return cls._local[key]
+        return None
+
+    @classmethod
+    def _local_set(cls, key: str, version: str, value):
+        with cls._lock:
+            if version != cls._local_version:
+                return
+            cls._local[key] = value
+            while len(cls._local) > cls.LOCAL_SIZE:
+                cls._local.popitem(last=False)
+
+    @classmethod
+    def get(cls, key: str, version: str):
+        value = cls._local_get(key, version)
+        if value is not None:
+            cls.stats['local_hits'] += 1
+            return value
+
+        payload = cls._prebuilt_get(key, version)
+        if payload is not None:
+            cls.stats['prebuilt_hits'] += 1
+        else:
+            try:
+                payload = cls.cache.get(key)
+            except Exception as e:
+                # a shared backend that is down only costs the render
+                cls.stats['errors'] += 1
+                logger.warning('figure cache get failed: %s', e)
+            if payload is None:
+                return None
+            cls.stats['shared_hits'] += 1
+
+        value = json.loads(payload)
+        cls._local_set(key, version, value)
+        return value
+
+    @classmethod
+    def set(cls, key: str, version: str, value):
+        """
+        Store a figure (or any plotly-serializable value) and return its decoded JSON.
+        """
+        payload = json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder)
+        try:
+            cls.cache.set(key, payload)
+        except Exception as e:
+            cls.stats['errors'] += 1
+            logger.warning('figure cache set failed: %s', e)
+
+        value = json.loads(payload)
+        cls._local_set(key, version, value)
+        return value
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._local.clear()
+        cls.cache.clear()
+
+    @classmethod
+    def memoize(cls, ignore: Iterable[str] = ()) -> Callable:
+        """
+        Decorator for Dash callbacks and figure builders.
+        :param ignore: argument names left out of the key, e.g. a button's n_clicks
+        """
+        def decorator(func: Callable) -> Callable:
+            names = list(inspect.signature(func).parameters)
+            ignored = {names.index(name) for name in ignore}
+            name = '{}.{}'.format(func.__module__, func.__name__)
+
+            def cache_key(*args, version: str = None) -> str:
+                return cls.key(name, [arg for i, arg in enumerate(args) if i not in ignored], version)
+
+            @functools.wraps(func)
+            def wrapper(*args):
+                version = cls.data_version()
+                key = cache_key(*args, version=version)
+
+                value = cls.get(key, version)
+                CallbackMetrics.cache_lookup(value is not None)
+                if value is None:
+                    cls.stats['misses'] += 1
+                    value = cls.set(key, version, func(*args))
+                return value
+
+            # used by warmup.py to prebuild the same keys
+            wrapper.cache_key = cache_key
+            return wrapper
+
+        return decorator
+
+    # ---- prebuilt figures ---- #
+
+    @classmethod
+    def prebuilt_file(cls, key: str, version: str) -> str:
+        return os.path.join(cls.PREBUILT_DIR, version, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    @classmethod
+    def prebuilt_keys(cls, version: str) -> Set[str]:
+        """
+        Keys prebuilt for a data version, read from its manifest once per process (warmup.py may
+        finish after the version went live, so a missing manifest is looked for again later)
+        """
+        recheck = not cls._prebuilt.get(version) and time.monotonic() - cls._prebuilt_checked >= cls.PREBUILT_RECHECK
+        if version not in cls._prebuilt or recheck:
+            cls._prebuilt_checked = time.monotonic()
+            try:
+                with open(os.path.join(cls.PREBUILT_DIR, version, cls.MANIFEST), 'r') as f:
+                    keys = set(json.load(f)['keys'])
+            except (OSError, ValueError, KeyError):
+                keys = set()
+            # only the current version is ever looked up again
+            cls._prebuilt = {version: keys}
+        return cls._prebuilt[version]
+
+    @classmethod
+    def _prebuilt_get(cls, key: str, version: str) -> Optional[str]:
+        if key not in cls.prebuilt_keys(version):
+            return None
+        try:
+            with open(cls.prebuilt_file(key, version), 'r') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    @classmethod
+    def write_prebuilt(cls, version: str, payloads: Iterable[Tuple[str, str]]) -> int:
+        """
+        Write one data version's prebuilt payloads; the directory is renamed into place when complete.
+        :param payloads: (key, figure JSON) pairs
+        :return: number of payloads written
+        """
+        os.makedirs(cls.PREBUILT_DIR, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(prefix='.staging-', dir=cls.PREBUILT_DIR)
+
+        keys = []
+        for key, payload in payloads:
+            with open(os.path.join(staging_dir, os.path.basename(cls.prebuilt_file(key, version))), 'w') as f:
+                f.write(payload)
+            keys.append(key)
+
+        with open(os.path.join(staging_dir, cls.MANIFEST), 'w') as f:
+            json.dump({'version': version, 'keys': keys}, f)
+
+        version_dir = os.path.join(cls.PREBUILT_DIR, version)
+        shutil.rmtree(version_dir, ignore_errors=True)
+        os.rename(staging_dir, version_dir)
+
+        # keep the newest versions
+        versions = sorted(name for name in os.listdir(cls.PREBUILT_DIR)
+                          if os.path.isdir(os.path.join(cls.PREBUILT_DIR, name)) and not name.startswith('.'))
+        for old_version in versions[:-cls.KEEP_PREBUILT]:
+            shutil.rmtree(os.path.join(cls.PREBUILT_DIR, old_version), ignore_errors=True)
+
+        cls._prebuilt = {version: set(keys)}
+        return len(keys)
+
+    @classmethod
+    def snapshot(cls) -> Dict:
+        with cls._lock:
+            local_entries = len(cls._local)
+        prebuilt_entries = sum(len(keys) for keys in cls._prebuilt.values())
+        return dict(cls.stats, local_entries=local_entries, prebuilt_entries=prebuilt_entries,
+                    backend=cls.CONFIG['CACHE_TYPE'])
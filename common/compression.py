@@ -0,0 +1,130 @@
+import os
+import gzip
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import flask
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+class PayloadCompressor:
+    """
+    Brotli or gzip encoding of the Dash callback and layout responses, negotiated per request.
+
+    Flask-Compress 1.5 (which Dash enables for every other route) only knows one algorithm and
+    compresses every response again. Callback responses repeat a lot (cached figures, every client
+    opening the same tab), so the encoded bytes are kept per worker in an LRU keyed by the hash of
+    the uncompressed body and encoding, and a repeated payload costs a hash instead of a compression.
+    """
+    # preferred first, 'br' is skipped when no brotli module is installed
+    ALGORITHMS = [algorithm.strip() for algorithm in os.environ.get('RESPONSE_COMPRESSION', 'br,gzip').split(',')
+                  if algorithm.strip() and (algorithm.strip() != 'br' or brotli is not None)]
+    BROTLI_QUALITY = int(os.environ.get('RESPONSE_BR_QUALITY', 5))
+    GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', 6))
+    MIN_SIZE = 500
+    # bytes of encoded payloads kept per worker
+    CACHE_BYTES = int(os.environ.get('RESPONSE_COMPRESSION_CACHE_MB', 64)) * 2 ** 20
+    PATHS = ('/_dash-update-component', '/_dash-layout')
+
+    _lock = threading.Lock()
+    _encoded = OrderedDict()
+    _encoded_bytes = 0
+    stats = {'hits': 0, 'misses': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    @classmethod
+    def init_app(cls, server: flask.Flask):
+        """
+        Register after Dash's Flask-Compress hook: after_request hooks run in reverse order, so these
+        responses leave here with a Content-Encoding and Flask-Compress passes them through.
+        """
+        if cls.ALGORITHMS:
+            server.after_request(cls.after_request)
+
+    @classmethod
+    def accepted_algorithm(cls, accept_encoding: str) -> Optional[str]:
+        accepted = set()
+        for part in accept_encoding.lower().split(','):
+            coding, _, params = part.partition(';')
+            params = params.replace(' ', '')
+            try:
+                weight = float(params[2:]) if params.startswith('q=') else 1.0
+            except ValueError:
+                weight = 1.0
+            if weight > 0:
+                accepted.add(coding.strip())
+        for algorithm in cls.ALGORITHMS:
+            if algorithm in accepted or '*' in accepted:
+                return algorithm
+        return None
+
+    @classmethod
+    def compress(cls, algorithm: str, body: bytes) -> bytes:
+        if algorithm == 'br':
+            return brotli.compress(body, quality=cls.BROTLI_QUALITY)
+        return gzip.compress(body, compresslevel=cls.GZIP_LEVEL)
+
+    @classmethod
+    def encoded(cls, algorithm: str, body: bytes) -> bytes:
+        key = (algorithm, hashlib.sha1(body).digest())
+        with cls._lock:
+            payload = cls._encoded.get(key)
+            if payload is not None:
+                cls._encoded.move_to_end(key)
+                cls.stats['hits'] += 1
+                return payload
+
+        payload = cls.compress(algorithm, body)
+        with cls._lock:
+            cls.stats['misses'] += 1
+            if key not in cls._encoded and len(payload) <= cls.CACHE_BYTES:
+                cls._encoded[key] = payload
+                cls._encoded_bytes += len(payload)
+                while cls._encoded_bytes > cls.CACHE_BYTES:
+                    _, evicted = cls._encoded.popitem(last=False)
+                    cls._encoded_bytes -= len(evicted)
+        return payload
+
+    @classmethod
+    def after_request(cls, response: flask.Response) -> flask.Response:
+        if flask.request.path not in cls.PATHS or response.direct_passthrough \
+                or not 200 <= response.status_code < 300 or 'Content-Encoding' in response.headers:
+            return response
+
+        vary = response.headers.get('Vary')
+        if not vary:
+            response.headers['Vary'] = 'Accept-Encoding'
+        elif 'accept-encoding' not in vary.lower():
+            response.headers['Vary'] = '{}, Accept-Encoding'.format(vary)
+
+        algorithm = cls.accepted_algorithm(flask.request.headers.get('Accept-Encoding', ''))
+        body = response.get_data()
+        if algorithm is None or len(body) < cls.MIN_SIZE:
+            return response
+
+        try:
+            payload = cls.encoded(algorithm, body)
+        except Exception as e:
+            # an uncompressed response still works
+            logger.warning('%s compression failed: %s', algorithm, e)
+            return response
+
+        cls.stats['bytes_in'] += len(body)
+        cls.stats['bytes_out'] += len(payload)
+        response.set_data(payload)
+        response.headers['Content-Encoding'] = algorithm
+        response.headers['Content-Length'] = len(payload)
+        return response
+
+    @classmethod
+    def snapshot(cls) -> Dict:
+        with cls._lock:
+            return dict(cls.stats, entries=len(cls._encoded), cached_bytes=cls._encoded_bytes)
@@ -1,20 +1,263 @@
+import os
+import time
+import threading
 import pymongo
-from typing import Dict
+import pymongo.database
+import pymongo.errors
+import numpy as np
+import pandas as pd
+from itertools import chain, islice
+from operator import itemgetter
+from typing import Dict, List, Optional, Tuple
+from bson.int64 import Int64
+from common.pool_metrics import PoolMetrics
+
+
+# value types packed into int64 and float64 columns by Database.documents_to_frame
+INT_TYPES = frozenset([int, Int64])
+FLOAT_TYPES = frozenset([int, Int64, float])
 
 
 class Database:
-    URI = "mongodb://127.0.0.1:27017/covid"
-    DATABASE = pymongo.MongoClient(URI).get_database()
+    URI = os.environ.get('MONGODB_URI', "mongodb://127.0.0.1:27017/covid")
+    MAX_POOL_SIZE = int(os.environ.get('MONGODB_MAX_POOL_SIZE', 20))
+    MIN_POOL_SIZE = int(os.environ.get('MONGODB_MIN_POOL_SIZE', 0))
+    CONNECT_TIMEOUT_MS = int(os.environ.get('MONGODB_CONNECT_TIMEOUT_MS', 5000))
+    SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    SOCKET_TIMEOUT_MS = int(os.environ.get('MONGODB_SOCKET_TIMEOUT_MS', 30000))
+    WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 2000))
+    BATCH_SIZE = 1000
+
+    POOL_METRICS = PoolMetrics()
+
+    # one client per process: created on first use, never inherited across fork (pymongo clients are not fork-safe)
+    _client = None
+    _pid = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def client(cls) -> pymongo.MongoClient:
+        if cls._client is None or cls._pid != os.getpid():
+            with cls._lock:
+                if cls._client is None or cls._pid != os.getpid():
+                    cls._client = pymongo.MongoClient(cls.URI,
+                                                      maxPoolSize=cls.MAX_POOL_SIZE,
+                                                      minPoolSize=cls.MIN_POOL_SIZE,
+                                                      connectTimeoutMS=cls.CONNECT_TIMEOUT_MS,
+                                                      serverSelectionTimeoutMS=cls.SERVER_SELECTION_TIMEOUT_MS,
+                                                      socketTimeoutMS=cls.SOCKET_TIMEOUT_MS,
+                                                      waitQueueTimeoutMS=cls.WAIT_QUEUE_TIMEOUT_MS,
+                                                      event_listeners=[cls.POOL_METRICS],
+                                                      connect=False)
+                    cls._pid = os.getpid()
+
+        return cls._client
+
+    @classmethod
+    def set_client(cls, client):
+        # use a ready-made client, e.g. mongomock.MongoClient() for offline benchmarks
+        with cls._lock:
+            cls._client = client
+            cls._pid = os.getpid()
+
+    @classmethod
+    def _after_fork(cls):
+        # drop (without closing) the parent's client and a lock that may have been held while forking
+        cls._client = None
+        cls._pid = None
+        cls._lock = threading.Lock()
+        cls.POOL_METRICS.after_fork()
+
+    @classmethod
+    def database(cls) -> pymongo.database.Database:
+        return cls.client().get_database()
+
+    @classmethod
+    def ping(cls) -> Dict:
+        """
+        Round trip to the server
+        :return: {'ok': bool, 'latency_ms': float, 'error': str}
+        """
+        start = time.perf_counter()
+        try:
+            cls.client().admin.command('ping')
+        except pymongo.errors.PyMongoError as e:
+            return {'ok': False, 'latency_ms': None, 'error': str(e)}
+
+        return {'ok': True, 'latency_ms': round(1000 * (time.perf_counter() - start), 3), 'error': None}
+
+    @classmethod
+    def pool_stats(cls) -> Dict:
+        stats = cls.POOL_METRICS.snapshot()
+        stats['max_pool_size'] = cls.MAX_POOL_SIZE
+        return stats
 
     @classmethod
     def delete(cls, collection: str):
-        cls.DATABASE[collection].remove()
+        cls.database()[collection].remove()
 
     @classmethod
     def insert(cls, collection: str, data: Dict):
-        cls.DATABASE[collection].insert(data)
+        cls.database()[collection].insert(data)
+
+    @classmethod
+    def insert_many(cls, collection: str, documents: List[Dict]):
+        # unordered: the server may apply the batch in parallel and one failed document does not stop the rest
+        if documents:
+            cls.database()[collection].insert_many(documents, ordered=False)
 
     @classmethod
     def read_all(cls, collection: str) -> pymongo.cursor:
-        return cls.DATABASE[collection].find()
+        return cls.database()[collection].find()
+
+    @classmethod
+    def find(cls, collection: str, query: Dict = None, projection: Dict = None,
+             sort: List[Tuple[str, int]] = None, batch_size: int = None) -> pymongo.cursor:
+        cursor = cls.database()[collection].find(query or {}, projection, batch_size=batch_size or cls.BATCH_SIZE)
+        if sort:
+            cursor = cursor.sort(sort)
+        return cursor
+
+    @classmethod
+    def read_frame(cls, collection: str, query: Dict = None, projection: Dict = None,
+                   sort: List[Tuple[str, int]] = None, batch_size: int = None) -> pd.DataFrame:
+        """
+        Filtered and projected read straight into column arrays.
+        '_id' is excluded in Mongo unless the projection asks for it.
+        :return: dataframe with one column per document field, in document field order
+        """
+        projection = dict(projection or {})
+        projection.setdefault('_id', 0)
+        batch_size = batch_size or cls.BATCH_SIZE
+        cursor = cls.find(collection, query, projection, sort, batch_size)
+
+        # pack every batch as the cursor returns it, so only one batch of documents is ever held as dicts;
+        # concat upcasts a column packed as int64 in one batch and float64 or object in another
+        frames = []
+        while True:
+            documents = list(islice(cursor, batch_size))
+            if not documents:
+                break
+            frames.append(cls.documents_to_frame(documents))
+
+        if len(frames) < 2:
+            return frames[0] if frames else pd.DataFrame()
+        return pd.concat(frames, ignore_index=True, sort=False)
+
+    @classmethod
+    def documents_to_frame(cls, documents: List[Dict]) -> pd.DataFrame:
+        """
+        Build a dataframe column-wise instead of from a list of wide dicts.
+        Numeric fields are packed into one int64 and one float64 matrix with C-level
+        itemgetter/np.fromiter; the remaining fields go through DataFrame.from_records.
+        A field is packed as int64 only when every value is an int, as float64 when every value is an int
+        or a float, and is left as object otherwise.
+        """
+        if not documents:
+            return pd.DataFrame()
+
+        keys = documents[0].keys()
+        columns = list(keys)
+        uniform = all(document.keys() == keys for document in documents)
+        if not uniform:
+            # documents with different fields: union of the fields in first-seen order
+            columns = list(dict.fromkeys(chain.from_iterable(documents)))
+            rows = [tuple(document.get(column) for column in columns) for document in documents]
+            return pd.DataFrame.from_records(rows, columns=columns)
+
+        int_columns, float_columns = cls._numeric_columns(documents, columns)
+
+        frames = []
+        packed = set()
+        for numeric_columns, dtype in [(int_columns, np.int64), (float_columns, np.float64)]:
+            matrix = cls._pack(documents, numeric_columns, dtype)
+            if matrix is not None:
+                frames.append(pd.DataFrame(matrix, columns=numeric_columns))
+                packed.update(numeric_columns)
+
+        object_columns = [col for col in columns if col not in packed]
+        if object_columns:
+            rows = list(map(itemgetter(*object_columns), documents)) if len(object_columns) > 1 else \
+                [(document[object_columns[0]],) for document in documents]
+            frames.append(pd.DataFrame.from_records(rows, columns=object_columns))
+
+        return pd.concat(frames, axis=1).loc[:, columns]
+
+    @classmethod
+    def _numeric_columns(cls, documents: List[Dict], columns: List[str]) -> Tuple[List[str], List[str]]:
+        """
+        Fields whose values are all ints and fields whose values are all ints or floats (bool is an int
+        subclass, it stays object). Checked over the whole group of fields first, field by field only
+        when a group mixes types.
+        """
+        first = documents[0]
+        int_columns, float_columns = [], []
+        for candidates, types in [([col for col in columns if type(first[col]) in INT_TYPES], INT_TYPES),
+                                  ([col for col in columns if type(first[col]) is float], FLOAT_TYPES)]:
+            if not candidates:
+                continue
+            getter = itemgetter(*candidates)
+            values = chain.from_iterable(map(getter, documents)) if len(candidates) > 1 else map(getter, documents)
+            if set(map(type, values)) <= types:
+                (int_columns if types is INT_TYPES else float_columns).extend(candidates)
+                continue
+
+            for col in candidates:
+                column_types = set(map(type, map(itemgetter(col), documents)))
+                if column_types <= INT_TYPES:
+                    int_columns.append(col)
+                elif column_types <= FLOAT_TYPES:
+                    float_columns.append(col)
+
+        return int_columns, float_columns
+
+    @classmethod
+    def _pack(cls, documents: List[Dict], columns: List[str], dtype) -> Optional[np.ndarray]:
+        # (documents x columns) matrix, None when a value is missing or does not fit the dtype
+        if not columns:
+            return None
+
+        getter = itemgetter(*columns)
+        values = chain.from_iterable(map(getter, documents)) if len(columns) > 1 else map(getter, documents)
+        try:
+            matrix = np.fromiter(values, dtype=dtype, count=len(documents) * len(columns))
+        except (KeyError, TypeError, ValueError, OverflowError):
+            return None
+
+        return matrix.reshape(len(documents), len(columns))
+
+    @classmethod
+    def find_one(cls, collection: str, query: Dict, projection: Dict = None,
+                 sort: List[Tuple[str, int]] = None) -> Dict:
+        return cls.database()[collection].find_one(query, projection, sort=sort)
+
+    @classmethod
+    def create_index(cls, collection: str, keys: List[Tuple[str, int]], unique: bool = False):
+        cls.database()[collection].create_index(keys, unique=unique)
+
+    @classmethod
+    def upsert_one(cls, collection: str, query: Dict, data: Dict):
+        cls.database()[collection].update_one(query, {'$set': data}, upsert=True)
+
+    @classmethod
+    def distinct(cls, collection: str, key: str) -> List:
+        return cls.database()[collection].distinct(key)
+
+    @classmethod
+    def bulk_write(cls, collection: str, requests: List):
+        # unordered so one failed document does not stop the rest of the batch
+        if requests:
+            cls.database()[collection].bulk_write(requests, ordered=False)
+
+    @classmethod
+    def rename(cls, collection: str, target: str):
+        # atomic swap for readers: target is replaced in a single server operation
+        cls.database()[collection].rename(target, dropTarget=True)
+
+    @classmethod
+    def collection_exists(cls, collection: str) -> bool:
+        return collection in cls.database().list_collection_names()
+
 
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=Database._after_fork)
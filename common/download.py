@@ -0,0 +1,138 @@
+import os
+import json
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+class Downloader:
+    """
+    Concurrent conditional downloads of files that change at most a few times a day.
+
+    Next to every local file a '<file>.meta.json' sidecar keeps the ETag, Last-Modified and sha256 of the
+    last download. A request sends them back as If-None-Match/If-Modified-Since, so an unchanged file costs a 304.
+    Bodies stream to '<file>.part' and replace the local file with os.replace, so readers never see half a file,
+    and a body whose hash did not change leaves the local file alone. A download interrupted mid-body
+    resumes from the '.part' file with a Range request (If-Range on its validator), or starts over
+    when the file changed in between.
+    """
+    TIMEOUT = float(os.environ.get('DOWNLOAD_TIMEOUT', 30))
+    WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', 4))
+    RETRIES = int(os.environ.get('DOWNLOAD_RETRIES', 3))
+    CHUNK_BYTES = 2 ** 16
+
+    _session = None
+
+    @classmethod
+    def session(cls) -> requests.Session:
+        # one pooled session for every download of the process, retrying connection errors and 5xx
+        if cls._session is None:
+            retry = Retry(total=cls.RETRIES, backoff_factor=1, status_forcelist=(500, 502, 503, 504))
+            adapter = HTTPAdapter(pool_connections=cls.WORKERS, pool_maxsize=cls.WORKERS, max_retries=retry)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            cls._session = session
+        return cls._session
+
+    @classmethod
+    def download_all(cls, urls: Dict[str, str]) -> List[str]:
+        """
+        Download every changed file concurrently; a failed download is logged and counts as unchanged
+        :param urls: {local path: url}
+        :return: local paths whose content changed
+        """
+        with ThreadPoolExecutor(max_workers=cls.WORKERS) as executor:
+            futures = {path: executor.submit(cls.download, url, path) for path, url in urls.items()}
+
+        changed = []
+        for path, future in futures.items():
+            try:
+                if future.result():
+                    changed.append(path)
+            except Exception as e:
+                logger.error('download of %s failed: %s', urls[path], e)
+        return changed
+
+    @classmethod
+    def download(cls, url: str, path: str) -> bool:
+        """
+        :return: True when path got new content
+        """
+        meta = cls._read_meta(path + '.meta.json') if os.path.exists(path) else {}
+        part = path + '.part'
+        part_meta = cls._read_meta(part + '.json') if os.path.exists(part) else {}
+
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        validator = part_meta.get('etag') or part_meta.get('last_modified')
+        if validator:
+            headers['Range'] = 'bytes={}-'.format(os.path.getsize(part))
+            headers['If-Range'] = validator
+
+        with cls.session().get(url, headers=headers, stream=True, timeout=cls.TIMEOUT) as response:
+            if response.status_code == 304:
+                logger.info('%s: not modified', url)
+                return False
+            if response.status_code == 416:
+                # the part file is already complete, or does not match the file anymore: start over
+                os.remove(part)
+                os.remove(part + '.json')
+                return cls.download(url, path)
+            response.raise_for_status()
+
+            validators = {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+            resumed = response.status_code == 206
+            if not resumed:
+                # remember what the part file is a part of, to resume it after an interruption
+                cls._write_meta(part + '.json', validators)
+            else:
+                validators = {key: part_meta.get(key) for key in validators}
+
+            with open(part, 'ab' if resumed else 'wb') as f:
+                for chunk in response.iter_content(cls.CHUNK_BYTES):
+                    f.write(chunk)
+
+        digest = cls._sha256(part)
+        changed = digest != meta.get('sha256') or not os.path.exists(path)
+        if changed:
+            os.replace(part, path)
+        else:
+            os.remove(part)
+        os.remove(part + '.json')
+        cls._write_meta(path + '.meta.json', dict(validators, url=url, sha256=digest))
+
+        logger.info('%s: %s', url, 'downloaded' if changed else 'content unchanged')
+        return changed
+
+    @classmethod
+    def _sha256(cls, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(cls.CHUNK_BYTES), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @classmethod
+    def _read_meta(cls, path: str) -> Dict:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @classmethod
+    def _write_meta(cls, path: str, meta: Dict[str, Optional[str]]):
+        with open(path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(path + '.tmp', path)
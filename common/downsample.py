@@ -0,0 +1,175 @@
+import os
+from typing import Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 'lttb', 'minmax' or 'off'
+METHOD = os.environ.get('LINE_DOWNSAMPLE', 'lttb')
+# horizontal pixels per plotted point, more points than that are not visible
+PIXELS_PER_POINT = 3
+
+# resolution dropdown values: daily, weekly (last day of each week) and monthly (last day of each month);
+# daily counts are summed over the days of each period instead
+RESOLUTIONS = [
+    {'label': 'Daily', 'value': 'D'},
+    {'label': 'Weekly', 'value': 'W'},
+    {'label': 'Monthly', 'value': 'M'},
+]
+
+
+# days the line charts' date range pickers show when a tab opens, 0 for every date
+LINE_CHART_DAYS = int(os.environ.get('LINE_CHART_DAYS', 90))
+
+
+def default_date_range(dates: pd.DatetimeIndex, days: int = LINE_CHART_DAYS) -> Tuple[str, str]:
+    # (start, end) of the last `days` days of dates as 'YYYY-MM-DD', the value format of dcc.DatePickerRange
+    end = dates[-1]
+    start = max(dates[0], end - pd.Timedelta(days=days - 1)) if days else dates[0]
+    return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+
+
+def target_points(width: int) -> int:
+    # points per trace for a chart about `width` pixels wide
+    return max(width // PIXELS_PER_POINT, 3)
+
+
+def period_end_positions(dates: pd.DatetimeIndex, resolution: str = 'D') -> np.ndarray:
+    """
+    Positions of the last date of every week ('W') or month ('M'), every position for 'D'.
+    The last day of a period is the period's value of a cumulative series or a moving mean, not of a daily
+    count: callers sum those over the period (resample_frame's sum_columns, CountyMatrix.resample).
+    """
+    if resolution == 'D' or not len(dates):
+        return np.arange(len(dates))
+
+    periods = dates.to_period(resolution)
+    return np.flatnonzero(np.r_[periods[1:] != periods[:-1], True])
+
+
+def resample_frame(df: pd.DataFrame, x_column: str, resolution: str = 'D', group_column: str = None,
+                   sum_columns: Sequence[str] = ()) -> pd.DataFrame:
+    """
+    Keep the rows of a long frame that fall on the last available date of each period
+    :param group_column: column of the series, e.g. 'State/Territory', needed with sum_columns
+    :param sum_columns: daily counts (e.g. 'New Deaths'), set to their sum over the period's days of each series
+    """
+    if resolution == 'D':
+        return df
+
+    dates = pd.DatetimeIndex(np.sort(df[x_column].unique()))
+    resampled = df[df[x_column].isin(dates[period_end_positions(dates, resolution)])]
+    if not len(sum_columns):
+        return resampled
+
+    periods = df[x_column].dt.to_period(resolution)
+    sums = df.groupby([df[group_column], periods])[list(sum_columns)].transform('sum')
+    resampled = resampled.copy()
+    resampled[list(sum_columns)] = sums.loc[resampled.index]
+    return resampled
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets, vectorized over series that share their x values
+    :param x: (points,) x values
+    :param y: (series, points) y values
+    :param threshold: points to keep per series, first and last included
+    :return: (series, threshold) positions of the kept points, ascending
+    """
+    n_series, n = y.shape
+    if threshold >= n or threshold < 3:
+        return np.tile(np.arange(n), (n_series, 1))
+
+    x = np.asarray(x, dtype=float) - float(x[0])
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+
+    # the n - 2 middle points in threshold - 2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    bucket_ends = np.r_[edges[2:], n]
+    bucket_starts = np.r_[edges[1:-1], n - 1]
+
+    kept = np.empty((n_series, threshold), dtype=int)
+    kept[:, 0] = 0
+    kept[:, -1] = n - 1
+    rows = np.arange(n_series)
+    selected = np.zeros(n_series, dtype=int)
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # third vertex: average of the next bucket
+        next_x = x[bucket_starts[i]:bucket_ends[i]].mean()
+        next_y = y[:, bucket_starts[i]:bucket_ends[i]].mean(axis=1)
+
+        ax, ay = x[selected], y[rows, selected]
+        area = np.abs((ax - next_x)[:, None] * (y[:, start:end] - ay[:, None])
+                      - (ax[:, None] - x[None, start:end]) * (next_y - ay)[:, None])
+        selected = start + np.argmax(area, axis=1)
+        kept[:, i + 1] = selected
+
+    return kept
+
+
+def minmax_indices(y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Min and max of every bucket, vectorized over series
+    :param y: (series, points) y values
+    :param threshold: points to keep per series, two per bucket
+    :return: (series, kept points) positions, ascending
+    """
+    n_series, n = y.shape
+    buckets = threshold // 2
+    if threshold >= n or buckets < 1:
+        return np.tile(np.arange(n), (n_series, 1))
+
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    edges = np.linspace(0, n, buckets + 1).astype(int)
+    kept = np.empty((n_series, 2 * buckets), dtype=int)
+    for i in range(buckets):
+        start, end = edges[i], edges[i + 1]
+        kept[:, 2 * i] = start + np.argmin(y[:, start:end], axis=1)
+        kept[:, 2 * i + 1] = start + np.argmax(y[:, start:end], axis=1)
+
+    return np.sort(kept, axis=1)
+
+
+def downsample_frame(df: pd.DataFrame, group_column: str, x_column: str, y_column: str, points: int,
+                     method: str = None) -> pd.DataFrame:
+    """
+    Keep at most `points` rows per trace of a long frame, e.g. one line per state or county.
+    :param group_column: column identifying a trace, unique per trace
+    :param method: 'lttb', 'minmax' or 'off', METHOD if None
+    :return: the kept rows, ordered by trace, then x
+    """
+    method = METHOD if method is None else method
+    if method == 'off' or df.empty:
+        return df
+
+    codes, _ = pd.factorize(df[group_column])
+    counts = np.bincount(codes)
+    if counts.max() <= points:
+        return df
+
+    x_values = df[x_column].to_numpy()
+    order = np.lexsort((x_values, codes))
+    y_values = df[y_column].to_numpy(dtype=float)[order]
+
+    def kept_positions(y: np.ndarray, x: np.ndarray) -> np.ndarray:
+        if method == 'minmax':
+            return minmax_indices(y, points)
+        return lttb_indices(x.astype('int64') if x.dtype.kind == 'M' else x, y, points)
+
+    if counts.min() == counts.max():
+        # every trace has the same number of points: downsample them as one matrix
+        n = counts[0]
+        positions = kept_positions(y_values.reshape(len(counts), n), x_values[order[:n]])
+        rows = order.reshape(len(counts), n)[np.arange(len(counts))[:, None], positions].ravel()
+    else:
+        rows, offset = [], 0
+        for count in counts:
+            trace = order[offset:offset + count]
+            positions = kept_positions(y_values[None, offset:offset + count], x_values[trace])
+            rows.append(trace[positions[0]])
+            offset += count
+        rows = np.concatenate(rows)
+
+    return df.iloc[rows]
@@ -0,0 +1,194 @@
+import os
+import re
+import json
+import datetime
+from typing import Dict, Union
+
+import numpy as np
+import pandas as pd
+import plotly
+import plotly.graph_objects as go
+
+# plotly.js 1.x (plotly 4.9, dash 1.14) only reads plain JSON arrays, typed-array (base64) encoding needs
+# plotly.js 2.28+. Figures get smaller by dropping float digits nobody sees and hover values the trace already carries.
+
+# decimals kept for map coordinates (about 10 m) and for any other float array of a figure
+COORDINATE_DECIMALS = 4
+VALUE_DECIMALS = 4
+COORDINATE_KEYS = ('lat', 'lon')
+
+# per-point trace arrays a hovertemplate can reference directly: {template variable: (attribute path)}
+TEMPLATE_ARRAYS = {
+    'x': ('x',),
+    'y': ('y',),
+    'z': ('z',),
+    'lat': ('lat',),
+    'lon': ('lon',),
+    'location': ('locations',),
+    'marker.color': ('marker', 'color'),
+    'marker.size': ('marker', 'size'),
+}
+CUSTOMDATA_FIELD = re.compile(r'%\{customdata\[(\d+)\]')
+
+# metric dropdowns switch figures in the browser (assets/clientside.js) from every metric's figure
+# shipped once in a dcc.Store, instead of a server callback per switch
+CLIENTSIDE_METRICS = os.environ.get('CLIENTSIDE_METRICS', '0') == '1'
+# marks equal values while diffing figures
+_SAME = object()
+
+
+def compact_figure(fig: Union[go.Figure, Dict]) -> Dict:
+    """
+    JSON-ready copy of a figure with rounded float arrays and deduplicated hover data
+    :return: figure dict, a Dash callback can return it like the figure
+    """
+    # shallow copies of the traces, Figure.to_dict() deep copies every array
+    fig = fig.to_plotly_json() if isinstance(fig, go.Figure) else fig
+    data = []
+    for trace in fig.get('data', []):
+        trace = dict(trace)
+        dedupe_customdata(trace)
+        for key, value in list(trace.items()):
+            decimals = COORDINATE_DECIMALS if key in COORDINATE_KEYS else VALUE_DECIMALS
+            trace[key] = round_values(value, decimals)
+        if isinstance(trace.get('marker'), dict):
+            trace['marker'] = dict(trace['marker'])
+            for key in ('color', 'size'):
+                if key in trace['marker']:
+                    trace['marker'][key] = round_values(trace['marker'][key], VALUE_DECIMALS)
+        data.append(trace)
+
+    return dict(fig, data=data)
+
+
+def round_values(values, decimals: int):
+    """
+    Round float arrays (and the float columns of 2D customdata), shorten midnight timestamps to dates,
+    leave anything else as is
+    """
+    if not isinstance(values, (np.ndarray, list, tuple)) or not len(values):
+        return values
+
+    array = np.asarray(values)
+    if array.dtype.kind == 'O' and array.ndim == 1 and isinstance(array[0], datetime.datetime):
+        array = pd.DatetimeIndex(array).values
+    if array.dtype.kind == 'f':
+        return np.round(array.astype(float), decimals)
+    if array.dtype.kind == 'M':
+        # daily dates as 'YYYY-MM-DD' instead of full timestamps
+        days = array.astype('datetime64[D]')
+        return np.datetime_as_string(days) if np.array_equal(days, array) else values
+    if array.dtype.kind == 'O' and array.ndim == 2:
+        array = array.copy()
+        for j in range(array.shape[1]):
+            column = array[:, j]
+            if all(isinstance(value, (float, np.floating)) for value in column):
+                array[:, j] = np.round(column.astype(float), decimals)
+        return array
+    return values
+
+
+def _trace_array(trace: Dict, path: tuple):
+    value = trace
+    for key in path:
+        value = value.get(key) if isinstance(value, dict) else None
+    if isinstance(value, (np.ndarray, list, tuple)):
+        return np.asarray(value)
+    return None
+
+
+def _same_values(a: np.ndarray, b: np.ndarray) -> bool:
+    if a.shape != b.shape:
+        return False
+    try:
+        return bool(np.all((a == b) | (a != a) & (b != b)))
+    except TypeError:
+        return bool(np.all(a == b))
+
+
+def dedupe_customdata(trace: Dict):
+    """
+    Point the hovertemplate at the trace's own arrays (lat, z, marker.color, ...) instead of copies of them
+    in customdata, merge identical customdata columns and drop the columns the template never shows.
+    Changes trace in place.
+    """
+    template = trace.get('hovertemplate')
+    if trace.get('customdata') is None or not isinstance(template, str):
+        return
+
+    customdata = np.asarray(trace['customdata'])
+    if customdata.ndim != 2:
+        return
+
+    referenced = sorted({int(i) for i in CUSTOMDATA_FIELD.findall(template)})
+    candidates = {name: _trace_array(trace, path) for name, path in TEMPLATE_ARRAYS.items()}
+
+    # {old column: template variable}
+    replacements, kept = {}, []
+    for i in referenced:
+        if i >= customdata.shape[1]:
+            return
+        column = customdata[:, i]
+        for name, array in candidates.items():
+            if array is not None and _same_values(array, column):
+                replacements[i] = name
+                break
+        else:
+            for j in kept:
+                if _same_values(customdata[:, j], column):
+                    replacements[i] = 'customdata[{}]'.format(kept.index(j))
+                    break
+            else:
+                replacements[i] = 'customdata[{}]'.format(len(kept))
+                kept.append(i)
+
+    trace['hovertemplate'] = CUSTOMDATA_FIELD.sub(lambda match: '%{' + replacements[int(match.group(1))], template)
+    if kept:
+        trace['customdata'] = customdata[:, kept]
+    else:
+        del trace['customdata']
+
+
+def metric_variants(figures: Dict[str, Union[go.Figure, Dict]]) -> Dict:
+    """
+    One figure per metric as the first one plus, per metric, only what differs from it
+    (e.g. z, marker.color, hovertemplate, colorbar title), see window.dash_clientside.metrics in assets/clientside.js
+    :param figures: {metric: figure}, every figure built from the same frame
+    :return: {'base': figure, 'patches': {metric: {'data': [trace patch], 'layout': layout patch}}};
+             a metric whose traces do not line up with the base gets {'figure': figure} instead
+    """
+    figures = {metric: json.loads(json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder))
+               for metric, fig in figures.items()}
+    base = next(iter(figures.values()))
+
+    patches = {}
+    for metric, fig in figures.items():
+        if len(fig['data']) != len(base['data']):
+            patches[metric] = {'figure': fig}
+            continue
+        patches[metric] = {
+            'data': [_same_as_empty(_patch(base_trace, trace)) for base_trace, trace in zip(base['data'], fig['data'])],
+            'layout': _same_as_empty(_patch(base.get('layout', {}), fig.get('layout', {}))),
+        }
+
+    return {'base': base, 'patches': patches}
+
+
+def _same_as_empty(patch) -> Dict:
+    return {} if patch is _SAME else patch
+
+
+def _patch(base, other):
+    """
+    Nested dict of the values of other that differ from base, None for keys other does not have;
+    _SAME when both are equal
+    """
+    if isinstance(base, dict) and isinstance(other, dict):
+        patch = {key: None for key in base if key not in other}
+        for key, value in other.items():
+            difference = _patch(base[key], value) if key in base else value
+            if difference is not _SAME:
+                patch[key] = difference
+        return patch or _SAME
+
+    return _SAME if base == other else other
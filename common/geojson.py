@@ -0,0 +1,158 @@
+import os
+import json
+import threading
+from typing import Dict, List
+
+import numpy as np
+
+from common.figures import COORDINATE_DECIMALS
+
+
+class GeoJson:
+    """
+    US states and counties GeoJSON, parsed once per process.
+
+    County features are pre-split by 2-digit state FIPS so a state's FeatureCollection is a dict
+    lookup. Coordinates are rounded to COORDINATE_DECIMALS and feature properties, which the maps never
+    read, are dropped when a file is loaded. Optionally, geometry is simplified (Douglas-Peucker) to about one screen pixel at the
+    map's zoom level and cached per (state, zoom level).
+    """
+    PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'geojson')
+    STATES_FILE = 'us-states-geojson.json'
+    COUNTIES_FILE = 'us-counties-fips-geojson.json'
+    # simplification on/off, and how many zoom levels past the initial one keep full pixel detail
+    SIMPLIFY = os.environ.get('GEOJSON_SIMPLIFY', '1') == '1'
+    ZOOM_HEADROOM = 2
+
+    _lock = threading.Lock()
+    _states = None
+    _counties_by_state = None
+    _simplified = {}
+
+    @classmethod
+    def _load(cls, file: str) -> Dict:
+        with open(os.path.join(cls.PATH, file), 'r') as f:
+            collection = json.load(f)
+        return dict(collection, features=[compact_feature(feature) for feature in collection['features']])
+
+    @classmethod
+    def states(cls) -> Dict:
+        if cls._states is None:
+            with cls._lock:
+                if cls._states is None:
+                    cls._states = cls._load(cls.STATES_FILE)
+        return cls._states
+
+    @classmethod
+    def counties_by_state(cls) -> Dict[int, Dict]:
+        """
+        :return: {state FIPS (int): FeatureCollection of that state's counties}
+        """
+        if cls._counties_by_state is None:
+            with cls._lock:
+                if cls._counties_by_state is None:
+                    features_by_state = {}
+                    for feature in cls._load(cls.COUNTIES_FILE)['features']:
+                        features_by_state.setdefault(int(feature['id'][:2]), []).append(feature)
+
+                    cls._counties_by_state = {state_fips: {'type': 'FeatureCollection', 'features': features}
+                                              for state_fips, features in features_by_state.items()}
+        return cls._counties_by_state
+
+    @classmethod
+    def state_counties(cls, state_fips: int, zoom: float = None) -> Dict:
+        """
+        FeatureCollection of one state's counties
+        :param state_fips: 2-digit state FIPS as int
+        :param zoom: mapbox zoom the collection is drawn at; geometry is simplified for it when given
+                     and SIMPLIFY is on
+        :return: FeatureCollection, empty when the state has no county features
+        """
+        collection = cls.counties_by_state().get(state_fips, {'type': 'FeatureCollection', 'features': []})
+        if zoom is None or not cls.SIMPLIFY:
+            return collection
+
+        # one cached simplification per whole zoom level
+        key = (state_fips, int(zoom))
+        if key not in cls._simplified:
+            cls._simplified[key] = simplify_collection(collection, pixel_degrees(int(zoom) + cls.ZOOM_HEADROOM))
+        return cls._simplified[key]
+
+
+def pixel_degrees(zoom: int) -> float:
+    # longitude degrees covered by one pixel of a 512px mapbox tile at this zoom
+    return 360.0 / (512 * 2 ** zoom)
+
+
+def compact_feature(feature: Dict) -> Dict:
+    # only the id (matched against the figure's locations) and the rounded geometry are sent to the browser
+    geometry = feature['geometry']
+    if geometry['type'] == 'Polygon':
+        coordinates = [round_ring(ring) for ring in geometry['coordinates']]
+    elif geometry['type'] == 'MultiPolygon':
+        coordinates = [[round_ring(ring) for ring in polygon] for polygon in geometry['coordinates']]
+    else:
+        coordinates = geometry['coordinates']
+
+    return {'type': feature['type'], 'id': feature.get('id'),
+            'geometry': {'type': geometry['type'], 'coordinates': coordinates}}
+
+
+def round_ring(ring: List) -> List:
+    return np.round(np.asarray(ring, dtype=float), COORDINATE_DECIMALS).tolist()
+
+
+def simplify_collection(collection: Dict, tolerance: float) -> Dict:
+    features = []
+    for feature in collection['features']:
+        geometry = feature['geometry']
+        if geometry['type'] == 'Polygon':
+            coordinates = [simplify_ring(ring, tolerance) for ring in geometry['coordinates']]
+        elif geometry['type'] == 'MultiPolygon':
+            coordinates = [[simplify_ring(ring, tolerance) for ring in polygon] for polygon in geometry['coordinates']]
+        else:
+            coordinates = geometry['coordinates']
+
+        features.append(dict(feature, geometry={'type': geometry['type'], 'coordinates': coordinates}))
+
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def simplify_ring(ring: List, tolerance: float) -> List:
+    """
+    Douglas-Peucker simplification of one linear ring; rings that would collapse below
+    4 points are returned unchanged.
+    """
+    points = np.asarray(ring, dtype=float)
+    n = len(points)
+    if n <= 4:
+        return ring
+
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(segment[0], segment[1])
+        if length == 0:
+            # closed ring: first and last points coincide, use the distance to that point
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+
+    if keep.sum() < 4:
+        return ring
+
+    return points[keep].tolist()
@@ -0,0 +1,152 @@
+import os
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from common.database import Database
+from common.snapshot import split_columns
+
+# rows per csv chunk, documents per insert_many/bulk_write call, concurrent writes
+CHUNK_ROWS = int(os.environ.get('INGEST_CHUNK_ROWS', 500))
+BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 100))
+WORKERS = int(os.environ.get('INGEST_WORKERS', 4))
+
+# dtypes of the JHU time series columns; every date column is a daily count that fits int32
+META_DTYPES = {'UID': np.int64, 'iso2': str, 'iso3': str, 'code3': np.int64, 'FIPS': np.float64,
+               'Admin2': str, 'Province_State': str, 'Country_Region': str, 'Lat': np.float64,
+               'Long_': np.float64, 'Combined_Key': str, 'Population': np.int64}
+
+
+class Watermark:
+    """
+    Which JHU date columns have been loaded into each time series collection.
+    Stored in the 'ingest_meta' collection as {'_id': collection, 'dates': [...], 'last_date': ..., 'updated_at': ...}
+    """
+    COLLECTION = 'ingest_meta'
+
+    @classmethod
+    def get(cls, collection: str) -> Optional[Dict]:
+        return Database.find_one(cls.COLLECTION, {'_id': collection})
+
+    @classmethod
+    def loaded_dates(cls, collection: str) -> List[str]:
+        watermark = cls.get(collection)
+        return watermark['dates'] if watermark else []
+
+    @classmethod
+    def set(cls, collection: str, dates: List[str]):
+        Database.upsert_one(cls.COLLECTION, {'_id': collection}, {'dates': dates,
+                                                                  'last_date': dates[-1] if dates else None,
+                                                                  'updated_at': datetime.utcnow()})
+
+    @classmethod
+    def version(cls) -> Optional[str]:
+        """
+        Version string of the latest ingest across the time series collections, None before the first load
+        """
+        updated = [watermark['updated_at'] for watermark in Database.read_all(cls.COLLECTION)
+                   if watermark.get('updated_at')]
+        if not updated:
+            return None
+
+        return max(updated).strftime('%Y%m%dT%H%M%S%f')
+
+
+def csv_dtypes(path: str) -> Dict:
+    """
+    Explicit dtypes of a JHU time series file, from its header only
+    :return: {column: dtype}; columns not in META_DTYPES are inferred per chunk
+    """
+    columns = pd.read_csv(path, nrows=0).columns.tolist()
+    meta_columns, date_columns = split_columns(columns)
+    dtypes = {column: META_DTYPES[column] for column in meta_columns if column in META_DTYPES}
+    dtypes.update({column: np.int32 for column in date_columns})
+    return dtypes
+
+
+def read_csv_chunks(path: str, dtype: Dict = None, on_chunk: Callable[[pd.DataFrame], None] = None,
+                    concat: bool = False) -> Optional[pd.DataFrame]:
+    """
+    Read a csv file CHUNK_ROWS rows at a time and hand every chunk to on_chunk (e.g. a BatchWriter);
+    only one chunk is held at a time unless the caller needs the whole file
+    :param concat: also return the whole file, concatenated from the typed chunks (int32 counts instead of int64)
+    :return: the whole file with concat, else None
+    """
+    chunks = []
+    for chunk in pd.read_csv(path, dtype=dtype, chunksize=CHUNK_ROWS):
+        if on_chunk is not None:
+            on_chunk(chunk)
+        if concat:
+            chunks.append(chunk)
+
+    if not concat:
+        return None
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.read_csv(path, dtype=dtype)
+
+
+class BatchWriter:
+    """
+    Unordered insert_many/bulk_write batches of one collection, sent by a pool of WORKERS threads.
+
+    Documents are built one batch at a time and at most 2 * WORKERS batches wait for the pool, so
+    memory stays flat however large the file. Exiting the with block waits for every batch, raises the
+    first failed write and logs the rows/s.
+
+        with BatchWriter('confirmed_ts') as writer:
+            read_csv_chunks(path, dtype, writer.insert_frame)
+    """
+    def __init__(self, collection: str, batch_size: int = None, workers: int = None):
+        self.collection = collection
+        self.batch_size = batch_size or BATCH_SIZE
+        self.workers = workers or WORKERS
+        self.rows = 0
+        self._pending = deque()
+        self._executor = None
+        self._start = None
+
+    def __enter__(self) -> 'BatchWriter':
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            while self._pending:
+                self._pending.popleft().result()
+        finally:
+            self._executor.shutdown(wait=True)
+
+        seconds = time.perf_counter() - self._start
+        if exc_type is None:
+            logging.info('%s: wrote %s rows in %.1fs (%.0f rows/s)', self.collection, self.rows, seconds,
+                         self.rows / seconds if seconds else 0)
+
+    def batches(self, df: pd.DataFrame) -> Iterator[pd.DataFrame]:
+        for start in range(0, len(df), self.batch_size):
+            yield df.iloc[start:start + self.batch_size]
+
+    def insert_frame(self, df: pd.DataFrame):
+        # one batch of documents in memory at a time instead of the whole frame's records
+        for batch in self.batches(df):
+            self.submit(Database.insert_many, batch.to_dict('records'))
+
+    def bulk_write(self, requests: List):
+        for start in range(0, len(requests), self.batch_size):
+            self.submit(Database.bulk_write, requests[start:start + self.batch_size])
+
+    def submit(self, write: Callable[[str, List], None], batch: List):
+        """
+        Queue write(collection, batch), after the oldest batch finished when the queue is full
+        """
+        if not batch:
+            return
+        while len(self._pending) >= 2 * self.workers:
+            self._pending.popleft().result()
+        self._pending.append(self._executor.submit(write, self.collection, batch))
+        self.rows += len(batch)
@@ -0,0 +1,318 @@
+import os
+import glob
+import json
+import time
+import atexit
+import random
+import logging
+import threading
+import functools
+import contextlib
+from typing import Callable, Dict, List
+
+import flask
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackMetrics:
+    """
+    Per-callback timings of the Dash app, exposed in the Prometheus text format.
+
+    Every callback records its duration, the phases marked inside it with CallbackMetrics.phase()
+    ('data' slicing, 'geojson'), the rest as 'figure' building ('cached' when every FigureCache lookup of the
+    callback was a hit), the time Dash spends serializing the response after the callback returned, and the
+    response size. A sample of requests (PROFILE_SAMPLE_RATE) runs under
+    cProfile or pyinstrument; captures of requests slower than PROFILE_SLOW_SECONDS are written to
+    PROFILE_DIR. With CALLBACK_METRICS=0 callbacks are registered unwrapped.
+
+    The counters are kept per worker process and labeled with its pid. With METRICS_DIR set, every worker also
+    writes them to its own file there (at most every METRICS_FLUSH_SECONDS) and a scrape of any worker
+    returns the sums over every file, without the pid label. Files of exited workers are kept so the totals
+    never go down; empty the directory before starting the server.
+    """
+    ENABLED = os.environ.get('CALLBACK_METRICS', '1') == '1'
+    DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_SLOW_SECONDS = float(os.environ.get('PROFILE_SLOW_SECONDS', 1.0))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'log', 'profiles'))
+    # 'cprofile' or 'pyinstrument' (optional dependency)
+    PROFILER = os.environ.get('PROFILER', 'cprofile')
+    DASH_UPDATE_PATH = '/_dash-update-component'
+    METRICS_DIR = os.environ.get('METRICS_DIR') or None
+    METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+
+    _lock = threading.Lock()
+    _local = threading.local()
+    _callbacks = {}
+    # this worker's file in METRICS_DIR, for the pid it was named after, and when it was last written
+    _file = None
+    _file_pid = None
+    _flushed = 0.0
+
+    @classmethod
+    def instrument(cls, app):
+        """
+        Wrap every callback registered through app.callback from now on, and time the
+        serialization and size of the callback responses.
+        """
+        if not cls.ENABLED:
+            return
+
+        register_callback = app.callback
+
+        def callback(*args, **kwargs):
+            register = register_callback(*args, **kwargs)
+            return lambda func: register(cls.wrap(func))
+
+        app.callback = callback
+        app.server.before_request(cls._before_request)
+        app.server.after_request(cls._after_request)
+        if cls.METRICS_DIR:
+            # the counts since the last flush of a worker that exits
+            atexit.register(cls._flush)
+
+    @classmethod
+    def wrap(cls, func: Callable) -> Callable:
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            record = {'callback': name, 'phases': {}}
+            cls._local.record = record
+            profiler = cls._start_profiler() if cls.PROFILE_SAMPLE_RATE and \
+                random.random() < cls.PROFILE_SAMPLE_RATE else None
+
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record['seconds'] = time.perf_counter() - start
+                cls._local.record = None
+                # the time outside the marked phases is figure building, or only cache lookups when
+                # FigureCache found every figure the callback asked for
+                phases = record['phases']
+                rest = 'cached' if record.get('cache') == 'hit' else 'figure'
+                phases[rest] = max(record['seconds'] - sum(phases.values()), 0.0)
+                if profiler is not None:
+                    cls._stop_profiler(profiler, name, record['seconds'])
+                if flask.has_request_context():
+                    # completed with the serialization time and response size in _after_request
+                    flask.g.callback_record = record
+                else:
+                    cls._observe(record)
+
+        return wrapper
+
+    @classmethod
+    @contextlib.contextmanager
+    def phase(cls, name: str):
+        """
+        Time a block of the running callback, e.g. `with CallbackMetrics.phase('data'):`
+        """
+        record = getattr(cls._local, 'record', None)
+        if record is None:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record['phases'][name] = record['phases'].get(name, 0.0) + time.perf_counter() - start
+
+    @classmethod
+    def cache_lookup(cls, hit: bool):
+        """
+        Mark a figure cache lookup of the running callback, see FigureCache.memoize; a single miss makes
+        the callback's unmarked time 'figure' building
+        """
+        record = getattr(cls._local, 'record', None)
+        if record is not None:
+            record['cache'] = 'hit' if hit and record.get('cache') != 'miss' else 'miss'
+
+    # ---- request hooks ---- #
+
+    @classmethod
+    def _before_request(cls):
+        if flask.request.path == cls.DASH_UPDATE_PATH:
+            flask.g.callback_request_start = time.perf_counter()
+
+    @classmethod
+    def _after_request(cls, response: flask.Response) -> flask.Response:
+        record = flask.g.pop('callback_record', None)
+        if record is not None:
+            request_seconds = time.perf_counter() - flask.g.pop('callback_request_start', time.perf_counter())
+            # dash encodes the callback output after it returned
+            record['phases']['serialize'] = max(request_seconds - record['seconds'], 0.0)
+            record['bytes'] = response.calculate_content_length() or 0
+            cls._observe(record)
+        return response
+
+    @classmethod
+    def _observe(cls, record: Dict):
+        with cls._lock:
+            stats = cls._callbacks.get(record['callback'])
+            if stats is None:
+                stats = cls._callbacks[record['callback']] = cls._new_stats()
+
+            stats['count'] += 1
+            stats['seconds'] += record['seconds']
+            stats['bytes'] += record.get('bytes', 0)
+            for phase, seconds in record['phases'].items():
+                stats['phases'][phase] = stats['phases'].get(phase, 0.0) + seconds
+            for i, bound in enumerate(cls.DURATION_BUCKETS):
+                if record['seconds'] <= bound:
+                    stats['buckets'][i] += 1
+
+        if cls.METRICS_DIR and time.monotonic() - cls._flushed >= cls.METRICS_FLUSH_SECONDS:
+            cls._flush()
+
+    @classmethod
+    def _new_stats(cls) -> Dict:
+        return {'count': 0, 'seconds': 0.0, 'bytes': 0, 'phases': {}, 'buckets': [0] * len(cls.DURATION_BUCKETS)}
+
+    @classmethod
+    def _snapshot(cls) -> Dict:
+        with cls._lock:
+            return {name: dict(stats, phases=dict(stats['phases']), buckets=list(stats['buckets']))
+                    for name, stats in cls._callbacks.items()}
+
+    # ---- counters shared by the workers through METRICS_DIR ---- #
+
+    @classmethod
+    def _worker_file(cls) -> str:
+        pid = os.getpid()
+        if cls._file_pid != pid:
+            # named after the start time too, so a worker that reuses a dead worker's pid keeps its counts
+            cls._file_pid = pid
+            cls._file = os.path.join(cls.METRICS_DIR, 'callbacks-{}-{}.json'.format(pid, int(time.time() * 1000)))
+        return cls._file
+
+    @classmethod
+    def _flush(cls):
+        # this worker's counters to its own file, replaced atomically; a failed write never fails a callback
+        cls._flushed = time.monotonic()
+        callbacks = cls._snapshot()
+        if not callbacks:
+            return
+        path = cls._worker_file()
+        tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        try:
+            os.makedirs(cls.METRICS_DIR, exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(callbacks, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning('could not write callback metrics to %s: %s', path, e)
+
+    @classmethod
+    def _all_workers(cls) -> Dict:
+        # counters summed over every worker file, this worker's written first so they are current
+        cls._flush()
+        totals = {}
+        for path in glob.glob(os.path.join(cls.METRICS_DIR, 'callbacks-*.json')):
+            try:
+                with open(path) as f:
+                    callbacks = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, stats in callbacks.items():
+                total = totals.get(name)
+                if total is None:
+                    total = totals[name] = cls._new_stats()
+                for key in ('count', 'seconds', 'bytes'):
+                    total[key] += stats[key]
+                for phase, seconds in stats['phases'].items():
+                    total['phases'][phase] = total['phases'].get(phase, 0.0) + seconds
+                total['buckets'] = [a + b for a, b in zip(total['buckets'], stats['buckets'])]
+        return totals
+
+    # ---- profiling ---- #
+
+    @classmethod
+    def _start_profiler(cls):
+        if cls.PROFILER == 'pyinstrument':
+            try:
+                import pyinstrument
+            except ImportError:
+                logger.warning('pyinstrument is not installed, using cProfile')
+            else:
+                profiler = pyinstrument.Profiler()
+                profiler.start()
+                return profiler
+
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    @classmethod
+    def _stop_profiler(cls, profiler, name: str, seconds: float):
+        is_cprofile = hasattr(profiler, 'disable')
+        if is_cprofile:
+            profiler.disable()
+        else:
+            profiler.stop()
+        if seconds < cls.PROFILE_SLOW_SECONDS:
+            return
+
+        os.makedirs(cls.PROFILE_DIR, exist_ok=True)
+        path = os.path.join(cls.PROFILE_DIR, '{}-{}-{}-{:.0f}ms'.format(
+            time.strftime('%Y%m%dT%H%M%S'), os.getpid(), name, seconds * 1000))
+        if is_cprofile:
+            profiler.dump_stats(path + '.prof')
+        else:
+            with open(path + '.html', 'w') as f:
+                f.write(profiler.output_html())
+        logger.info('slow callback %s (%.2fs) profiled to %s', name, seconds, path)
+
+    # ---- Prometheus text format ---- #
+
+    @classmethod
+    def prometheus(cls, extra: List[str] = ()) -> str:
+        """
+        :param extra: more metric lines, e.g. from prometheus_lines()
+        """
+        if cls.METRICS_DIR:
+            callbacks, worker = cls._all_workers(), ''
+        else:
+            callbacks, worker = cls._snapshot(), ',pid="{}"'.format(os.getpid())
+
+        lines = ['# TYPE dash_callback_duration_seconds histogram']
+        for name, stats in sorted(callbacks.items()):
+            labels = 'callback="{}"{}'.format(name, worker)
+            for bound, count in zip(cls.DURATION_BUCKETS, stats['buckets']):
+                lines.append('dash_callback_duration_seconds_bucket{{{},le="{}"}} {}'.format(labels, bound, count))
+            lines.append('dash_callback_duration_seconds_bucket{{{},le="+Inf"}} {}'.format(labels, stats['count']))
+            lines.append('dash_callback_duration_seconds_sum{{{}}} {}'.format(labels, stats['seconds']))
+            lines.append('dash_callback_duration_seconds_count{{{}}} {}'.format(labels, stats['count']))
+
+        lines.append('# TYPE dash_callback_phase_seconds_total counter')
+        for name, stats in sorted(callbacks.items()):
+            for phase, seconds in sorted(stats['phases'].items()):
+                lines.append('dash_callback_phase_seconds_total{{callback="{}",phase="{}"{}}} {}'.format(
+                    name, phase, worker, seconds))
+
+        lines.append('# TYPE dash_callback_response_bytes_total counter')
+        for name, stats in sorted(callbacks.items()):
+            lines.append('dash_callback_response_bytes_total{{callback="{}"{}}} {}'.format(
+                name, worker, stats['bytes']))
+
+        return '\n'.join(lines + list(extra)) + '\n'
+
+
+def prometheus_lines(prefix: str, values: Dict, kind: str = 'gauge') -> List[str]:
+    """
+    One metric per numeric value of a flat dict, e.g. Database.pool_stats()
+    """
+    pid = os.getpid()
+    lines = []
+    for key, value in sorted(values.items()):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        metric = '{}_{}'.format(prefix, key)
+        lines.append('# TYPE {} {}'.format(metric, kind))
+        lines.append('{}{{pid="{}"}} {}'.format(metric, pid, value))
+    return lines
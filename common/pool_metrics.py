@@ -0,0 +1,109 @@
+import time
+import threading
+from typing import Dict
+
+from pymongo import monitoring
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Connection pool counters for the Mongo client of this process: checkouts, failures,
+    connections in use and how long callers waited for a connection.
+    """
+    # upper bounds (seconds) of the checkout wait histogram
+    WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._zero()
+
+    def reset(self):
+        with self._lock:
+            self._zero()
+
+    def after_fork(self):
+        # the child's counters start over; a thread of the parent may have held the lock while forking,
+        # so the child gets a new one instead of acquiring it
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._zero()
+
+    def _zero(self):
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.checkouts = 0
+        self.checkout_failures = {}
+        self.checked_out = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.wait_buckets = [0] * len(self.WAIT_BUCKETS)
+        self.pool_clears = 0
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'connections_open': self.connections_created - self.connections_closed,
+                'connections_created': self.connections_created,
+                'checked_out': self.checked_out,
+                'checkouts': self.checkouts,
+                'checkout_failures': dict(self.checkout_failures),
+                'wait_seconds_total': self.wait_seconds_total,
+                'wait_seconds_max': self.wait_seconds_max,
+                'wait_buckets': dict(zip(self.WAIT_BUCKETS, self.wait_buckets)),
+                'pool_clears': self.pool_clears,
+            }
+
+    def _record_wait(self):
+        # check out started and finished are published on the calling thread
+        started = getattr(self._local, 'started', None)
+        if started is None:
+            return 0.0
+        self._local.started = None
+        return time.perf_counter() - started
+
+    # ---- pymongo.monitoring.ConnectionPoolListener ---- #
+
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._record_wait()
+        with self._lock:
+            self.checkout_failures[event.reason] = self.checkout_failures.get(event.reason, 0) + 1
+
+    def connection_checked_out(self, event):
+        wait = self._record_wait()
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.wait_seconds_total += wait
+            self.wait_seconds_max = max(self.wait_seconds_max, wait)
+            for i, bound in enumerate(self.WAIT_BUCKETS):
+                if wait <= bound:
+                    self.wait_buckets[i] += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
@@ -0,0 +1,201 @@
+import os
+import re
+import json
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# JHU date columns look like '1/22/20'; everything before the first one is county metadata
+DATE_COLUMN = re.compile(r'^\d{1,2}/\d{1,2}/\d{2}$')
+
+
+def split_columns(columns: List[str]) -> Tuple[List[str], List[str]]:
+    meta_columns = [col for col in columns if not DATE_COLUMN.match(str(col))]
+    date_columns = [col for col in columns if DATE_COLUMN.match(str(col))]
+    return meta_columns, date_columns
+
+
+def select_dates(date_columns: List[str], start=None, end=None, as_of=None) -> List[str]:
+    """
+    JHU date columns from start to end, both inclusive and either None for no bound
+    :param as_of: keep only the last of those columns on or before this date, 'latest' for the last column
+    :return: column names in file order
+    """
+    if start is None and end is None and as_of is None:
+        return list(date_columns)
+
+    dates = pd.to_datetime(date_columns, format='%m/%d/%y')
+    keep = np.ones(len(date_columns), dtype=bool)
+    if start is not None:
+        keep &= dates >= pd.Timestamp(start)
+    if end is not None:
+        keep &= dates <= pd.Timestamp(end)
+    if as_of is not None and as_of != 'latest':
+        keep &= dates <= pd.Timestamp(as_of)
+
+    positions = np.flatnonzero(keep)
+    if as_of is not None:
+        positions = positions[-1:]
+    return [date_columns[i] for i in positions]
+
+
+class Snapshot:
+    """
+    Versioned columnar copy of the JHU time series collections.
+
+    Each ingest writes one version directory with a .npy file per metadata column and a single
+    county x day int32 matrix per collection. Workers open the matrices with mmap_mode='r', so
+    cold start is a page-cache mapping shared by every process instead of a full Mongo scan.
+
+    Layout: <ROOT>/<version>/<collection>/{meta.json, values.npy, <column>.npy, <column>.null.npy}
+    """
+    ROOT = os.environ.get('COVID_SNAPSHOT_DIR',
+                          os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                       'data', 'snapshot'))
+    CURRENT = 'CURRENT'
+    KEEP_VERSIONS = 3
+
+    # per-process cache of opened collections: {(version, collection): (meta, dates, columns, values)}
+    _opened = {}
+
+    @classmethod
+    def current_version(cls) -> Optional[str]:
+        try:
+            with open(os.path.join(cls.ROOT, cls.CURRENT), 'r') as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+
+        return version or None
+
+    @classmethod
+    def write(cls, frames: Dict[str, pd.DataFrame]) -> str:
+        """
+        Write every wide frame in `frames` as one new snapshot version and point CURRENT at it.
+        :param frames: {collection: wide JHU dataframe}
+        :return: version string
+        """
+        os.makedirs(cls.ROOT, exist_ok=True)
+        version = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+
+        # build the version in a temp dir so readers never see a partially written snapshot
+        staging_dir = tempfile.mkdtemp(prefix='.staging-', dir=cls.ROOT)
+        try:
+            for collection, df in frames.items():
+                cls._write_collection(os.path.join(staging_dir, collection), df)
+            os.rename(staging_dir, os.path.join(cls.ROOT, version))
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+
+        # atomically swap the CURRENT pointer
+        pointer_tmp = os.path.join(cls.ROOT, cls.CURRENT + '.tmp')
+        with open(pointer_tmp, 'w') as f:
+            f.write(version)
+        os.replace(pointer_tmp, os.path.join(cls.ROOT, cls.CURRENT))
+
+        cls._prune()
+        return version
+
+    @classmethod
+    def _write_collection(cls, path: str, df: pd.DataFrame):
+        os.makedirs(path)
+        if '_id' in df.columns:
+            df = df.drop(['_id'], axis=1)
+
+        meta_columns, date_columns = split_columns(df.columns.tolist())
+
+        meta = {'columns': meta_columns, 'dates': date_columns, 'kinds': {}}
+        for i, col in enumerate(meta_columns):
+            series = df[col]
+            if pd.api.types.is_numeric_dtype(series):
+                kind = 'int' if pd.api.types.is_integer_dtype(series) else 'float'
+                np.save(os.path.join(path, '{}.npy'.format(i)), series.to_numpy())
+            else:
+                # fixed width unicode keeps string columns mmap-able; nulls kept in a side mask
+                kind = 'str'
+                np.save(os.path.join(path, '{}.npy'.format(i)), series.fillna('').astype(str).to_numpy(dtype=str))
+                np.save(os.path.join(path, '{}.null.npy'.format(i)), series.isnull().to_numpy())
+            meta['kinds'][col] = kind
+
+        values = df.loc[:, date_columns].fillna(0).to_numpy(dtype=np.int32)
+        np.save(os.path.join(path, 'values.npy'), values)
+
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def _prune(cls):
+        versions = sorted(name for name in os.listdir(cls.ROOT)
+                          if os.path.isdir(os.path.join(cls.ROOT, name)) and not name.startswith('.'))
+        # already mapped files stay valid for running workers after the directory is removed
+        for version in versions[:-cls.KEEP_VERSIONS]:
+            shutil.rmtree(os.path.join(cls.ROOT, version), ignore_errors=True)
+
+    @classmethod
+    def open(cls, collection: str, version: str = None):
+        """
+        Memory-map one collection of a snapshot version.
+        :return: (meta dict of column -> ndarray, date column names, meta column order, values mmap)
+                 or None if there is no snapshot for the collection
+        """
+        version = version or cls.current_version()
+        if version is None:
+            return None
+
+        key = (version, collection)
+        if key in cls._opened:
+            return cls._opened[key]
+
+        path = os.path.join(cls.ROOT, version, collection)
+        if not os.path.isdir(path):
+            return None
+
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta_json = json.load(f)
+
+        meta = {}
+        for i, col in enumerate(meta_json['columns']):
+            values = np.load(os.path.join(path, '{}.npy'.format(i)))
+            if meta_json['kinds'][col] == 'str':
+                nulls = np.load(os.path.join(path, '{}.null.npy'.format(i)))
+                values = values.astype(object)
+                values[nulls] = np.nan
+            meta[col] = values
+
+        values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+
+        # only the newest mapped version is kept open by this process
+        cls._opened = {k: v for k, v in cls._opened.items() if k[0] == version}
+        cls._opened[key] = (meta, meta_json['dates'], meta_json['columns'], values)
+        return cls._opened[key]
+
+    @classmethod
+    def read_frame(cls, collection: str, version: str = None, columns: List[str] = None,
+                   start=None, end=None, as_of=None) -> Optional[pd.DataFrame]:
+        """
+        Wide JHU dataframe for a collection, same column layout as the Mongo documents minus '_id'.
+        :param columns: metadata columns to keep, None keeps every column
+        :param start, end, as_of: date columns to keep, see select_dates()
+        :return: dataframe or None if there is no snapshot
+        """
+        opened = cls.open(collection, version)
+        if opened is None:
+            return None
+
+        meta, dates, meta_columns, values = opened
+        if columns is not None:
+            meta_columns = [col for col in meta_columns if col in columns]
+        df_meta = pd.DataFrame({col: meta[col] for col in meta_columns}, columns=meta_columns)
+
+        # the selected dates are one run of columns, so the values stay a view of the mapping
+        selected = select_dates(dates, start, end, as_of)
+        first = dates.index(selected[0]) if selected else 0
+        df_values = pd.DataFrame(values[:, first:first + len(selected)], columns=selected, copy=False)
+
+        return pd.concat([df_meta, df_values], axis=1, copy=False)
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+# Window kernels over (series, days) arrays of cumulative counts. A cumulative series is the running sum of
+# its daily values, so the sum of any `window` days is one subtraction of two cumulative columns: every kernel
+# is a vectorized difference over the whole matrix at once, no per-series rolling windows.
+
+# most days before a date any kernel looks at (14-day mean, week over week), reads of a date range
+# start this many days earlier so the first days of the range have their full window
+HISTORY_DAYS = 14
+
+
+def window_sums(cumulative: np.ndarray, window: int) -> np.ndarray:
+    """
+    Sum of the last `window` daily values of every series on every day
+    :param cumulative: (series, days) cumulative counts
+    :return: float64 array of the same shape, NaN for the first `window` days that lack a full window
+    """
+    cumulative = np.asarray(cumulative, dtype=np.float64)
+    sums = np.full(cumulative.shape, np.nan)
+    if window < cumulative.shape[-1]:
+        np.subtract(cumulative[..., window:], cumulative[..., :-window], out=sums[..., window:])
+    return sums
+
+
+def daily_new(cumulative: np.ndarray) -> np.ndarray:
+    # new counts per day, negative on days the source corrected its cumulative numbers down
+    return window_sums(cumulative, 1)
+
+
+def rolling_mean(cumulative: np.ndarray, window: int = 7) -> np.ndarray:
+    # mean of the daily new counts over the last `window` days
+    return window_sums(cumulative, window) / window
+
+
+def week_over_week(cumulative: np.ndarray, window: int = 7) -> np.ndarray:
+    """
+    Growth (%) of the new counts of the last `window` days over the `window` days before them
+    :return: float64 array, NaN without two full windows or when the previous window had no new counts
+    """
+    sums = window_sums(cumulative, window)
+    previous = np.full(sums.shape, np.nan)
+    previous[..., window:] = sums[..., :-window]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = 100 * (sums / previous - 1)
+    growth[~(previous > 0)] = np.nan
+    return growth
+
+
+def per_100k(values: np.ndarray, population) -> np.ndarray:
+    """
+    :param values: (series, days) array
+    :param population: population of every series, NaN or 0 where unknown
+    :return: values per 100k people, NaN where the population is unknown
+    """
+    population = np.asarray(population, dtype=np.float64)
+    population = np.where(population > 0, population, np.nan)
+    return values / (population[:, None] / 100000)
+
+
+def history_start(start):
+    # first date to read for the kernels of a range starting at start, None for no bound
+    return None if start is None else pd.Timestamp(start) - pd.Timedelta(days=HISTORY_DAYS)
@@ -1,50 +1,135 @@
 import os
-import requests
+import argparse
 import logging
 import pandas as pd
+from typing import List, Optional, Set
+from pymongo import UpdateOne
 from common.database import Database
+from common.download import Downloader
+from common.ingest import BatchWriter, Watermark, csv_dtypes, read_csv_chunks
+from common.snapshot import Snapshot, split_columns
+from models.covid_counties import CovidCounties
+from models.covid_daily import CovidDaily
 
 files = {'time_series_covid19_confirmed_US.csv': 'confirmed_ts',
          'time_series_covid19_deaths_US.csv': 'deaths_ts'}
 
 
 # Grab John Hopkins' time-series covid files from their public Github repo
-def grab_covid_csv():
+def grab_covid_csv() -> List[str]:
+    """
+    Download the files that changed since the last run, concurrently (see common/download.py)
+    :return: names of the files that got new content
+    """
     raw_url = 'https://raw.githubusercontent.com'
     raw_path = 'CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series'
+    local_path = os.path.join(os.getcwd(), 'data/covid')
 
-    try:
-        for file in files:
-            url = os.path.join(raw_url, raw_path, file)
-            data = requests.get(url)
-            csv_data = data.text
-            local_file = os.path.join(os.getcwd(), 'data/covid', file)
-            # print(local_file)
-
-            with open(local_file, 'w') as f:
-                f.write(csv_data)
-                f.close()
-
-    except Exception as e:
-        logging.error('Exception error.', exc_info=e)
+    urls = {os.path.join(local_path, file): '/'.join([raw_url, raw_path, file]) for file in files}
+    return [os.path.basename(path) for path in Downloader.download_all(urls)]
 
 
 # Take JH downloaded csv files and insert into MongoDB
-def insert_csv_to_mongo():
+def insert_csv_to_mongo(incremental: bool = True, changed_files: Optional[List[str]] = None):
+    """
+    Load the JHU time series csv files into their collections.
+
+    Incremental mode only sends the date columns that are not in the collection's watermark yet, as
+    idempotent $set upserts keyed on UID applied in place; readers only read the watermark's dates, so a
+    date shows up once every document has it, and an interrupted run is simply applied again.
+    A full load writes into a staging collection that is renamed over the live one, so readers never
+    see an empty or half-loaded collection.
+    :param incremental: False forces a full reload
+    :param changed_files: only load these files (e.g. from grab_covid_csv()), None loads every file
+    """
     file_path = os.path.join(os.getcwd(), 'data/covid')
+    # the county buckets and the snapshot are written from both files' whole county x day matrices,
+    # so the typed chunks of the time series are kept (the stats loader never keeps them)
+    frames = {}
+    changed = False
+    # earliest newly loaded date, None once any collection needed a full load
+    since_dates = []
 
     for file, collection in files.items():
-        # delete all documents in the collection
-        Database.delete(collection)
+        path = os.path.join(file_path, file)
+        # the header is enough to plan the load; the file itself is streamed in chunks below
+        dtype = csv_dtypes(path)
+        meta_columns, date_columns = split_columns(list(dtype))
+        loaded_dates = set(Watermark.loaded_dates(collection))
+        new_dates = [date for date in date_columns if date not in loaded_dates]
+
+        # appending is only safe when every loaded date is still in the file
+        can_append = (incremental and loaded_dates and not loaded_dates - set(date_columns)
+                      and Database.collection_exists(collection))
+
+        unchanged = changed_files is not None and file not in changed_files
+        if can_append and (unchanged or not new_dates):
+            logging.info('%s: %s', collection, 'file unchanged since the last download' if unchanged
+                         else 'no new dates since the last load')
+            frames[collection] = read_csv_chunks(path, dtype, concat=True)
+            continue
+
+        if can_append:
+            logging.info('%s: appending %s new date(s)', collection, len(new_dates))
+            existing_uids = set(Database.distinct(collection, 'UID'))
+            with BatchWriter(collection) as writer:
+                frames[collection] = read_csv_chunks(path, dtype, lambda chunk: writer.bulk_write(
+                    append_requests(chunk, meta_columns, new_dates, existing_uids)), concat=True)
+            since_dates.append(min(pd.to_datetime(new_dates, format='%m/%d/%y')))
+        else:
+            logging.info('%s: full load of %s date(s)', collection, len(date_columns))
+            staging = collection + '_staging'
+            Database.delete(staging)
+            with BatchWriter(staging) as writer:
+                frames[collection] = read_csv_chunks(path, dtype, writer.insert_frame, concat=True)
+            Database.rename(staging, collection)
+            since_dates.append(None)
 
-        # read csv files saved locally and convert to dict using 'records' parameter
-        data = pd.read_csv(os.path.join(file_path, file))
-        data_dict = data.to_dict('records')
+        # the new dates become visible to readers only now, once every document has them
+        Watermark.set(collection, date_columns)
+        changed = True
 
-        # insert models dict into collection
-        Database.insert(collection, data_dict)
+    if not changed and Snapshot.current_version() is not None:
+        return
+
+    county_matrix = CovidCounties.ts_matrix_counties(frames['confirmed_ts'], frames['deaths_ts'])
+    if changed:
+        # refresh the per-county monthly buckets from the first new date on
+        since = None if None in since_dates else min(since_dates)
+        CovidDaily.write_buckets(county_matrix, since)
+
+    # write the memory-mapped snapshot that dashboard workers read instead of scanning Mongo, with the
+    # county matrices in matrix order so workers map them as they are
+    Snapshot.write(dict(frames, **county_matrix.snapshot_frames()))
+
+
+def append_requests(data: pd.DataFrame, meta_columns: List[str], new_dates: List[str], existing_uids: Set) -> List:
+    """
+    Bulk write requests that set the new date columns on existing documents (keyed on UID) and the whole
+    document of counties that are not in the collection yet. Every request is a $set upsert, so applying
+    them twice leaves the same documents.
+    :param data: a chunk of the csv file
+    """
+    requests = []
+    for record in data.to_dict('records'):
+        uid = record['UID']
+        if uid in existing_uids:
+            record = {column: record[column] for column in meta_columns + new_dates}
+        requests.append(UpdateOne({'UID': uid}, {'$set': record}, upsert=True))
+
+    return requests
 
 
 if __name__ == '__main__':
-    grab_covid_csv()
-    insert_csv_to_mongo()
+    parser = argparse.ArgumentParser(description='Download the JHU time series and load them into MongoDB.')
+    parser.add_argument('--full', action='store_true', help='replace every document instead of appending new dates')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    changed_files = grab_covid_csv()
+    if args.full:
+        insert_csv_to_mongo(incremental=False)
+    elif changed_files or Snapshot.current_version() is None:
+        insert_csv_to_mongo(changed_files=changed_files)
+    else:
+        logging.info('no file changed since the last download')
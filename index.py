@@ -5,8 +5,14 @@ import dash_core_components as dcc
 from dash.dependencies import Input, Output
 
 # import all apps into index.py
-from app import app
+from app import app, server
 from apps import app_counties, app_states
+from models.pipeline import reloader
+
+# layouts and figures are built on first render, the model frames on first use (see DATA_PRELOAD),
+# so importing the dashboards only registers their callbacks
+if reloader.PRELOAD_MODE == 'fork':
+    reloader.preload()
 
 """
 Further reading on multi-page Dash apps - https://dash.plotly.com/urls
@@ -63,9 +69,9 @@ app.layout = html.Div([
               [Input('tabs-styled-with-inline', 'value')])
 def display_page(tab):
     if tab == 'tab-1':
-        return app_states.layout
+        return app_states.serve_layout()
     elif tab == 'tab-2':
-        return app_counties.layout
+        return app_counties.serve_layout()
     else:
         return '404'
 
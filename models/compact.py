@@ -0,0 +1,46 @@
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+# object columns with fewer distinct values than this share of rows become categoricals
+CATEGORY_RATIO = 0.5
+INT32 = np.iinfo(np.int32)
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Smaller dtypes for a model frame: repeated names as categoricals, int64 counts and FIPS as int32,
+    float64 rates as float32. Float columns holding whole numbers (e.g. Population with NaN) keep
+    float64 so their values stay exact.
+    :return: new dataframe, df is not modified
+    """
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        kind = series.dtype.kind
+        if kind == 'O' and len(series) and series.nunique() < CATEGORY_RATIO * len(series):
+            series = series.astype('category')
+        elif kind == 'i' and series.dtype.itemsize > 4 and len(series) \
+                and INT32.min <= series.min() and series.max() <= INT32.max:
+            series = series.astype(np.int32)
+        elif kind == 'f' and series.dtype.itemsize > 4:
+            values = series.to_numpy()
+            finite = values[np.isfinite(values)]
+            if not np.array_equal(finite, np.round(finite)):
+                series = series.astype(np.float32)
+        columns[column] = series
+
+    return pd.DataFrame(columns, index=df.index)
+
+
+def memory_report(frames: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """
+    memory_usage(deep=True) of every dataframe in frames
+    :return: dataframe with frame, rows, columns and MB, largest first
+    """
+    rows = [{'frame': name, 'rows': len(df), 'columns': len(df.columns),
+             'MB': round(df.memory_usage(deep=True).sum() / 2 ** 20, 2)}
+            for name, df in frames.items() if isinstance(df, pd.DataFrame)]
+
+    return pd.DataFrame(rows, columns=['frame', 'rows', 'columns', 'MB']).sort_values('MB', ascending=False)
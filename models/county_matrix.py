@@ -0,0 +1,307 @@
+from functools import partial
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from common.downsample import period_end_positions
+from common.snapshot import Snapshot, split_columns
+from common.windows import HISTORY_DAYS, daily_new, per_100k, rolling_mean, week_over_week
+
+
+class CountyMatrix:
+    """
+    County time series kept as dense county x day int32 matrices instead of melted long frames.
+
+    counties: one row per county (State FIPS, FIPS, State/Territory, County, County-State, Population),
+              sorted by state name so every state is one contiguous block of rows
+    dates: DatetimeIndex of the matrix columns
+    confirmed, deaths: int32 arrays of shape (len(counties), len(dates)), cumulative values
+
+    Daily series (DAILY_METRICS, PER_100K_METRICS) are derived from the cumulative matrices with the window
+    kernels of common.windows. between() and resample() keep the full-history matrix they were cut from,
+    every series is computed once over its dates and sliced, so the first days of a window still see the
+    days before it.
+    """
+    # snapshot collections of the matrices, rows in matrix order; the counties are the confirmed one's columns
+    SNAPSHOT = {'confirmed': 'county_confirmed', 'deaths': 'county_deaths'}
+    # daily series of the cumulative matrices: {name: (matrix, kernel)}
+    DAILY_METRICS = {
+        'New Cases': ('confirmed', daily_new),
+        'New Deaths': ('deaths', daily_new),
+        'New Cases (7-day avg)': ('confirmed', rolling_mean),
+        'New Deaths (7-day avg)': ('deaths', rolling_mean),
+        'New Cases (14-day avg)': ('confirmed', partial(rolling_mean, window=14)),
+        'New Deaths (14-day avg)': ('deaths', partial(rolling_mean, window=14)),
+        'Cases WoW Growth (%)': ('confirmed', week_over_week),
+        'Deaths WoW Growth (%)': ('deaths', week_over_week),
+    }
+    # daily counts: a week or month of them is their sum, the other series take the value of the period's last day
+    SUMMED_METRICS = ('New Cases', 'New Deaths')
+    # rates per 100k people of daily series: {name: daily series}
+    PER_100K_METRICS = {
+        'New Cases per 100k (7-day avg)': 'New Cases (7-day avg)',
+        'New Deaths per 100k (7-day avg)': 'New Deaths (7-day avg)',
+    }
+
+    def __init__(self, counties: pd.DataFrame, dates: pd.DatetimeIndex, confirmed: np.ndarray, deaths: np.ndarray,
+                 root: 'CountyMatrix' = None, positions: np.ndarray = None):
+        self.counties = counties.reset_index(drop=True)
+        self.dates = dates
+        self.confirmed = confirmed
+        self.deaths = deaths
+
+        # the full-history matrix and the positions of this one's dates in it
+        self._root = self if root is None else root
+        self._positions = np.arange(len(dates)) if positions is None else positions
+        # root position of the first day of every period of a resample(), None when every date is its own period
+        self._period_starts = None
+        # daily series over the root's dates, built on first use
+        self._derived = {}
+
+        # start row of every state block; counties are sorted by state so np.add.reduceat can sum the blocks
+        state_column = self.counties['State/Territory'].to_numpy()
+        if len(state_column):
+            self.state_starts = np.flatnonzero(np.r_[True, state_column[1:] != state_column[:-1]])
+        else:
+            self.state_starts = np.array([], dtype=int)
+        self.state_names = state_column[self.state_starts].tolist()
+
+        state_ends = np.r_[self.state_starts[1:], len(state_column)].astype(int)
+        self._state_rows = {name: slice(int(start), int(end))
+                            for name, start, end in zip(self.state_names, self.state_starts, state_ends)}
+
+    @classmethod
+    def from_frames(cls, df_confirmed_us: pd.DataFrame, df_deaths_us: pd.DataFrame,
+                    excluded_state_fips: List[int]) -> 'CountyMatrix':
+        """
+        Build the matrices from the wide JHU confirmed and deaths frames.
+        Deaths rows are aligned to confirmed rows on FIPS, State/Territory and County.
+        """
+        conf_meta_columns, conf_dates = split_columns(df_confirmed_us.columns.tolist())
+        deaths_meta_columns, deaths_dates = split_columns(df_deaths_us.columns.tolist())
+
+        counties = df_confirmed_us.loc[:, ['FIPS', 'Province_State', 'Admin2']].rename(
+            columns={'Province_State': 'State/Territory', 'Admin2': 'County'})
+        counties['FIPS'] = counties['FIPS'].fillna(0).astype(int)
+        counties['State FIPS'] = counties['FIPS'] // 1000
+        counties['row'] = np.arange(len(counties))
+
+        # drop cruise ships, out-of-state and non-county rows, then group the rows by state
+        counties = counties[~counties['State FIPS'].isin(excluded_state_fips)]
+        counties = counties.sort_values('State/Territory', kind='mergesort')
+        counties['County-State'] = counties['County'] + ', ' + counties['State/Territory']
+
+        # position of every county in the deaths frame, -1 when it is missing there
+        deaths_keys = df_deaths_us.loc[:, ['FIPS', 'Province_State', 'Admin2', 'Population']].rename(
+            columns={'Province_State': 'State/Territory', 'Admin2': 'County'})
+        deaths_keys['FIPS'] = deaths_keys['FIPS'].fillna(0).astype(int)
+        deaths_keys['deaths_row'] = np.arange(len(deaths_keys))
+        counties = pd.merge(counties, deaths_keys, how='left', on=['FIPS', 'State/Territory', 'County'])
+        deaths_rows = counties['deaths_row'].fillna(-1).astype(int).to_numpy()
+
+        conf_rows = counties['row'].to_numpy()
+        confirmed = df_confirmed_us.loc[:, conf_dates].to_numpy(dtype=np.int32)[conf_rows]
+
+        # deaths laid out on the confirmed date columns, zero where a county or date is missing
+        deaths_values = df_deaths_us.loc[:, deaths_dates].to_numpy(dtype=np.int32)
+        deaths_position = {date: i for i, date in enumerate(deaths_dates)}
+        deaths_columns = np.array([deaths_position.get(date, -1) for date in conf_dates], dtype=int)
+        deaths = np.zeros_like(confirmed)
+        present_rows = deaths_rows >= 0
+        present_columns = deaths_columns >= 0
+        deaths[np.ix_(present_rows, present_columns)] = deaths_values[
+            np.ix_(deaths_rows[present_rows], deaths_columns[present_columns])]
+
+        counties = counties.loc[:, ['State FIPS', 'FIPS', 'State/Territory', 'County', 'County-State', 'Population']]
+        dates = pd.to_datetime(conf_dates, format='%m/%d/%y')
+
+        return cls(counties, dates, confirmed, deaths)
+
+    @classmethod
+    def from_snapshot(cls, version: str = None, start=None, end=None) -> Optional['CountyMatrix']:
+        """
+        Map the matrices the ingest wrote with snapshot_frames(). Their rows are already in matrix order and
+        int32, so confirmed and deaths stay read-only views of the mapping, shared by every worker.
+        :param start, end: first and last date, both inclusive and either None for no bound
+        :return: CountyMatrix or None if the snapshot has no matrices
+        """
+        confirmed = Snapshot.open(cls.SNAPSHOT['confirmed'], version)
+        deaths = Snapshot.open(cls.SNAPSHOT['deaths'], version)
+        if confirmed is None or deaths is None:
+            return None
+
+        meta, date_columns, meta_columns, confirmed_values = confirmed
+        counties = pd.DataFrame({col: meta[col] for col in meta_columns}, columns=meta_columns)
+        dates = pd.to_datetime(date_columns, format='%m/%d/%y')
+        columns = dates.slice_indexer(start, end)
+
+        return cls(counties, dates[columns], confirmed_values[:, columns], deaths[3][:, columns])
+
+    def snapshot_frames(self) -> Dict[str, pd.DataFrame]:
+        """
+        Wide frames of the matrices in matrix order for Snapshot.write, read back with from_snapshot()
+        :return: {snapshot collection: dataframe with JHU date columns}
+        """
+        date_columns = ['{}/{}/{:%y}'.format(date.month, date.day, date) for date in self.dates]
+        confirmed = pd.DataFrame(self.confirmed, columns=date_columns)
+        deaths = pd.DataFrame(self.deaths, columns=date_columns)
+        return {self.SNAPSHOT['confirmed']: pd.concat([self.counties, confirmed], axis=1),
+                self.SNAPSHOT['deaths']: deaths}
+
+    def state_rows(self, state_name: str) -> slice:
+        # contiguous rows of one state, empty slice for unknown states
+        return self._state_rows.get(state_name, slice(0, 0))
+
+    def between(self, start=None, end=None) -> 'CountyMatrix':
+        """
+        Same counties from start to end, both inclusive and either None for no bound; self when both are None.
+        The matrices are views of this one's.
+        """
+        if start is None and end is None:
+            return self
+
+        return self._take(self.dates.slice_indexer(start, end))
+
+    def resample(self, resolution: str = 'D') -> 'CountyMatrix':
+        """
+        Same counties on the last date of every week ('W') or month ('M'); self for daily.
+        daily() sums the SUMMED_METRICS over the days of each period in this matrix.
+        """
+        if resolution == 'D':
+            return self
+
+        ends = period_end_positions(self.dates, resolution)
+        resampled = self._take(ends)
+        resampled._period_starts = self._positions[np.r_[0, ends[:-1] + 1]] if len(ends) else ends
+        return resampled
+
+    def _take(self, columns) -> 'CountyMatrix':
+        # same counties on some date columns (a slice keeps views), sharing this matrix's root
+        return CountyMatrix(self.counties, self.dates[columns], self.confirmed[:, columns], self.deaths[:, columns],
+                            self._root, self._positions[columns])
+
+    def state_totals(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Confirmed and deaths summed per state, rows in the order of self.state_names
+        :return: (confirmed, deaths) int64 arrays of shape (states, days)
+        """
+        if not len(self.state_starts):
+            empty = np.zeros((0, len(self.dates)), dtype=np.int64)
+            return empty, empty
+
+        confirmed = np.add.reduceat(self.confirmed, self.state_starts, axis=0, dtype=np.int64)
+        deaths = np.add.reduceat(self.deaths, self.state_starts, axis=0, dtype=np.int64)
+        return confirmed, deaths
+
+    def national_totals(self) -> Tuple[np.ndarray, np.ndarray]:
+        # confirmed and deaths summed over every county, one value per day
+        return self.confirmed.sum(axis=0, dtype=np.int64), self.deaths.sum(axis=0, dtype=np.int64)
+
+    def series(self, metric: str) -> np.ndarray:
+        """
+        A DAILY_METRICS or PER_100K_METRICS series per county over this matrix's own dates only, not cached
+        :return: float64 array of shape (counties, days)
+        """
+        if metric in self.PER_100K_METRICS:
+            return per_100k(self.series(self.PER_100K_METRICS[metric]), self.counties['Population'])
+        matrix, kernel = self.DAILY_METRICS[metric]
+        return kernel(getattr(self, matrix))
+
+    def daily(self, metric: str, rows: slice = slice(None)) -> np.ndarray:
+        """
+        A DAILY_METRICS or PER_100K_METRICS series per county on self.dates, computed once (float32)
+        over the root matrix
+        :param rows: row slice, e.g. self.state_rows('Texas')
+        :return: array of shape (counties in rows, len(self.dates))
+        """
+        root = self._root
+        values = root._derived.get(metric)
+        if values is None:
+            values = root._derived[metric] = root.series(metric).astype(np.float32)
+
+        if metric in self.SUMMED_METRICS and self._period_starts is not None and len(self._positions):
+            # counts of every day of each period, a day without a count (NaN) adds nothing
+            first = int(self._period_starts[0])
+            days = np.nan_to_num(values[rows][:, first:int(self._positions[-1]) + 1].astype(np.float64))
+            return np.add.reduceat(days, self._period_starts - first, axis=1).astype(np.float32)
+        return values[rows][:, self._positions]
+
+    def state_daily(self, metric: str) -> np.ndarray:
+        """
+        A DAILY_METRICS series per state on self.dates, computed once over the root's state totals
+        :return: float64 array of shape (states, len(self.dates)), rows in the order of self.state_names
+        """
+        root = self._root
+        values = root._derived.get(('state', metric))
+        if values is None:
+            totals = root._derived.get('state_totals')
+            if totals is None:
+                totals = root._derived['state_totals'] = dict(zip(('confirmed', 'deaths'), root.state_totals()))
+            matrix, kernel = self.DAILY_METRICS[metric]
+            values = root._derived[('state', metric)] = kernel(totals[matrix])
+        return values[:, self._positions]
+
+    def latest(self, metric: str) -> np.ndarray:
+        """
+        A DAILY_METRICS or PER_100K_METRICS value per county on the last date, from the HISTORY_DAYS
+        days before it only
+        """
+        if not len(self.dates):
+            return np.full(len(self.counties), np.nan)
+        end = int(self._positions[-1]) + 1
+        return self._root._take(slice(max(end - HISTORY_DAYS - 1, 0), end)).series(metric)[:, -1]
+
+    def long_frame(self, rows: slice = slice(None), metrics: Sequence[str] = ()) -> pd.DataFrame:
+        """
+        Long county-day frame, same layout as the old melted CovidCounties.ts_complete_counties().
+        Only materialize it for the rows a figure needs.
+        :param rows: row slice, e.g. self.state_rows('Texas')
+        :param metrics: DAILY_METRICS or PER_100K_METRICS series to add as columns
+        :return: dataframe ordered by date, then county
+        """
+        counties = self.counties.iloc[rows]
+        n_counties, n_dates = len(counties), len(self.dates)
+
+        # date-major order like pd.melt: every county for the first date, then the next date, ...
+        df = pd.DataFrame({col: np.tile(counties[col].to_numpy(), n_dates)
+                           for col in ['State FIPS', 'FIPS', 'State/Territory', 'County', 'County-State']})
+        df['Date'] = np.repeat(self.dates.to_numpy(), n_counties)
+        df['Confirmed Cases'] = self.confirmed[rows].T.ravel()
+        df['Population'] = np.tile(counties['Population'].to_numpy(), n_dates)
+        df['Deaths'] = self.deaths[rows].T.ravel()
+
+        # calculate 'Death Rate' by county using time series models
+        df['Death Rate (%)'] = 100 * df['Deaths'].div(
+            df['Confirmed Cases']).replace((np.inf, -np.inf, np.nan), (0, 0, 0)).round(6)
+
+        # create pop_factor (1000) to calculate 'Cases per 1000'
+        df['pop_factor'] = df['Population'].fillna(0).div(1000)
+
+        # calculate 'Cases per 1000' for time series
+        df['Cases per 1000'] = df['Confirmed Cases'].div(
+            df['pop_factor']).replace((np.inf, -np.inf, np.nan), (0, 0, 0)).round(4)
+
+        for metric in metrics:
+            df[metric] = self.daily(metric, rows).T.ravel()
+
+        return df
+
+    def states_long_frame(self) -> pd.DataFrame:
+        """
+        Long state-day frame of summed confirmed cases and deaths and their DAILY_METRICS series
+        :return: dataframe with State/Territory, Date, Confirmed Cases, Deaths and a column per daily series,
+                 ordered by state, then date
+        """
+        confirmed, deaths = self.state_totals()
+        n_states, n_dates = confirmed.shape
+
+        df = pd.DataFrame({
+            'State/Territory': np.repeat(np.array(self.state_names, dtype=object), n_dates),
+            'Date': np.tile(self.dates.to_numpy(), n_states),
+            'Confirmed Cases': confirmed.ravel(),
+            'Deaths': deaths.ravel(),
+        })
+        for metric in self.DAILY_METRICS:
+            df[metric] = self.state_daily(metric).ravel()
+
+        return df
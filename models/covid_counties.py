@@ -1,21 +1,74 @@
+from typing import Optional
+
 import pandas as pd
 import numpy as np
-from common.database import Database
+from common.snapshot import select_dates, split_columns
+from common.windows import history_start
+from models.source import DataSource
+from models.county_matrix import CountyMatrix
 
 
 class CovidCounties:
+    # state FIPS removed from county models: 88 and 99 (cruise ships), 80 (out of state), 0 (non-counties)
+    EXCLUDED_STATE_FIPS = [88, 99, 80, 0]
+
+    @classmethod
+    def normalize_fips(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Integer 'FIPS' (missing -> 0) and 'State FIPS' as fips // 1000, in place.
+        :return: the same dataframe
+        """
+        df['FIPS'] = df['FIPS'].fillna(0).astype(int)
+        df['State FIPS'] = df['FIPS'] // 1000
+        return df
+
     @classmethod
-    def agg_confirmed_counties(cls) -> pd.DataFrame:
-        cursor = Database.read_all('confirmed_ts')
-        df_confirmed_us = pd.DataFrame(list(cursor))
+    def county_mask(cls, df: pd.DataFrame) -> pd.Series:
+        # single boolean mask for every excluded state FIPS, expects normalize_fips() columns
+        return ~df['State FIPS'].isin(cls.EXCLUDED_STATE_FIPS)
 
-        if '_id' in df_confirmed_us.columns:
-            df_confirmed_us.drop(['_id'], axis=1, inplace=True)
+    @classmethod
+    def display_columns(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Formatted string columns for figure hover labels and tables; only built for the rows a
+        figure actually plots instead of being stored on the model frames.
+        :return: copy of df with 'FIPS Code', 'Confirmed Cases', 'Deaths' and 'Est Pop' added when their source exists
+        """
+        df = df.copy()
+        if 'FIPS' in df.columns:
+            df['FIPS Code'] = df['FIPS'].astype(str).str.zfill(5)
+        if 'confirmed' in df.columns:
+            df['Confirmed Cases'] = df['confirmed'].map('{:,}'.format)
+        if 'deaths' in df.columns:
+            df['Deaths'] = df['deaths'].fillna(0).astype(int).map('{:,}'.format)
+        if 'Population' in df.columns:
+            df['Est Pop'] = df['Population'].fillna(0).astype(int).map('{:,}'.format)
+        return df
+
+    @classmethod
+    def as_of_column(cls, df: pd.DataFrame, as_of=None) -> str:
+        """
+        Date column of a wide JHU frame holding the cumulative values as of a date
+        :param as_of: date, None for the latest column
+        """
+        _, date_columns = split_columns(df.columns.tolist())
+        selected = select_dates(date_columns, as_of=as_of or 'latest')
+        if not selected:
+            raise ValueError('no data on or before {}'.format(as_of))
+        return selected[0]
 
-        # grab only the latest date confirmed case numbers - cumulative
+    @classmethod
+    def agg_confirmed_counties(cls, df_confirmed_us: pd.DataFrame = None, as_of=None) -> pd.DataFrame:
+        """
+        :param as_of: date of the cumulative numbers, None for the latest date; only that date column is read
+        """
+        if df_confirmed_us is None:
+            df_confirmed_us = DataSource.read('confirmed_ts', as_of=as_of or 'latest')
+
+        # grab only the as-of date confirmed case numbers - cumulative
         df1 = df_confirmed_us.loc[:, ['FIPS', 'Admin2', 'Province_State', 'Lat', 'Long_', 'Combined_Key']]
 
-        last_col_name = df_confirmed_us.columns.tolist()[-1]
+        last_col_name = cls.as_of_column(df_confirmed_us, as_of)
         df2 = df_confirmed_us.loc[:, last_col_name]
 
         df_confirmed_counties_agg = pd.concat([df1, df2], axis=1)
@@ -27,49 +80,32 @@ class CovidCounties:
                                                   'Admin2': 'County',
                                                   'Combined_Key': 'County-State'}, inplace=True)
         # shorten County-State column by removing US
-        df_confirmed_counties_agg['County-State'] = df_confirmed_counties_agg['County-State'].apply(lambda x: x.replace(', US', '').replace(',US', ''))
-        # convert FIPS into string
-        df_confirmed_counties_agg['FIPS'] = df_confirmed_counties_agg['FIPS'].fillna(0).astype(int).apply(lambda x: str(x).zfill(5))
-        # this depends on FIPS being adjusted by .zfill(5)
-        df_confirmed_counties_agg['State FIPS'] = df_confirmed_counties_agg['FIPS'].apply(lambda x: x[:2])
-
-        # create formatted Death column strings with commas
-        df_confirmed_counties_agg['Confirmed Cases'] = df_confirmed_counties_agg['confirmed'].apply(lambda x: '{:,}'.format(x))
+        df_confirmed_counties_agg['County-State'] = df_confirmed_counties_agg['County-State'].str.replace(
+            ', US', '', regex=False).str.replace(',US', '', regex=False)
+        # integer FIPS and State FIPS
+        cls.normalize_fips(df_confirmed_counties_agg)
 
         # drop rows with Diamond Princess and Grand Princess and 80 out of state
-        drop_list = ['88', '99', '80', '00']
-        for fips in drop_list:
-            df_confirmed_counties_agg = df_confirmed_counties_agg.drop(
-                df_confirmed_counties_agg.index[df_confirmed_counties_agg['State FIPS'] == fips]).reset_index(drop=True)
+        df_confirmed_counties_agg = df_confirmed_counties_agg[cls.county_mask(df_confirmed_counties_agg)].reset_index(drop=True)
 
         return df_confirmed_counties_agg
 
     @classmethod
-    def agg_deaths_counties(cls) -> pd.DataFrame:
-        cursor = Database.read_all('deaths_ts')
-        df_deaths_us = pd.DataFrame(list(cursor))
-
-        if '_id' in df_deaths_us.columns:
-            df_deaths_us.drop(['_id'], axis=1, inplace=True)
+    def agg_deaths_counties(cls, df_deaths_us: pd.DataFrame = None, as_of=None) -> pd.DataFrame:
+        if df_deaths_us is None:
+            df_deaths_us = DataSource.read('deaths_ts', as_of=as_of or 'latest')
 
         # create base df
         df_deaths_counties_stg = df_deaths_us.loc[:, ['FIPS', 'Admin2', 'Province_State', 'Population']]
-        # format FIPS
-        df_deaths_counties_stg['FIPS'] = df_deaths_counties_stg['FIPS'].fillna(0).astype(int).apply(
-            lambda x: str(x).zfill(5))
-        # create state_fips column
-        df_deaths_counties_stg['State FIPS'] = df_deaths_counties_stg['FIPS'].apply(lambda x: x[:2])
-
-        # add cumulative confirmed case values
-        last_col_name = df_deaths_us.columns.tolist()[-1]
+        # integer FIPS and State FIPS
+        cls.normalize_fips(df_deaths_counties_stg)
+
+        # add cumulative deaths as of the date
+        last_col_name = cls.as_of_column(df_deaths_us, as_of)
         df_deaths_counties_agg = pd.concat([df_deaths_counties_stg, df_deaths_us.loc[:, last_col_name]], axis=1)
 
         # remove state_fips = 88 (cruise ship), 99 (cruise ship), 80 (out of state), 00 (non-counties)
-        remove_state_fips = ['88', '99', '80', '00']
-        for state_fips in remove_state_fips:
-            df_deaths_counties_agg = df_deaths_counties_agg.drop(
-                df_deaths_counties_agg.index[df_deaths_counties_agg['State FIPS'] == state_fips]
-            ).reset_index(drop=True)
+        df_deaths_counties_agg = df_deaths_counties_agg[cls.county_mask(df_deaths_counties_agg)].reset_index(drop=True)
 
         # rename columns
         dt_col_name = df_deaths_counties_agg.columns[-1]
@@ -77,21 +113,25 @@ class CovidCounties:
                                                'Admin2': 'County',
                                                dt_col_name: 'deaths'}, inplace=True)
 
-        # create formatted Death column strings with commas
-        df_deaths_counties_agg['Deaths'] = df_deaths_counties_agg['deaths'].apply(lambda x: '{:,}'.format(x))
-
         # create county-state column
         df_deaths_counties_agg['County-State'] = df_deaths_counties_agg['County'] + ", " + df_deaths_counties_agg['State/Territory']
 
         return df_deaths_counties_agg
 
     @classmethod
-    def agg_complete_counties(cls) -> pd.DataFrame:
-        df_confirmed_counties_agg = cls.agg_confirmed_counties()
-        df_deaths_counties_agg = cls.agg_deaths_counties()
+    def agg_complete_counties(cls, df_confirmed_us: pd.DataFrame = None, df_deaths_us: pd.DataFrame = None,
+                              county_matrix: CountyMatrix = None, as_of=None) -> pd.DataFrame:
+        """
+        Cumulative confirmed cases and deaths by county as of a date
+        :param county_matrix: output of ts_matrix_counties(), adds the latest value of every daily series
+                              (CountyMatrix.DAILY_METRICS, PER_100K_METRICS) when given
+        :param as_of: date of the numbers, None for the latest date
+        """
+        df_confirmed_counties_agg = cls.agg_confirmed_counties(df_confirmed_us, as_of)
+        df_deaths_counties_agg = cls.agg_deaths_counties(df_deaths_us, as_of)
 
         df_deaths_counties_agg = df_deaths_counties_agg.loc[:, ['State FIPS', 'FIPS', 'County', 'State/Territory',
-                                                                'Population', 'deaths', 'Deaths']]
+                                                                'Population', 'deaths']]
         join_columns = ['State FIPS', 'FIPS', 'County', 'State/Territory']
         df_complete_counties_agg = pd.merge(df_confirmed_counties_agg, df_deaths_counties_agg, how='left', on=join_columns)
 
@@ -99,104 +139,57 @@ class CovidCounties:
         df_complete_counties_agg['Death Rate (%)'] = round(100 * df_complete_counties_agg['deaths'].div(
             df_complete_counties_agg['confirmed']).replace((np.inf, -np.inf, np.nan), (0, 0, 0)), 4)
 
-        df_complete_counties_agg['Est Pop'] = df_complete_counties_agg['Population'].fillna(0).astype(int).apply(lambda x: '{:,}'.format(x))
-
         df_complete_counties_agg['pop_factor'] = df_complete_counties_agg['Population'].fillna(0).div(1000)
 
         df_complete_counties_agg['Cases per 1000'] = df_complete_counties_agg['confirmed'].div(
             df_complete_counties_agg['pop_factor']).replace((np.inf, -np.inf, np.nan), (0, 0, 0)).round(4)
 
+        # daily series on the as-of date, computed from the matrix's last days only
+        if county_matrix is not None:
+            county_matrix = county_matrix.between(end=as_of)
+            df_daily = county_matrix.counties.loc[:, ['FIPS', 'State/Territory', 'County']]
+            for metric in list(CountyMatrix.DAILY_METRICS) + list(CountyMatrix.PER_100K_METRICS):
+                df_daily[metric] = county_matrix.latest(metric).round(2)
+            df_daily = df_daily.drop_duplicates(['FIPS', 'State/Territory', 'County'])
+            df_complete_counties_agg = pd.merge(df_complete_counties_agg, df_daily, how='left',
+                                                on=['FIPS', 'State/Territory', 'County'])
+
         return df_complete_counties_agg
 
     @classmethod
-    def ts_confirmed_counties(cls) -> pd.DataFrame:
-        cursor = Database.read_all('confirmed_ts')
-        df_confirmed_us = pd.DataFrame(list(cursor))
-
-        if '_id' in df_confirmed_us.columns:
-            df_confirmed_us.drop(['_id'], axis=1, inplace=True)
-
-        # create initial time series df
-        df_conf_counties_ts = pd.concat(
-            [df_confirmed_us.loc[:, ['FIPS', 'Province_State', 'Admin2']], df_confirmed_us.iloc[:, 11:]],
-            axis=1
-        )
-        # rename columns
-        df_conf_counties_ts.rename(columns={'Province_State': 'State/Territory', 'Admin2': 'County'}, inplace=True)
-
-        # modify FIPS column to string
-        df_conf_counties_ts['FIPS'] = df_conf_counties_ts['FIPS'].fillna(0).astype(int).apply(lambda x: str(x).zfill(5))
-        # create state_fips string column
-        df_conf_counties_ts['State FIPS'] = df_conf_counties_ts['FIPS'].apply(lambda x: x[:2])
-
-        # drop rows with these values - cruise ships, out-of-state, and non-county rows
-        state_fips_remove = ['88', '99', '80', '00']
-        for i in state_fips_remove:
-            df_conf_counties_ts = df_conf_counties_ts.drop(
-                df_conf_counties_ts.index[df_conf_counties_ts['State FIPS'] == i]
-            ).reset_index(drop=True)
-
-        # transpose the TS models with pd.melt
-        df_conf_counties_ts = pd.melt(df_conf_counties_ts,
-                                      id_vars=['State FIPS', 'FIPS', 'State/Territory', 'County'],
-                                      var_name='Date',
-                                      value_name='Confirmed Cases')
-        # convert Date into datetime
-        df_conf_counties_ts['Date'] = pd.to_datetime(df_conf_counties_ts['Date'])
-
-        # create County-State column
-        df_conf_counties_ts['County-State'] = df_conf_counties_ts['County'] + ', ' + df_conf_counties_ts['State/Territory']
-
-        return df_conf_counties_ts
+    def ts_matrix_counties(cls, df_confirmed_us: pd.DataFrame = None, df_deaths_us: pd.DataFrame = None,
+                           start=None, end=None) -> CountyMatrix:
+        """
+        County x day confirmed and deaths matrices, the internal form of the county time series.
+        :param start, end: first and last date, both inclusive; only those date columns are read, plus the
+                           HISTORY_DAYS before start the daily series of the first days need
+        :return: CountyMatrix
+        """
+        if df_confirmed_us is None and df_deaths_us is None:
+            county_matrix = cls.snapshot_matrix(start, end)
+            if county_matrix is not None:
+                return county_matrix
+
+        if df_confirmed_us is None:
+            df_confirmed_us = DataSource.read('confirmed_ts', start=history_start(start), end=end)
+        if df_deaths_us is None:
+            df_deaths_us = DataSource.read('deaths_ts', start=history_start(start), end=end)
+
+        return CountyMatrix.from_frames(df_confirmed_us, df_deaths_us, cls.EXCLUDED_STATE_FIPS).between(start, end)
 
     @classmethod
-    def ts_deaths_counties(cls) -> pd.DataFrame:
-        cursor = Database.read_all('deaths_ts')
-        df_deaths_us = pd.DataFrame(list(cursor))
-
-        if '_id' in df_deaths_us.columns:
-            df_deaths_us.drop(['_id'], axis=1, inplace=True)
-
-        # create new df
-        df_deaths_counties_ts = pd.concat(
-            [df_deaths_us.loc[:, ['FIPS', 'Province_State', 'Admin2', 'Population']], df_deaths_us.iloc[:, 12:]], axis=1)
-
-        # rename columns
-        df_deaths_counties_ts.rename(columns={'Province_State': 'State/Territory', 'Admin2': 'County'}, inplace=True)
-
-        # modify FIPS column
-        df_deaths_counties_ts['FIPS'] = df_deaths_counties_ts['FIPS'].fillna(0).astype(int).apply(lambda x: str(x).zfill(5))
-
-        # transposing the models
-        df_deaths_counties_ts = pd.melt(df_deaths_counties_ts,
-                                        id_vars=['FIPS', 'State/Territory', 'County', 'Population'],
-                                        var_name='Date',
-                                        value_name='Deaths')
-        # convert Date string into Date datetime
-        df_deaths_counties_ts['Date'] = pd.to_datetime(df_deaths_counties_ts['Date'])
-
-        return df_deaths_counties_ts
+    def snapshot_matrix(cls, start=None, end=None) -> Optional[CountyMatrix]:
+        """
+        County matrix mapped read-only from the snapshot, no copy of the arrays (see CountyMatrix.from_snapshot)
+        :return: CountyMatrix or None when the backend does not read the snapshot or it holds no matrices
+        """
+        if not DataSource.uses_snapshot():
+            return None
+        county_matrix = CountyMatrix.from_snapshot(start=history_start(start), end=end)
+        return None if county_matrix is None else county_matrix.between(start, end)
 
     @classmethod
-    def ts_complete_counties(cls) -> pd.DataFrame:
-        df_conf_counties_ts = cls.ts_confirmed_counties()
-        df_deaths_counties_ts = cls.ts_deaths_counties()
-
-        # select subset of columns
-        df_deaths_counties_ts = df_deaths_counties_ts.loc[:, ['FIPS', 'State/Territory', 'County',
-                                                              'Date', 'Population', 'Deaths']]
-        join_columns = ['FIPS', 'State/Territory', 'County', 'Date']
-        df_complete_counties_ts = pd.merge(df_conf_counties_ts, df_deaths_counties_ts, how='left', on=join_columns)
-
-        # calculate 'Death Rate' by county using time series models
-        df_complete_counties_ts['Death Rate (%)'] = 100 * df_complete_counties_ts['Deaths'].div(
-            df_complete_counties_ts['Confirmed Cases']).replace((np.inf, -np.inf, np.nan), (0, 0, 0)).round(6)
-
-        # create pop_factor (1000) to calculate 'Cases per 1000'
-        df_complete_counties_ts['pop_factor'] = df_complete_counties_ts['Population'].fillna(0).div(1000)
-
-        # calculate 'Cases per 1000' for time series
-        df_complete_counties_ts['Cases per 1000'] = df_complete_counties_ts['Confirmed Cases'].div(
-            df_complete_counties_ts['pop_factor']).replace((np.inf, -np.inf, np.nan), (0, 0, 0)).round(4)
-
-        return df_complete_counties_ts
+    def ts_complete_counties(cls, df_confirmed_us: pd.DataFrame = None, df_deaths_us: pd.DataFrame = None,
+                             start=None, end=None) -> pd.DataFrame:
+        # long county-day frame materialized from the matrices, no melt + merge on Date
+        return cls.ts_matrix_counties(df_confirmed_us, df_deaths_us, start, end).long_frame()
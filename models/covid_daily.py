@@ -0,0 +1,152 @@
+from datetime import datetime
+from typing import List
+
+import numpy as np
+import pandas as pd
+from pymongo import ReplaceOne
+from common.database import Database
+from models.county_matrix import CountyMatrix
+
+
+class CovidDaily:
+    """
+    Normalized county time series in the 'counties_daily' collection, one bucket document per county
+    per calendar month:
+
+    {'_id': '01001-2020-03', 'FIPS': 1001, 'State FIPS': 1, 'State/Territory': 'Alabama',
+     'County': 'Autauga', 'month': 2020-03-01, 'dates': [...], 'confirmed': [...], 'deaths': [...]}
+
+    Compound indexes on (State FIPS, month) and (month) let per-state and latest-date reads
+    filter and project in Mongo instead of pulling every date of every county.
+    """
+    COLLECTION = 'counties_daily'
+    INDEXES = [
+        ([('FIPS', 1), ('month', 1)], True),
+        ([('State FIPS', 1), ('month', 1)], False),
+        ([('month', 1)], False),
+    ]
+
+    @classmethod
+    def create_indexes(cls):
+        for keys, unique in cls.INDEXES:
+            Database.create_index(cls.COLLECTION, keys, unique=unique)
+
+    @classmethod
+    def bucket_requests(cls, county_matrix: CountyMatrix, since: datetime = None) -> List[ReplaceOne]:
+        """
+        Upserts for every county bucket from the month of `since` on (every month if None)
+        """
+        months = county_matrix.dates.to_period('M')
+        month_starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+        month_ends = np.r_[month_starts[1:], len(months)]
+        if since is not None:
+            since_month = pd.Timestamp(since).to_period('M')
+            keep = months[month_starts] >= since_month
+            month_starts, month_ends = month_starts[keep], month_ends[keep]
+
+        dates = county_matrix.dates.to_pydatetime()
+        counties = county_matrix.counties.to_dict('records')
+
+        requests = []
+        for start, end in zip(month_starts, month_ends):
+            month = dates[start].replace(day=1)
+            month_dates = list(dates[start:end])
+            confirmed = county_matrix.confirmed[:, start:end].tolist()
+            deaths = county_matrix.deaths[:, start:end].tolist()
+
+            for row, county in enumerate(counties):
+                bucket_id = '{:05d}-{}'.format(county['FIPS'], month.strftime('%Y-%m'))
+                bucket = {'_id': bucket_id,
+                          'FIPS': int(county['FIPS']),
+                          'State FIPS': int(county['State FIPS']),
+                          'State/Territory': county['State/Territory'],
+                          'County': county['County'],
+                          'month': month,
+                          'dates': month_dates,
+                          'confirmed': confirmed[row],
+                          'deaths': deaths[row]}
+                requests.append(ReplaceOne({'_id': bucket_id}, bucket, upsert=True))
+
+        return requests
+
+    @classmethod
+    def write_buckets(cls, county_matrix: CountyMatrix, since: datetime = None):
+        """
+        Write the county buckets; a daily ingest passes the first new date so only the current
+        month's buckets are replaced.
+        """
+        cls.create_indexes()
+        Database.bulk_write(cls.COLLECTION, cls.bucket_requests(county_matrix, since))
+
+    @classmethod
+    def latest_counties(cls, state_fips: int = None) -> pd.DataFrame:
+        """
+        Latest cumulative confirmed cases and deaths per county, read from the newest month buckets only
+        :param state_fips: limit to one state
+        :return: dataframe with FIPS, State FIPS, State/Territory, County, Date, confirmed, deaths
+        """
+        latest = Database.find_one(cls.COLLECTION, {}, {'month': 1}, sort=[('month', -1)])
+        if latest is None:
+            return pd.DataFrame(columns=['FIPS', 'State FIPS', 'State/Territory', 'County', 'Date',
+                                         'confirmed', 'deaths'])
+
+        query = {'month': latest['month']}
+        if state_fips is not None:
+            query['State FIPS'] = state_fips
+        projection = {'_id': 0, 'FIPS': 1, 'State FIPS': 1, 'State/Territory': 1, 'County': 1,
+                      'dates': {'$slice': -1}, 'confirmed': {'$slice': -1}, 'deaths': {'$slice': -1}}
+
+        records = [{'FIPS': bucket['FIPS'],
+                    'State FIPS': bucket['State FIPS'],
+                    'State/Territory': bucket['State/Territory'],
+                    'County': bucket['County'],
+                    'Date': bucket['dates'][0],
+                    'confirmed': bucket['confirmed'][0],
+                    'deaths': bucket['deaths'][0]}
+                   for bucket in Database.find(cls.COLLECTION, query, projection, sort=[('FIPS', 1)])]
+
+        return pd.DataFrame(records, columns=['FIPS', 'State FIPS', 'State/Territory', 'County', 'Date',
+                                              'confirmed', 'deaths'])
+
+    @classmethod
+    def state_ts(cls, state_fips: int, start: datetime = None, end: datetime = None) -> pd.DataFrame:
+        """
+        Every date (or the dates between start and end) for the counties of one state
+        :return: long dataframe with FIPS, State FIPS, State/Territory, County, Date, Confirmed Cases, Deaths
+        """
+        query = {'State FIPS': state_fips}
+        month_range = {}
+        if start is not None:
+            month_range['$gte'] = pd.Timestamp(start).to_period('M').to_timestamp().to_pydatetime()
+        if end is not None:
+            month_range['$lte'] = pd.Timestamp(end).to_period('M').to_timestamp().to_pydatetime()
+        if month_range:
+            query['month'] = month_range
+
+        projection = {'_id': 0, 'FIPS': 1, 'State FIPS': 1, 'State/Territory': 1, 'County': 1,
+                      'dates': 1, 'confirmed': 1, 'deaths': 1}
+        buckets = list(Database.find(cls.COLLECTION, query, projection, sort=[('FIPS', 1), ('month', 1)]))
+
+        columns = ['FIPS', 'State FIPS', 'State/Territory', 'County', 'Date', 'Confirmed Cases', 'Deaths']
+        if not buckets:
+            return pd.DataFrame(columns=columns)
+
+        # expand the bucket arrays into one row per county-day
+        lengths = [len(bucket['dates']) for bucket in buckets]
+        df = pd.DataFrame({
+            'FIPS': np.repeat([bucket['FIPS'] for bucket in buckets], lengths),
+            'State FIPS': np.repeat([bucket['State FIPS'] for bucket in buckets], lengths),
+            'State/Territory': np.repeat([bucket['State/Territory'] for bucket in buckets], lengths),
+            'County': np.repeat([bucket['County'] for bucket in buckets], lengths),
+            'Date': pd.to_datetime(np.concatenate([bucket['dates'] for bucket in buckets])),
+            'Confirmed Cases': np.concatenate([bucket['confirmed'] for bucket in buckets]),
+            'Deaths': np.concatenate([bucket['deaths'] for bucket in buckets]),
+        }, columns=columns)
+
+        # trim the partial first and last months
+        if start is not None:
+            df = df[df['Date'] >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df['Date'] <= pd.Timestamp(end)]
+
+        return df.reset_index(drop=True)
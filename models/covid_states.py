@@ -1,20 +1,54 @@
 import pandas as pd
 import numpy as np
+from common.windows import history_start
 from models.covid_counties import CovidCounties
+from models.county_matrix import CountyMatrix
 from models.stats import Stats
 
 
 class CovidStates:
     @classmethod
-    def agg_complete_states(cls) -> pd.DataFrame:
+    def display_columns(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Formatted string columns for the states map hover labels, built for the plotted frame only
+        :return: copy of df_states_agg with '2019 Est Pop', 'Confirmed Cases', 'Deaths', 'Cases per 100k'
+                 and 'Deaths per 100k' added
+        """
+        df = df.copy()
+        df['2019 Est Pop'] = df['Population'].fillna(0).astype(int).map('{:,}'.format)
+        df['Confirmed Cases'] = df['confirmed'].map('{:,}'.format)
+        df['Deaths'] = df['deaths'].fillna(0).map('{:,}'.format)
+        df['Cases per 100k'] = df['cc_per_100k'].map('{:,}'.format)
+        df['Deaths per 100k'] = df['d_per_100k'].map('{:,}'.format)
+        return df
+
+    @classmethod
+    def date_mask(cls, df: pd.DataFrame, start=None, end=None) -> pd.Series:
+        # rows of a long frame from start to end, both inclusive and either None for no bound
+        mask = pd.Series(True, index=df.index)
+        if start is not None:
+            mask &= df['Date'] >= pd.Timestamp(start)
+        if end is not None:
+            mask &= df['Date'] <= pd.Timestamp(end)
+        return mask
+
+    @classmethod
+    def agg_complete_states(cls, df_counties_agg: pd.DataFrame = None, df_states_stats: pd.DataFrame = None,
+                            df_states_ts: pd.DataFrame = None, as_of=None) -> pd.DataFrame:
         """
         Cumulative confirmed cases and deaths by state
+        :param df_counties_agg: output of CovidCounties.agg_complete_counties(), read if not given
+        :param df_states_stats: output of Stats.states_stats(), read if not given
+        :param df_states_ts: output of ts_complete_states(), adds every daily series on the as-of date when given
+        :param as_of: date of the cumulative numbers when df_counties_agg is read, None for the latest date
         :return: dataframe
         """
 
         # import and create base dataframes
-        df_counties_agg = CovidCounties.agg_complete_counties()
-        df_states_stats = Stats.states_stats()
+        if df_counties_agg is None:
+            df_counties_agg = CovidCounties.agg_complete_counties(as_of=as_of)
+        if df_states_stats is None:
+            df_states_stats = Stats.states_stats()
 
         # sum confirmed by state
         df_confirmed_states_agg = df_counties_agg.groupby('State/Territory')['confirmed'].sum().reset_index()
@@ -22,22 +56,12 @@ class CovidStates:
         # merge states stats
         df_confirmed_states_agg = pd.merge(df_confirmed_states_agg, df_states_stats, how='left', on='State/Territory')
 
-        # format population with separating commas
-        df_confirmed_states_agg['2019 Est Pop'] = df_confirmed_states_agg['Population'].fillna(0).astype(int).apply(
-            lambda x: '{:,}'.format(x))
-
-        # create 'Confirmed Cases' column formatted with commas and keep 'confirmed' column as integer
-        df_confirmed_states_agg['Confirmed Cases'] = df_confirmed_states_agg['confirmed'].apply(lambda x: '{:,}'.format(x))
-
         # create dataframe deaths by state
         df_deaths_states_agg = df_counties_agg.groupby('State/Territory')['deaths'].sum().reset_index()
 
         # merge df_confirmed_states_agg and df_deaths_states_agg
         df_states_agg = pd.merge(df_confirmed_states_agg, df_deaths_states_agg, on='State/Territory', how='left')
 
-        # create formatted string Deaths column
-        df_states_agg['Deaths'] = df_states_agg['deaths'].fillna(0).apply(lambda x: '{:,}'.format(x))
-
         # create population 100k factor to calculate confirmed cases per 100k and deaths per 100k
         df_states_agg['pop_factor'] = df_states_agg['Population'].div(100000).replace((np.inf, -np.inf, np.nan), (0, 0, 0))
 
@@ -48,11 +72,18 @@ class CovidStates:
         df_states_agg['d_per_100k'] = df_states_agg['deaths'].div(
             df_states_agg['pop_factor']).replace((np.nan, np.inf, -np.inf), (0, 0, 0)).round(0)
 
-        # create formatted hover models for Plotly US map
-        df_states_agg['Cases per 100k'] = df_states_agg['cc_per_100k'].apply(lambda x: '{:,}'.format(x))
-        df_states_agg['Deaths per 100k'] = df_states_agg['d_per_100k'].apply(lambda x: '{:,}'.format(x))
+        # formatted hover columns for the Plotly US map are built by display_columns()
         df_states_agg['Death Rate (%)'] = round(100 * df_states_agg['deaths'].div(df_states_agg['confirmed']).replace((np.nan, np.inf, -np.inf), (0, 0, 0)), 4)
 
+        # daily series on the last date up to as_of, already computed with the state time series
+        if df_states_ts is not None:
+            df_latest = df_states_ts[cls.date_mask(df_states_ts, end=as_of)]
+            df_latest = df_latest[df_latest['Date'] == df_latest['Date'].max()]
+            daily_columns = list(CountyMatrix.DAILY_METRICS) + list(CountyMatrix.PER_100K_METRICS)
+            df_latest = df_latest.loc[:, ['State/Territory'] + daily_columns]
+            df_latest[daily_columns] = df_latest[daily_columns].round(2)
+            df_states_agg = pd.merge(df_states_agg, df_latest, how='left', on='State/Territory')
+
         remove_list = ['American Samoa', 'Federated States of Micronesia', 'Palau',
                        'Guam', 'Virgin Islands', 'Marshall Islands', 'Northern Mariana Islands']
         df_states_agg = df_states_agg.drop(df_states_agg.index[df_states_agg['State/Territory'].isin(remove_list)])
@@ -60,27 +91,33 @@ class CovidStates:
         return df_states_agg
 
     @classmethod
-    def ts_complete_states(cls) -> pd.DataFrame:
+    def ts_complete_states(cls, county_matrix: CountyMatrix = None, df_states_stats: pd.DataFrame = None,
+                           start=None, end=None) -> pd.DataFrame:
         """
         State-level time series models of confirmed cases, deaths, CC per 100k, deaths per 100k,
         confirmed infection rate, death rate.
+        Daily series: new cases and deaths, their 7 and 14-day means, 7-day means per 100k
+        and week over week growth, see CountyMatrix.DAILY_METRICS.
 
+        :param county_matrix: output of CovidCounties.ts_matrix_counties(), read if not given
+        :param df_states_stats: output of Stats.states_stats(), read if not given
+        :param start, end: first and last date, both inclusive
         :return: df_states_ts dataframe
         """
 
-        # county-level time series confirmed cases and death dataframe
-        df_counties_ts = CovidCounties.ts_complete_counties()
-        df_states_stats = Stats.states_stats()
+        # county x day confirmed cases and deaths matrices
+        if county_matrix is None:
+            county_matrix = CovidCounties.ts_matrix_counties(start=start, end=end)
+        else:
+            county_matrix = county_matrix.between(start, end)
+        if df_states_stats is None:
+            df_states_stats = Stats.states_stats()
 
-        # group confirmed cases by state - rolling up county level to state level
-        df_conf_states_ts = df_counties_ts.groupby(['State/Territory', 'Date'])['Confirmed Cases'].sum().reset_index()
+        # roll up county level to state level by summing each state's block of rows
+        df_states_ts = county_matrix.states_long_frame()
 
         # merge df_states_stats
-        df_conf_states_ts = pd.merge(df_conf_states_ts, df_states_stats, how='left', on='State/Territory')
-
-        # merge state level deaths models
-        df_deaths_states_ts = df_counties_ts.groupby(['State/Territory', 'Date'])['Deaths'].sum().reset_index()
-        df_states_ts = pd.merge(df_conf_states_ts, df_deaths_states_ts, how='left', on=['State/Territory', 'Date'])
+        df_states_ts = pd.merge(df_states_ts, df_states_stats, how='left', on='State/Territory')
 
         # create metrics: pop_factor, cc per 100k, deaths per 100k, death rate, confirmed infection rate
         df_states_ts['pop_factor'] = df_states_ts['Population'].div(100000)
@@ -94,12 +131,20 @@ class CovidStates:
         df_states_ts['Death Rate (%)'] = 100 * df_states_ts['Deaths'].div(
             df_states_ts['Confirmed Cases']).replace((np.inf, -np.inf, np.nan), (0, 0, 0)).round(6)
 
+        # 7-day means per 100k, NaN without a population
+        for metric, daily_metric in CountyMatrix.PER_100K_METRICS.items():
+            df_states_ts[metric] = df_states_ts[daily_metric].div(
+                df_states_ts['pop_factor']).replace((np.inf, -np.inf), (np.nan, np.nan)).round(2)
+
         return df_states_ts
 
     @classmethod
-    def ts_complete_national(cls) -> pd.DataFrame:
-        # state-level time series
-        df_states_ts = cls.ts_complete_states()
+    def ts_complete_national(cls, df_states_ts: pd.DataFrame = None, start=None, end=None) -> pd.DataFrame:
+        # state-level time series up to end, from the HISTORY_DAYS before start the daily series need
+        if df_states_ts is None:
+            df_states_ts = cls.ts_complete_states(start=history_start(start), end=end)
+        elif start is not None or end is not None:
+            df_states_ts = df_states_ts[cls.date_mask(df_states_ts, history_start(start), end)]
 
         # confirmed cases and deaths at national level, and merge dataframes
         df_confirmed_ts = df_states_ts.groupby('Date')['Confirmed Cases'].sum().reset_index()
@@ -121,12 +166,26 @@ class CovidStates:
             df_usa_ts['Confirmed Cases']).replace((np.inf, -np.inf, np.nan), (0, 0, 0)).round(6)
         df_usa_ts['Confirmation Infection Rate (%)'] = 100 * df_usa_ts['Confirmed Cases'].div(df_usa_ts['Population']).round(6)
 
+        # daily series of the national totals, one row of the window kernels
+        confirmed = df_usa_ts['Confirmed Cases'].to_numpy()[None, :]
+        deaths = df_usa_ts['Deaths'].to_numpy()[None, :]
+        for metric, (matrix, kernel) in CountyMatrix.DAILY_METRICS.items():
+            df_usa_ts[metric] = kernel(confirmed if matrix == 'confirmed' else deaths)[0]
+        for metric, daily_metric in CountyMatrix.PER_100K_METRICS.items():
+            df_usa_ts[metric] = df_usa_ts[daily_metric].div(df_usa_ts['pop_factor']).round(2)
+
+        if start is not None:
+            df_usa_ts = df_usa_ts[cls.date_mask(df_usa_ts, start)].reset_index(drop=True)
+
         return df_usa_ts
 
     @classmethod
-    def latest_national_snapshot(cls) -> pd.DataFrame:
-        # last row will be the total aggregate for the USA because its cumulative
-        df_national_ts = cls.ts_complete_national()
+    def latest_national_snapshot(cls, df_national_ts: pd.DataFrame = None, as_of=None) -> pd.DataFrame:
+        # last row (up to as_of) will be the total aggregate for the USA because its cumulative
+        if df_national_ts is None:
+            df_national_ts = cls.ts_complete_national(end=as_of)
+        elif as_of is not None:
+            df_national_ts = df_national_ts[cls.date_mask(df_national_ts, end=as_of)]
         df_snapshot = df_national_ts.tail(1)
 
         df_snapshot = df_snapshot.loc[:, ['Population', 'Confirmed Cases', 'Deaths', 'Confirmed Cases per 100k', 'Deaths per 100k', 'Death Rate (%)']]
@@ -0,0 +1,218 @@
+import os
+import time
+import fcntl
+import random
+import logging
+import tempfile
+import threading
+from typing import Dict, Optional, Union
+
+import pandas as pd
+from models.compact import compact_frame, memory_report
+from models.source import DataSource
+from models.county_matrix import CountyMatrix
+from models.covid_counties import CovidCounties
+from models.covid_states import CovidStates
+from models.state_index import StateIndex
+from models.stats import Stats
+
+
+class ModelPipeline:
+    """
+    Builds every county, state and national model frame from a single read of the
+    'confirmed_ts', 'deaths_ts' and 'states_stats' collections.
+
+    NODES is the dependency graph: {name: (dependencies, builder)}. A node is built at most once
+    per data version and its result is shared by every node that depends on it.
+    """
+    NODES = {
+        # source reads
+        'confirmed_us': ((), lambda: DataSource.read('confirmed_ts', start=ModelPipeline.START)),
+        'deaths_us': ((), lambda: DataSource.read('deaths_ts', start=ModelPipeline.START)),
+        'states_stats': ((), Stats.states_stats),
+        # counties
+        'counties_agg': (('confirmed_us', 'deaths_us', 'county_matrix'), CovidCounties.agg_complete_counties),
+        'county_matrix': (('confirmed_us', 'deaths_us'), lambda *frames: ModelPipeline.county_matrix(*frames)),
+        # per-state row ranges, FIPS, centers and color ranges of the county aggregates
+        'state_index': (('counties_agg', 'states_stats'), StateIndex),
+        # long county-day frame, only built if something asks for all of it
+        'counties_ts': (('county_matrix',), lambda county_matrix: county_matrix.long_frame()),
+        # states
+        'states_agg': (('counties_agg', 'states_stats', 'states_ts'), CovidStates.agg_complete_states),
+        'states_ts': (('county_matrix', 'states_stats'), CovidStates.ts_complete_states),
+        # national
+        'national_ts': (('states_ts',), CovidStates.ts_complete_national),
+        'national_snapshot': (('national_ts',), CovidStates.latest_national_snapshot),
+    }
+
+    # first date read from storage (e.g. '2021-01-01'), None reads the whole history
+    START = os.environ.get('DATA_START') or None
+
+    # memory-optimized frames (categoricals, int32, float32) for the frames the dashboards keep
+    COMPACT = os.environ.get('COMPACT_FRAMES', '0') == '1'
+    COMPACT_NODES = ('counties_agg', 'counties_ts', 'states_agg', 'states_ts', 'national_ts')
+
+    def __init__(self):
+        self.version = self.data_version()
+        self._frames = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def data_version(cls) -> Optional[str]:
+        # snapshot version written by the ingest, the Mongo ingest watermark or the csv files' mtime, see DataSource
+        return DataSource.version()
+
+    @classmethod
+    def county_matrix(cls, confirmed_us: pd.DataFrame, deaths_us: pd.DataFrame) -> CountyMatrix:
+        # read-only views of the snapshot's matrices, built from the frames when there is no snapshot
+        county_matrix = CovidCounties.snapshot_matrix(cls.START)
+        return CovidCounties.ts_matrix_counties(confirmed_us, deaths_us) if county_matrix is None else county_matrix
+
+    def get(self, name: str) -> Union[pd.DataFrame, CountyMatrix, StateIndex]:
+        with self._lock:
+            if name not in self._frames:
+                dependencies, builder = self.NODES[name]
+                frame = builder(*[self.get(dependency) for dependency in dependencies])
+                if self.COMPACT and name in self.COMPACT_NODES:
+                    frame = compact_frame(frame)
+                self._frames[name] = frame
+
+            return self._frames[name]
+
+    def build_all(self) -> Dict[str, Union[pd.DataFrame, CountyMatrix, StateIndex]]:
+        return {name: self.get(name) for name in self.NODES}
+
+    def memory_usage(self) -> pd.DataFrame:
+        """
+        Deep memory usage of every dataframe built so far, see models.compact.memory_report
+        """
+        with self._lock:
+            frames = dict(self._frames)
+        return memory_report(frames)
+
+
+class PipelineReloader:
+    """
+    Holds the pipeline that serves requests and swaps in a new one when the data version changes.
+
+    The new pipeline is fully built in a background thread before a single reference assignment makes it
+    current, so a request that took the current pipeline keeps reading one consistent set of frames.
+    Workers rebuild one at a time under a file lock (plus a little jitter), so a new ingest never
+    costs every worker a rebuild at the same moment.
+
+    Nothing here runs at import: the watcher thread is started by the first request a worker serves
+    (init_app), after uwsgi or gunicorn --preload forked it from the master.
+    """
+    # seconds between data version checks, 0 disables reloading
+    INTERVAL = int(os.environ.get('DATA_RELOAD_INTERVAL', 60))
+    JITTER = 5
+    LOCK_FILE = os.environ.get('DATA_RELOAD_LOCK', os.path.join(tempfile.gettempdir(), 'covid19-dash-reload.lock'))
+    # frames the dashboards read, built before the swap
+    PRELOAD = ('counties_agg', 'county_matrix', 'state_index', 'states_stats', 'states_ts', 'states_agg',
+               'national_snapshot')
+    # when the PRELOAD frames are built: 'background' in each worker's watcher thread, started by its first request,
+    # 'fork' in the master process before workers fork (slow boot), 'off' only as requests need them
+    PRELOAD_MODE = os.environ.get('DATA_PRELOAD', 'background')
+
+    def __init__(self):
+        self._pipeline = None
+        self._lock = threading.Lock()
+        self._thread_pid = None
+
+    @property
+    def pipeline(self) -> ModelPipeline:
+        # created on first use, importing this module does not touch the data sources
+        if self._pipeline is None:
+            with self._lock:
+                if self._pipeline is None:
+                    self._pipeline = ModelPipeline()
+        return self._pipeline
+
+    def preload(self):
+        # build the frames the dashboards read, see PRELOAD_MODE
+        for name in self.PRELOAD:
+            self.pipeline.get(name)
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            logging.info('model frames (compact=%s):\n%s', ModelPipeline.COMPACT,
+                         self.pipeline.memory_usage().to_string(index=False))
+
+    def _after_fork(self):
+        """
+        A forked child gets fresh locks and no watcher: a lock held by a parent thread at fork time would never
+        be released. The parent's pipeline is dropped, unless 'fork' mode built it on purpose before forking, then
+        its frames are kept (shared copy-on-write) behind a new lock.
+        """
+        self._lock = threading.Lock()
+        self._thread_pid = None
+        if self._pipeline is not None and self.PRELOAD_MODE == 'fork':
+            self._pipeline._lock = threading.RLock()
+        else:
+            self._pipeline = None
+
+    def init_app(self, server):
+        # start the watcher from the first request of every worker, never in the process that imports the app
+        server.before_request(self.start)
+
+    def current(self) -> ModelPipeline:
+        return self.pipeline
+
+    def start(self):
+        # threads do not survive fork, so every worker starts its own watcher on its first request
+        if not (self.INTERVAL or self.PRELOAD_MODE == 'background') or self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid != os.getpid():
+                self._thread_pid = os.getpid()
+                threading.Thread(target=self._watch, name='pipeline-reloader', daemon=True).start()
+
+    def reload(self) -> bool:
+        """
+        Build a pipeline for the latest data version and make it current.
+        :return: True if a new pipeline was swapped in
+        """
+        if ModelPipeline.data_version() == self.pipeline.version:
+            return False
+
+        with open(self.LOCK_FILE, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                start = time.perf_counter()
+                pipeline = ModelPipeline()
+                for name in self.PRELOAD:
+                    pipeline.get(name)
+                previous, self._pipeline = self.pipeline, pipeline
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        logging.info('pid %s swapped data version %s for %s in %.1fs',
+                     os.getpid(), previous.version, pipeline.version, time.perf_counter() - start)
+        return True
+
+    def _watch(self):
+        if self.PRELOAD_MODE == 'background':
+            try:
+                self.preload()
+            except Exception as e:
+                # requests build the frames they need on first use
+                logging.error('Pipeline preload failed.', exc_info=e)
+        if not self.INTERVAL:
+            return
+
+        while True:
+            time.sleep(self.INTERVAL + random.uniform(0, self.JITTER))
+            try:
+                self.reload()
+            except Exception as e:
+                # keep serving the current frames, try again on the next check
+                logging.error('Pipeline reload failed.', exc_info=e)
+
+
+# shared by app_counties and app_states so both dashboards build from the same read
+reloader = PipelineReloader()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reloader._after_fork)
+
+
+def current_pipeline() -> ModelPipeline:
+    return reloader.current()
@@ -0,0 +1,179 @@
+import os
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pandas as pd
+from common.database import Database
+from common.ingest import Watermark, csv_dtypes
+from common.snapshot import Snapshot, select_dates, split_columns
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+
+class DataSource:
+    """
+    Where the model classes read the JHU time series and stats collections from, chosen with DATA_BACKEND:
+
+    'auto'      the memory-mapped snapshot written by the ingest, else MongoDB (default)
+    'mongo'     MongoDB only
+    'snapshot'  the snapshot, and the stats csv files the snapshot does not hold; no MongoDB connection
+    'csv'       the csv files in data/covid and data/stats, no MongoDB connection
+    'parquet'   columnar copies of those csv files (needs pyarrow), converted on first read and whenever
+    'feather'   a csv file is newer than its copy; falls back to 'csv' without pyarrow
+
+    Reads are pruned to the metadata columns the models use (COLUMNS) and to the date columns a caller
+    asks for (start, end, as_of); every backend only reads those columns from storage.
+    """
+    BACKEND = os.environ.get('DATA_BACKEND', 'auto')
+    FILE_BACKENDS = ('csv', 'parquet', 'feather')
+    CSV_FILES = {
+        'confirmed_ts': os.path.join('covid', 'time_series_covid19_confirmed_US.csv'),
+        'deaths_ts': os.path.join('covid', 'time_series_covid19_deaths_US.csv'),
+        'states_stats': os.path.join('stats', 'states_stats.csv'),
+        'counties_stats': os.path.join('stats', 'counties_stats.csv'),
+    }
+    DATA_DIR = os.environ.get('DATA_DIR', DATA_DIR)
+    COLUMNAR_DIR = os.environ.get('DATA_COLUMNAR_DIR', os.path.join(DATA_DIR, 'columnar'))
+    # metadata columns read by the models, None reads every column
+    COLUMNS = {
+        'confirmed_ts': ['FIPS', 'Admin2', 'Province_State', 'Lat', 'Long_', 'Combined_Key'],
+        'deaths_ts': ['FIPS', 'Admin2', 'Province_State', 'Population'],
+    }
+
+    @classmethod
+    def backend(cls) -> str:
+        if cls.BACKEND in ('parquet', 'feather'):
+            try:
+                import pyarrow
+            except ImportError:
+                logging.warning('DATA_BACKEND=%s needs pyarrow, reading csv files', cls.BACKEND)
+                cls.BACKEND = 'csv'
+        return cls.BACKEND
+
+    @classmethod
+    def read(cls, collection: str, columns: Optional[List[str]] = None, start=None, end=None,
+             as_of=None) -> pd.DataFrame:
+        """
+        Wide dataframe for a collection from the configured backend, reading only the selected columns.
+        :param columns: metadata columns to keep, COLUMNS[collection] by default
+        :param start, end: first and last date column to keep, None for no bound
+        :param as_of: keep only the last date column on or before this date, 'latest' for the last one
+        :return: dataframe without the Mongo '_id' column
+        """
+        columns = cls.COLUMNS.get(collection) if columns is None else columns
+        backend = cls.backend()
+
+        if backend in cls.FILE_BACKENDS:
+            return cls._read_file(collection, backend, columns, start, end, as_of)
+
+        if backend != 'mongo':
+            df = Snapshot.read_frame(collection, columns=columns, start=start, end=end, as_of=as_of)
+            if df is not None:
+                return df
+            if backend == 'snapshot':
+                # the snapshot only holds the time series, the stats come from their csv files
+                return cls._read_file(collection, 'csv', columns, start, end, as_of)
+
+        return cls._read_mongo(collection, columns, start, end, as_of)
+
+    @classmethod
+    def selected_columns(cls, all_columns: List[str], columns: Optional[List[str]], start=None, end=None,
+                         as_of=None) -> List[str]:
+        # metadata columns in `columns` (all when None) followed by the selected date columns
+        meta_columns, date_columns = split_columns(all_columns)
+        if columns is not None:
+            meta_columns = [column for column in meta_columns if column in columns]
+        return meta_columns + select_dates(date_columns, start, end, as_of)
+
+    @classmethod
+    def version(cls) -> Optional[str]:
+        """
+        Version of the data the backend reads, None before anything was loaded
+        """
+        backend = cls.backend()
+        if backend in cls.FILE_BACKENDS:
+            # newest modification time of the source csv files
+            mtimes = [os.path.getmtime(path) for path in map(cls.csv_path, cls.CSV_FILES) if os.path.exists(path)]
+            return datetime.utcfromtimestamp(max(mtimes)).strftime('%Y%m%dT%H%M%S%f') if mtimes else None
+        if backend == 'snapshot':
+            return Snapshot.current_version()
+        if backend == 'mongo':
+            return Watermark.version()
+
+        return Snapshot.current_version() or Watermark.version()
+
+    @classmethod
+    def uses_mongo(cls) -> bool:
+        return cls.backend() in ('auto', 'mongo')
+
+    @classmethod
+    def uses_snapshot(cls) -> bool:
+        return cls.backend() in ('auto', 'snapshot')
+
+    @classmethod
+    def csv_path(cls, collection: str) -> str:
+        return os.path.join(cls.DATA_DIR, cls.CSV_FILES[collection])
+
+    @classmethod
+    def _read_file(cls, collection: str, backend: str, columns: Optional[List[str]], start, end,
+                   as_of) -> pd.DataFrame:
+        path = cls.csv_path(collection)
+        # explicit dtypes for the time series (int32 dates), the stats keep pandas' inference
+        dtype = csv_dtypes(path) if collection.endswith('_ts') else None
+        # the header is enough to know which columns to read
+        usecols = cls.selected_columns(pd.read_csv(path, nrows=0).columns.tolist(), columns, start, end, as_of)
+        if backend == 'csv':
+            return pd.read_csv(path, usecols=usecols, dtype=dtype)
+
+        columnar = cls.convert(collection, backend, dtype)
+        if backend == 'parquet':
+            return pd.read_parquet(columnar, columns=usecols)
+        return pd.read_feather(columnar, columns=usecols)
+
+    @classmethod
+    def _read_mongo(cls, collection: str, columns: Optional[List[str]], start, end, as_of) -> pd.DataFrame:
+        # the loaded date columns are known from the ingest watermark (one document's fields for a collection
+        # loaded without one), so Mongo only sends the selected metadata and date fields
+        dates = Watermark.loaded_dates(collection)
+        if not dates:
+            dates = split_columns(list(Database.find_one(collection, {}) or {}))[1]
+        selected = select_dates(dates, start, end, as_of)
+        if columns is not None:
+            projection = {column: 1 for column in list(columns) + selected}
+        else:
+            # every metadata field, none of the other dates
+            projection = dict.fromkeys(set(dates) - set(selected), 0)
+
+        # '_id' is projected out in Mongo and documents are packed column-wise
+        df = Database.read_frame(collection, projection=projection)
+        all_columns = df.columns.tolist()
+        if dates:
+            # an ingest sets new date fields in place before it moves the watermark, only its dates are complete
+            meta_columns, loaded_columns = split_columns(all_columns)
+            loaded_columns = set(loaded_columns)
+            all_columns = meta_columns + [date for date in dates if date in loaded_columns]
+        return df.loc[:, cls.selected_columns(all_columns, columns, start, end, as_of)]
+
+    @classmethod
+    def convert(cls, collection: str, backend: str, dtype: Dict = None) -> str:
+        """
+        Columnar copy of a collection's csv file, rewritten when the csv file is newer
+        :return: path of the parquet or feather file
+        """
+        source = cls.csv_path(collection)
+        path = os.path.join(cls.COLUMNAR_DIR, '{}.{}'.format(collection, backend))
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source):
+            return path
+
+        os.makedirs(cls.COLUMNAR_DIR, exist_ok=True)
+        df = pd.read_csv(source, dtype=dtype)
+        # written next to the target and renamed, so a concurrent reader never opens half a file
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        if backend == 'parquet':
+            df.to_parquet(tmp_path, index=False)
+        else:
+            df.to_feather(tmp_path)
+        os.replace(tmp_path, path)
+        logging.info('converted %s to %s', source, path)
+        return path
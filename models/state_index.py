@@ -0,0 +1,72 @@
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class StateIndex:
+    """
+    Per-state partition of the county aggregate frame, built once per data version with the model frames.
+
+    counties: the county aggregate rows sorted by state name, so every state is one contiguous block
+    Per state: its row slice, main 2-digit FIPS, map center, county bounds and the color range of
+    every map metric, so per-state callbacks never scan every county.
+    """
+    METRICS = ['confirmed', 'deaths', 'Cases per 1000', 'Death Rate (%)',
+               'New Cases (7-day avg)', 'New Deaths (7-day avg)', 'New Cases per 100k (7-day avg)']
+
+    def __init__(self, df_counties_agg: pd.DataFrame, df_states_stats: pd.DataFrame):
+        self.counties = df_counties_agg.sort_values('State/Territory', kind='mergesort').reset_index(drop=True)
+
+        state_column = self.counties['State/Territory'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, state_column[1:] != state_column[:-1]]) if len(state_column) \
+            else np.array([], dtype=int)
+        ends = np.r_[starts[1:], len(state_column)].astype(int)
+        self._rows = {state_column[start]: slice(int(start), int(end)) for start, end in zip(starts, ends)}
+
+        # the state FIPS most counties of a state carry (a few rows are out-of-state or unassigned)
+        fips_counts = self.counties.groupby(['State/Territory', 'State FIPS']).size().reset_index(name='n')
+        fips_counts = fips_counts.sort_values(['State/Territory', 'n'], ascending=[True, False], kind='mergesort')
+        self._state_fips = fips_counts.drop_duplicates('State/Territory').set_index('State/Territory')['State FIPS'] \
+            .astype(int).to_dict()
+        self._state_fips['District of Columbia'] = 11
+
+        # color range per (state FIPS, metric), over the counties of that FIPS like the map's geojson
+        metrics = [metric for metric in self.METRICS if metric in self.counties.columns]
+        ranges = self.counties.groupby('State FIPS')[metrics].agg(['min', 'max'])
+        self._color_ranges = {(int(state_fips), metric): (row[(metric, 'min')], row[(metric, 'max')])
+                              for state_fips, row in ranges.iterrows() for metric in metrics}
+
+        # map center from the states stats, bounds from county coordinates that are set
+        self._centers = {state: (lat, lon) for state, lat, lon in
+                         df_states_stats.loc[:, ['State/Territory', 'lat', 'lon']].itertuples(index=False)}
+        located = self.counties[self.counties['Lat'] != 0]
+        bounds = located.groupby('State/Territory').agg(
+            lat_min=('Lat', 'min'), lat_max=('Lat', 'max'), lon_min=('Long_', 'min'), lon_max=('Long_', 'max'))
+        self._bounds = {state: tuple(row) for state, row in zip(bounds.index, bounds.itertuples(index=False))}
+
+    def rows(self, state_name: str) -> slice:
+        # contiguous rows of one state in self.counties, empty slice for unknown states
+        return self._rows.get(state_name, slice(0, 0))
+
+    def state_counties(self, state_name: str) -> pd.DataFrame:
+        return self.counties.iloc[self.rows(state_name)]
+
+    def state_fips(self, state_name: str) -> Optional[int]:
+        return self._state_fips.get(state_name)
+
+    def color_range(self, state_name: str, metric_name: str) -> Tuple:
+        return self._color_ranges.get((self.state_fips(state_name), metric_name), (None, None))
+
+    def center(self, state_name: str) -> Tuple:
+        # (lat, lon) of the state, (None, None) when it has no stats row
+        return self._centers.get(state_name, (None, None))
+
+    def bounds(self, state_name: str) -> Tuple:
+        # (lat_min, lat_max, lon_min, lon_max) of the state's located counties
+        return self._bounds.get(state_name, (None, None, None, None))
+
+    def summary(self) -> Dict[str, Dict]:
+        return {state: {'rows': (rows.start, rows.stop), 'state_fips': self.state_fips(state),
+                        'center': self.center(state), 'bounds': self.bounds(state)}
+                for state, rows in self._rows.items()}
@@ -1,6 +1,7 @@
 import os
-import pandas as pd
+import logging
 from common.database import Database
+from common.ingest import BatchWriter, read_csv_chunks
 
 # states and counties stats csv files
 files = {'counties_stats.csv': 'counties_stats',
@@ -10,15 +11,15 @@ files = {'counties_stats.csv': 'counties_stats',
 # one-time run to insert states and counties stats into Mongodb collections (counties_stats & states_stats)
 def stats_csv_to_mongo():
     path = os.path.join(os.getcwd(), 'data/stats')
-    print(path)
+    logging.info('loading stats from %s', path)
     for file, collection in files.items():
         Database.delete(collection)
 
-        data = pd.read_csv(os.path.join(path, file))
-        data_dict = data.to_dict('records')
-
-        Database.insert(collection, data_dict)
+        # streamed in chunks, inserted as unordered batches
+        with BatchWriter(collection) as writer:
+            read_csv_chunks(os.path.join(path, file), on_chunk=writer.insert_frame)
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     stats_csv_to_mongo()
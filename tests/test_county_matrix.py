@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.snapshot import Snapshot
+from models.county_matrix import CountyMatrix
+
+FRAMES = {
+    'confirmed': pd.DataFrame({'FIPS': [48201, 1001, 1003, 99999],
+                               'Province_State': ['Texas', 'Alabama', 'Alabama', 'Ship'],
+                               'Admin2': ['Harris', 'Autauga', 'Baldwin', 'Ship'],
+                               '1/30/21': [100, 10, 20, 1], '1/31/21': [200, 20, 40, 1], '2/1/21': [300, 30, 60, 1]}),
+    'deaths': pd.DataFrame({'FIPS': [1001, 1003, 48201, 99999],
+                            'Province_State': ['Alabama', 'Alabama', 'Texas', 'Ship'],
+                            'Admin2': ['Autauga', 'Baldwin', 'Harris', 'Ship'],
+                            'Population': [55869, 223234, 4713325, 0],
+                            '1/30/21': [1, 2, 10, 0], '1/31/21': [2, 4, 20, 0], '2/1/21': [3, 6, 30, 0]}),
+}
+
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch):
+    monkeypatch.setattr(Snapshot, 'ROOT', str(tmp_path))
+    monkeypatch.setattr(Snapshot, '_opened', {})
+
+
+def test_snapshot_round_trip_maps_the_matrices(snapshot):
+    built = CountyMatrix.from_frames(FRAMES['confirmed'], FRAMES['deaths'], excluded_state_fips=[99])
+    Snapshot.write(built.snapshot_frames())
+
+    mapped = CountyMatrix.from_snapshot()
+
+    pd.testing.assert_frame_equal(mapped.counties, built.counties)
+    assert mapped.dates.equals(built.dates)
+    assert mapped.state_names == ['Alabama', 'Texas']
+    np.testing.assert_array_equal(mapped.confirmed, built.confirmed)
+    np.testing.assert_array_equal(mapped.deaths, built.deaths)
+    # int32 views of the mapping, not private copies
+    values = Snapshot.open(CountyMatrix.SNAPSHOT['confirmed'])[3]
+    assert mapped.confirmed.dtype == np.int32 and np.shares_memory(mapped.confirmed, values)
+    assert not mapped.confirmed.flags.writeable and not mapped.deaths.flags.writeable
+
+
+def test_snapshot_date_range(snapshot):
+    built = CountyMatrix.from_frames(FRAMES['confirmed'], FRAMES['deaths'], excluded_state_fips=[99])
+    Snapshot.write(built.snapshot_frames())
+
+    mapped = CountyMatrix.from_snapshot(start='2021-01-31')
+
+    assert mapped.dates.tolist() == [pd.Timestamp('2021-01-31'), pd.Timestamp('2021-02-01')]
+    assert mapped.confirmed[:, 0].tolist() == [20, 40, 200]
+    assert mapped.daily('New Cases')[:, -1].tolist() == [10, 20, 100]
+
+
+def test_no_snapshot(snapshot):
+    assert CountyMatrix.from_snapshot() is None
+
+
+def growing_matrix() -> CountyMatrix:
+    # cumulative counts with irregular daily increments, two Alabama counties and one Texas county
+    dates = pd.date_range('2020-12-20', '2021-02-10')
+    increments = np.random.RandomState(0).randint(0, 50, size=(3, len(dates)))
+    counties = CountyMatrix.from_frames(FRAMES['confirmed'], FRAMES['deaths'], excluded_state_fips=[99]).counties
+    return CountyMatrix(counties, dates, increments.cumsum(axis=1).astype(np.int32),
+                        (increments // 10).cumsum(axis=1).astype(np.int32))
+
+
+@pytest.mark.parametrize('resolution', ['W', 'M'])
+def test_resample_sums_daily_counts_per_period(resolution):
+    matrix = growing_matrix()
+    # a picked range starting mid-period: the first period sums the picked days only
+    window = matrix.between('2020-12-30', '2021-02-09')
+
+    resampled = window.resample(resolution)
+
+    long = window.long_frame(metrics=['New Deaths', 'New Deaths (7-day avg)'])
+    periods = long['Date'].dt.to_period(resolution)
+    expected = long.groupby([periods, 'FIPS'])['New Deaths'].sum().unstack().to_numpy().T
+    np.testing.assert_allclose(resampled.daily('New Deaths'), expected)
+    # the moving means keep the value of the period's last day
+    last_days = long.groupby([periods, 'FIPS'])['New Deaths (7-day avg)'].last().unstack().to_numpy().T
+    np.testing.assert_allclose(resampled.daily('New Deaths (7-day avg)'), last_days)
+    assert resampled.dates.tolist() == long.groupby(periods)['Date'].max().tolist()
@@ -0,0 +1,117 @@
+import mongomock
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.database import Database
+from models.county_matrix import CountyMatrix
+from models.covid_daily import CovidDaily
+
+COUNTIES = pd.DataFrame({'State FIPS': [1, 1, 48],
+                         'FIPS': [1001, 1003, 48201],
+                         'State/Territory': ['Alabama', 'Alabama', 'Texas'],
+                         'County': ['Autauga', 'Baldwin', 'Harris'],
+                         'County-State': ['Autauga, Alabama', 'Baldwin, Alabama', 'Harris, Texas'],
+                         'Population': [55869, 223234, 4713325]})
+
+
+def county_matrix(end='2021-02-02') -> CountyMatrix:
+    # three counties of two states from the last days of December to `end`, across two month rollovers
+    dates = pd.date_range('2020-12-30', end)
+    confirmed = np.array([[10 * (day + 1), 20 * (day + 1), 100 * (day + 1)] for day in range(len(dates))],
+                         dtype=np.int32).T
+    return CountyMatrix(COUNTIES, dates, confirmed, confirmed // 10)
+
+
+@pytest.fixture
+def database():
+    Database.set_client(mongomock.MongoClient('mongodb://localhost/covid'))
+    yield Database.database()
+    Database.set_client(None)
+
+
+def test_buckets_split_at_month_rollover():
+    requests = CovidDaily.bucket_requests(county_matrix())
+    buckets = {request._doc['_id']: request._doc for request in requests}
+
+    assert sorted(buckets) == ['01001-2020-12', '01001-2021-01', '01001-2021-02',
+                               '01003-2020-12', '01003-2021-01', '01003-2021-02',
+                               '48201-2020-12', '48201-2021-01', '48201-2021-02']
+    assert [date.day for date in buckets['01001-2020-12']['dates']] == [30, 31]
+    assert len(buckets['01001-2021-01']['dates']) == 31
+    assert [date.day for date in buckets['01001-2021-02']['dates']] == [1, 2]
+    assert buckets['01001-2021-02']['month'] == pd.Timestamp('2021-02-01')
+    # the first days of a month continue the cumulative counts of the month before
+    assert buckets['48201-2020-12']['confirmed'] == [100, 200]
+    assert buckets['48201-2021-02']['confirmed'] == [3400, 3500]
+    assert buckets['48201-2021-02']['deaths'] == [340, 350]
+
+
+def test_buckets_since_replace_the_new_months_only():
+    # the first new date of a daily ingest selects the buckets of its month and later
+    requests = CovidDaily.bucket_requests(county_matrix(), since=pd.Timestamp('2021-01-31'))
+    assert sorted({request._doc['month'].month for request in requests}) == [1, 2]
+
+    requests = CovidDaily.bucket_requests(county_matrix(), since=pd.Timestamp('2021-02-01'))
+    assert {request._doc['_id'][-7:] for request in requests} == {'2021-02'}
+
+
+def test_latest_counties(database):
+    CovidDaily.write_buckets(county_matrix())
+
+    df = CovidDaily.latest_counties()
+
+    assert df['FIPS'].tolist() == [1001, 1003, 48201]
+    assert (df['Date'] == pd.Timestamp('2021-02-02')).all()
+    assert df['confirmed'].tolist() == [350, 700, 3500]
+    assert df['deaths'].tolist() == [35, 70, 350]
+
+    texas = CovidDaily.latest_counties(state_fips=48)
+    assert texas['County'].tolist() == ['Harris'] and texas['confirmed'].tolist() == [3500]
+
+
+def test_latest_counties_after_a_daily_ingest(database):
+    CovidDaily.write_buckets(county_matrix(end='2021-01-31'))
+    assert (CovidDaily.latest_counties()['Date'] == pd.Timestamp('2021-01-31')).all()
+
+    # the first day of a month starts a new bucket, the older buckets stay as they are
+    CovidDaily.write_buckets(county_matrix(end='2021-02-01'), since=pd.Timestamp('2021-02-01'))
+
+    df = CovidDaily.latest_counties()
+    assert (df['Date'] == pd.Timestamp('2021-02-01')).all()
+    assert df['confirmed'].tolist() == [340, 680, 3400]
+    assert database[CovidDaily.COLLECTION].count_documents({}) == 9
+
+
+def test_latest_counties_empty(database):
+    df = CovidDaily.latest_counties()
+    assert df.empty and 'confirmed' in df.columns
+
+
+def test_state_ts_aggregates_to_the_state_totals(database):
+    matrix = county_matrix()
+    CovidDaily.write_buckets(matrix)
+
+    df = CovidDaily.state_ts(1, start='2020-12-31', end='2021-02-01')
+
+    # the partial first and last month buckets are trimmed to the range
+    assert df['Date'].min() == pd.Timestamp('2020-12-31') and df['Date'].max() == pd.Timestamp('2021-02-01')
+    assert set(df['County']) == {'Autauga', 'Baldwin'}
+    assert len(df) == 2 * 33
+
+    totals = df.groupby('Date')[['Confirmed Cases', 'Deaths']].sum()
+    window = matrix.between('2020-12-31', '2021-02-01')
+    confirmed, deaths = window.state_totals()
+    state = window.state_names.index('Alabama')
+    assert totals['Confirmed Cases'].tolist() == confirmed[state].tolist()
+    assert totals['Deaths'].tolist() == deaths[state].tolist()
+
+
+def test_state_ts_every_date(database):
+    CovidDaily.write_buckets(county_matrix())
+
+    df = CovidDaily.state_ts(48)
+
+    assert df['Date'].tolist() == list(pd.date_range('2020-12-30', '2021-02-02'))
+    assert df['Confirmed Cases'].tolist() == [100 * (day + 1) for day in range(35)]
+    assert CovidDaily.state_ts(6).empty
@@ -0,0 +1,52 @@
+import mongomock
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.database import Database
+
+
+@pytest.fixture
+def database():
+    Database.set_client(mongomock.MongoClient('mongodb://localhost/covid'))
+    yield Database.database()
+    Database.set_client(None)
+
+
+def test_documents_to_frame_packs_numeric_fields():
+    df = Database.documents_to_frame([{'FIPS': 1001, 'Admin2': 'Autauga', 'Lat': 32.5, '1/22/20': 0},
+                                      {'FIPS': 1003, 'Admin2': 'Baldwin', 'Lat': 30.7, '1/22/20': 2}])
+
+    assert df.columns.tolist() == ['FIPS', 'Admin2', 'Lat', '1/22/20']
+    assert df.dtypes.tolist() == [np.int64, object, np.float64, np.int64]
+
+
+def test_documents_to_frame_keeps_mixed_values():
+    # an int then a float is a float column, never a truncated int
+    df = Database.documents_to_frame([{'a': 1, 'b': 1.5, 'c': 1, 'd': True},
+                                      {'a': 2.9, 'b': 2, 'c': 'x', 'd': False}])
+
+    assert df['a'].tolist() == [1.0, 2.9] and df['a'].dtype == np.float64
+    assert df['b'].tolist() == [1.5, 2.0] and df['b'].dtype == np.float64
+    assert df['c'].tolist() == [1, 'x'] and df['c'].dtype == object
+    assert df['d'].tolist() == [True, False]
+
+
+def test_documents_to_frame_with_different_fields():
+    # same number of fields, different keys: union of the fields
+    df = Database.documents_to_frame([{'a': 1, 'b': 2}, {'a': 3, 'c': 4}])
+
+    assert df.columns.tolist() == ['a', 'b', 'c']
+    assert df['b'].isnull().tolist() == [False, True] and df['c'].isnull().tolist() == [True, False]
+
+
+def test_read_frame_packs_every_batch(database):
+    database['stats'].insert_many([{'State': 'state {}'.format(i), 'Population': i if i < 5 else i + 0.5}
+                                   for i in range(12)])
+
+    df = Database.read_frame('stats', batch_size=5)
+
+    assert df.columns.tolist() == ['State', 'Population']
+    assert len(df) == 12 and df.index.tolist() == list(range(12))
+    pd.testing.assert_series_equal(df['Population'], pd.Series([i if i < 5 else i + 0.5 for i in range(12)],
+                                                                name='Population'))
@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from common.download import Downloader
+
+BODY = b'FIPS,Admin2,1/22/20\n' + b''.join(b'%d,county %d,%d\n' % (i, i, i) for i in range(1000))
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    """
+    Serves server.file ({'body', 'etag'}) at any path with ETag validators, 304s and If-Range/Range resumes,
+    and records the headers of every request in server.requests
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        body, etag = self.server.file['body'], self.server.file['etag']
+
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        status, start = 200, 0
+        if self.headers.get('Range') and self.headers.get('If-Range') == etag:
+            status, start = 206, int(self.headers['Range'][len('bytes='):-1])
+        self.send_response(status)
+        self.send_header('ETag', etag)
+        if status == 206:
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, len(body) - 1, len(body)))
+        self.send_header('Content-Length', str(len(body) - start))
+        self.end_headers()
+        self.wfile.write(body[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(Downloader, '_session', None)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FileHandler)
+    server.file = {'body': BODY, 'etag': '"v1"'}
+    server.requests = []
+    server.url = 'http://127.0.0.1:{}/time_series.csv'.format(server.server_address[1])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_not_modified(server, tmp_path):
+    path = str(tmp_path / 'time_series.csv')
+
+    assert Downloader.download(server.url, path)
+    assert read(path) == BODY
+    assert not os.path.exists(path + '.part')
+
+    # the stored ETag comes back as If-None-Match: 304, the file is left alone
+    assert not Downloader.download(server.url, path)
+    assert server.requests[-1]['If-None-Match'] == '"v1"'
+    assert read(path) == BODY
+
+
+def test_resume_part_file(server, tmp_path):
+    path = str(tmp_path / 'time_series.csv')
+    # an interrupted download: half of the body and the validator of the file it is a part of
+    with open(path + '.part', 'wb') as f:
+        f.write(BODY[:len(BODY) // 2])
+    with open(path + '.part.json', 'w') as f:
+        json.dump({'etag': '"v1"', 'last_modified': None}, f)
+
+    assert Downloader.download(server.url, path)
+
+    assert server.requests[-1]['Range'] == 'bytes={}-'.format(len(BODY) // 2)
+    assert server.requests[-1]['If-Range'] == '"v1"'
+    assert read(path) == BODY
+    assert not os.path.exists(path + '.part') and not os.path.exists(path + '.part.json')
+    with open(path + '.meta.json') as f:
+        assert json.load(f)['etag'] == '"v1"'
+
+
+def test_resume_part_file_of_a_changed_file(server, tmp_path):
+    path = str(tmp_path / 'time_series.csv')
+    with open(path + '.part', 'wb') as f:
+        f.write(BODY[:len(BODY) // 2])
+    with open(path + '.part.json', 'w') as f:
+        json.dump({'etag': '"v0"', 'last_modified': None}, f)
+
+    # If-Range does not match the file anymore: the server sends all of it and the part file starts over
+    assert Downloader.download(server.url, path)
+
+    assert server.requests[-1]['If-Range'] == '"v0"'
+    assert read(path) == BODY
+
+
+def test_same_content_is_unchanged(server, tmp_path):
+    path = str(tmp_path / 'time_series.csv')
+    assert Downloader.download(server.url, path)
+    inode = os.stat(path).st_ino
+
+    # a new ETag on the same bytes (a regenerated file): a 200 whose sha256 matches the stored one
+    server.file['etag'] = '"v2"'
+    assert not Downloader.download(server.url, path)
+
+    assert server.requests[-1]['If-None-Match'] == '"v1"'
+    assert os.stat(path).st_ino == inode and read(path) == BODY
+    assert not os.path.exists(path + '.part') and not os.path.exists(path + '.part.json')
+    with open(path + '.meta.json') as f:
+        assert json.load(f)['etag'] == '"v2"'
+
+
+def test_download_all_reports_changed_paths(server, tmp_path):
+    first, second = str(tmp_path / 'first.csv'), str(tmp_path / 'second.csv')
+    assert sorted(Downloader.download_all({first: server.url, second: server.url})) == [first, second]
+    assert Downloader.download_all({first: server.url, second: server.url}) == []
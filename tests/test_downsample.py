@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.downsample import resample_frame
+
+
+def states_frame() -> pd.DataFrame:
+    dates = pd.date_range('2020-12-30', '2021-02-09')
+    deaths = np.random.RandomState(1).randint(0, 300, size=(2, len(dates))).cumsum(axis=1)
+    new_deaths = np.diff(deaths, prepend=np.nan)
+    return pd.DataFrame({'State/Territory': np.repeat(['Alabama', 'Texas'], len(dates)),
+                         'Date': np.tile(dates, 2),
+                         'Deaths': deaths.ravel(),
+                         'New Deaths': new_deaths.ravel()})
+
+
+@pytest.mark.parametrize('resolution', ['W', 'M'])
+def test_resample_frame_sums_daily_counts(resolution):
+    df = states_frame()
+
+    resampled = resample_frame(df, 'Date', resolution, 'State/Territory', ['New Deaths'])
+
+    periods = df['Date'].dt.to_period(resolution)
+    expected = df.groupby(['State/Territory', periods])['New Deaths'].sum()
+    assert resampled['New Deaths'].tolist() == expected.tolist()
+    # cumulative series keep the value of the period's last day
+    assert resampled['Deaths'].tolist() == df.groupby(['State/Territory', periods])['Deaths'].last().tolist()
+    assert resampled['Date'].tolist() == df.groupby(['State/Territory', periods])['Date'].max().tolist()
+
+
+def test_resample_frame_daily_keeps_every_row():
+    df = states_frame()
+    assert resample_frame(df, 'Date', 'D', 'State/Territory', ['New Deaths']) is df
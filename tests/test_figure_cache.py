@@ -0,0 +1,105 @@
+import flask
+import flask_caching
+import pytest
+
+from common.cache import FigureCache
+from common.instrumentation import CallbackMetrics
+
+# flask-caching 1.x (pinned) names its backends by factory function, 2.x by class
+FILESYSTEM = 'FileSystemCache' if int(flask_caching.__version__.split('.')[0]) >= 2 else 'filesystem'
+
+
+@pytest.fixture
+def figure_cache(tmp_path, monkeypatch):
+    """
+    FigureCache on a filesystem backend in a temp dir, with a data version the test sets
+    """
+    monkeypatch.setitem(FigureCache.CONFIG, 'CACHE_TYPE', FILESYSTEM)
+    monkeypatch.setitem(FigureCache.CONFIG, 'CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(FigureCache, 'PREBUILT_DIR', str(tmp_path / 'prebuilt'))
+    monkeypatch.setattr(FigureCache, 'cache', FigureCache.cache.__class__())
+    monkeypatch.setattr(FigureCache, '_local', FigureCache._local.__class__())
+    monkeypatch.setattr(FigureCache, '_local_version', None)
+    monkeypatch.setattr(FigureCache, '_prebuilt', {})
+    monkeypatch.setattr(FigureCache, 'stats', dict.fromkeys(FigureCache.stats, 0))
+
+    data = {'version': 'v1', 'version_reads': 0}
+
+    def version():
+        data['version_reads'] += 1
+        return data['version']
+
+    FigureCache.init_app(flask.Flask(__name__), version=version)
+    return data
+
+
+def test_init_app_does_not_read_the_data_version(figure_cache):
+    assert figure_cache['version_reads'] == 0
+
+
+def test_hit_miss_and_version_invalidation(figure_cache):
+    calls = []
+
+    @FigureCache.memoize(ignore=['n_clicks'])
+    def figure(n_clicks, metric):
+        calls.append(metric)
+        return {'data': [{'y': [1, 2, 3]}], 'layout': {'title': metric}}
+
+    # miss: built and stored
+    assert figure(1, 'deaths')['layout']['title'] == 'deaths'
+    assert calls == ['deaths'] and FigureCache.stats['misses'] == 1
+
+    # hit in the worker's LRU, n_clicks is not part of the key
+    assert figure(2, 'deaths') == figure(1, 'deaths')
+    assert calls == ['deaths'] and FigureCache.stats['local_hits'] == 2
+
+    # hit in the shared backend, as another worker would see it
+    FigureCache._local.clear()
+    assert figure(1, 'deaths')['data'][0]['y'] == [1, 2, 3]
+    assert calls == ['deaths'] and FigureCache.stats['shared_hits'] == 1
+
+    # another argument is another key
+    figure(1, 'confirmed')
+    assert calls == ['deaths', 'confirmed']
+
+    # new data version: every figure is built again
+    figure_cache['version'] = 'v2'
+    figure(1, 'deaths')
+    assert calls == ['deaths', 'confirmed', 'deaths'] and FigureCache.stats['misses'] == 3
+
+
+def test_prebuilt_payloads_are_read_for_their_version(figure_cache):
+    @FigureCache.memoize()
+    def figure(metric):
+        raise AssertionError('prebuilt figures are not built')
+
+    key = figure.cache_key('deaths', version='v1')
+    FigureCache.write_prebuilt('v1', [(key, '{"data": [], "layout": {"title": "prebuilt"}}')])
+
+    assert figure('deaths')['layout']['title'] == 'prebuilt'
+    assert FigureCache.stats['prebuilt_hits'] == 1
+
+
+def test_callback_time_is_cached_only_on_a_hit(figure_cache, monkeypatch):
+    monkeypatch.setattr(CallbackMetrics, 'METRICS_DIR', None)
+    monkeypatch.setattr(CallbackMetrics, '_callbacks', {})
+
+    @FigureCache.memoize()
+    def figure(metric):
+        return {'data': [], 'layout': {'title': metric}}
+
+    @CallbackMetrics.wrap
+    def update_figure(*metrics):
+        return [figure(metric) for metric in metrics]
+
+    # a miss builds the figure, also without any marked phase
+    update_figure('deaths')
+    assert set(CallbackMetrics._callbacks['update_figure']['phases']) == {'figure'}
+
+    update_figure('deaths')
+    assert set(CallbackMetrics._callbacks['update_figure']['phases']) == {'figure', 'cached'}
+
+    # one miss among hits is still figure building
+    cached_seconds = CallbackMetrics._callbacks['update_figure']['phases']['cached']
+    update_figure('deaths', 'confirmed')
+    assert CallbackMetrics._callbacks['update_figure']['phases']['cached'] == cached_seconds
@@ -0,0 +1,75 @@
+import mongomock
+import pandas as pd
+import pytest
+
+from common.database import Database
+from common.ingest import Watermark
+from covid_csv_to_mongo import append_requests
+from models.source import DataSource
+
+META_COLUMNS = ['UID', 'FIPS', 'Admin2', 'Province_State']
+
+
+@pytest.fixture
+def database(monkeypatch):
+    monkeypatch.setattr(DataSource, 'BACKEND', 'mongo')
+    Database.set_client(mongomock.MongoClient('mongodb://localhost/covid'))
+    yield Database.database()
+    Database.set_client(None)
+
+
+def chunk(dates):
+    return pd.DataFrame([{'UID': 84001001, 'FIPS': 1001, 'Admin2': 'Autauga', 'Province_State': 'Alabama',
+                          **{date: 10 * (i + 1) for i, date in enumerate(dates)}},
+                         {'UID': 84001003, 'FIPS': 1003, 'Admin2': 'Baldwin', 'Province_State': 'Alabama',
+                          **{date: 20 * (i + 1) for i, date in enumerate(dates)}}])
+
+
+def test_append_is_idempotent(database):
+    database['confirmed_ts'].insert_one(chunk(['1/30/21']).iloc[0].to_dict())
+    Watermark.set('confirmed_ts', ['1/30/21'])
+
+    # an interrupted append applied again leaves the same documents
+    for _ in range(2):
+        Database.bulk_write('confirmed_ts', append_requests(chunk(['1/30/21', '1/31/21']), META_COLUMNS,
+                                                            ['1/31/21'], {84001001}))
+
+    documents = list(database['confirmed_ts'].find({}, {'_id': 0}, sort=[('UID', 1)]))
+    assert [document['UID'] for document in documents] == [84001001, 84001003]
+    assert [document['1/31/21'] for document in documents] == [20, 40]
+    # a county new to the collection gets its whole document
+    assert documents[1]['1/30/21'] == 20
+
+
+def test_readers_skip_dates_set_before_the_watermark(database):
+    database['confirmed_ts'].insert_many(chunk(['1/30/21']).to_dict('records'))
+    Watermark.set('confirmed_ts', ['1/30/21'])
+
+    # half of an append: one document has the new date, the watermark does not list it yet
+    database['confirmed_ts'].update_one({'UID': 84001001}, {'$set': {'1/31/21': 20}})
+
+    assert DataSource.read('confirmed_ts').columns.tolist() == ['FIPS', 'Admin2', 'Province_State', '1/30/21']
+    assert DataSource.read('confirmed_ts', columns=META_COLUMNS, start='2021-01-01').columns.tolist() == [
+        'UID', 'FIPS', 'Admin2', 'Province_State', '1/30/21']
+
+    Watermark.set('confirmed_ts', ['1/30/21', '1/31/21'])
+    assert DataSource.read('confirmed_ts', as_of='latest').columns.tolist()[-1] == '1/31/21'
+
+
+def test_readers_project_the_selected_fields(database, monkeypatch):
+    database['confirmed_ts'].insert_many(chunk(['1/30/21', '1/31/21']).to_dict('records'))
+    projections = []
+    read_frame = Database.read_frame
+
+    def recording_read_frame(collection, query=None, projection=None, **kwargs):
+        projections.append(projection)
+        return read_frame(collection, query, projection, **kwargs)
+
+    monkeypatch.setattr(Database, 'read_frame', recording_read_frame)
+
+    # without a watermark the dates come from one document; the metadata fields are always projected
+    DataSource.read('confirmed_ts', columns=['FIPS'])
+    Watermark.set('confirmed_ts', ['1/30/21', '1/31/21'])
+    DataSource.read('confirmed_ts', columns=['FIPS'], as_of='latest')
+
+    assert projections == [{'FIPS': 1, '1/30/21': 1, '1/31/21': 1}, {'FIPS': 1, '1/31/21': 1}]
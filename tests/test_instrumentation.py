@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from common.instrumentation import CallbackMetrics
+
+
+@pytest.fixture
+def metrics(tmp_path, monkeypatch):
+    monkeypatch.setattr(CallbackMetrics, 'METRICS_DIR', str(tmp_path))
+    monkeypatch.setattr(CallbackMetrics, 'METRICS_FLUSH_SECONDS', 0)
+    monkeypatch.setattr(CallbackMetrics, '_callbacks', {})
+    monkeypatch.setattr(CallbackMetrics, '_file', None)
+    monkeypatch.setattr(CallbackMetrics, '_file_pid', None)
+
+
+def observe(name, seconds):
+    CallbackMetrics._observe({'callback': name, 'seconds': seconds, 'phases': {'figure': seconds}, 'bytes': 100})
+
+
+def test_per_worker_without_metrics_dir(monkeypatch):
+    monkeypatch.setattr(CallbackMetrics, '_callbacks', {})
+    observe('update_map', 0.02)
+
+    text = CallbackMetrics.prometheus()
+    assert 'dash_callback_duration_seconds_count{{callback="update_map",pid="{}"}} 1'.format(os.getpid()) in text
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_metrics_dir_sums_every_worker(metrics):
+    observe('update_map', 0.02)
+
+    # another worker forked from this one: it counts its own calls into its own file
+    pid = os.fork()
+    if pid == 0:
+        try:
+            CallbackMetrics._callbacks = {}
+            observe('update_map', 0.2)
+            observe('update_table', 3.0)
+        finally:
+            os._exit(0)
+    os.waitpid(pid, 0)
+
+    text = CallbackMetrics.prometheus()
+
+    assert len(os.listdir(CallbackMetrics.METRICS_DIR)) == 2
+    assert 'dash_callback_duration_seconds_count{callback="update_map"} 2' in text
+    assert 'dash_callback_duration_seconds_bucket{callback="update_map",le="0.025"} 1' in text
+    assert 'dash_callback_duration_seconds_bucket{callback="update_map",le="0.25"} 2' in text
+    assert 'dash_callback_duration_seconds_count{callback="update_table"} 1' in text
+    assert 'dash_callback_response_bytes_total{callback="update_map"} 200' in text
+    assert 'pid=' not in text
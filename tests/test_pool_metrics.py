@@ -0,0 +1,21 @@
+from common.pool_metrics import PoolMetrics
+
+
+class Event:
+    reason = 'timeout'
+
+
+def test_after_fork_does_not_acquire_the_lock():
+    metrics = PoolMetrics()
+    metrics.connection_check_out_started(Event())
+    metrics.connection_checked_out(Event())
+    metrics.connection_check_out_failed(Event())
+
+    # a thread of the parent held the lock while forking: the child must not wait for it
+    metrics._lock.acquire()
+    metrics.after_fork()
+
+    snapshot = metrics.snapshot()
+    assert snapshot['checkouts'] == 0 and snapshot['checked_out'] == 0 and snapshot['checkout_failures'] == {}
+    metrics.connection_checked_out(Event())
+    assert metrics.snapshot()['checkouts'] == 1
@@ -0,0 +1,91 @@
+import os
+import shutil
+
+import mongomock
+import pandas as pd
+import pytest
+
+from common.database import Database
+from common.ingest import csv_dtypes
+from common.snapshot import Snapshot, split_columns
+from models.covid_counties import CovidCounties
+from models.pipeline import ModelPipeline
+from models.source import DataSource
+
+BUNDLED_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+BACKENDS = ['csv', 'parquet', 'feather', 'snapshot', 'auto']
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # the bundled csv files in a temp dir; only the deaths file is bundled, the confirmed file is
+    # the same layout without the Population column
+    for collection, file in DataSource.CSV_FILES.items():
+        os.makedirs(str(tmp_path / os.path.dirname(file)), exist_ok=True)
+        if collection != 'confirmed_ts':
+            shutil.copy(os.path.join(BUNDLED_DIR, file), str(tmp_path / file))
+    deaths = pd.read_csv(str(tmp_path / DataSource.CSV_FILES['deaths_ts']))
+    deaths.drop(['Population'], axis=1).to_csv(str(tmp_path / DataSource.CSV_FILES['confirmed_ts']), index=False)
+
+    monkeypatch.setattr(DataSource, 'DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(DataSource, 'COLUMNAR_DIR', str(tmp_path / 'columnar'))
+    monkeypatch.setattr(Snapshot, 'ROOT', str(tmp_path / 'snapshot'))
+    monkeypatch.setattr(Snapshot, '_opened', {})
+    monkeypatch.setattr(ModelPipeline, 'START', None)
+    return tmp_path
+
+
+@pytest.fixture
+def database():
+    Database.set_client(mongomock.MongoClient('mongodb://localhost/covid'))
+    yield Database.database()
+    Database.set_client(None)
+
+
+def use_backend(backend, monkeypatch):
+    if backend in ('parquet', 'feather'):
+        pytest.importorskip('pyarrow')
+    monkeypatch.setattr(DataSource, 'BACKEND', backend)
+    if backend not in ('snapshot', 'auto'):
+        return
+
+    # the time series snapshot an ingest writes, with the county matrices in matrix order
+    paths = {collection: DataSource.csv_path(collection) for collection in ('confirmed_ts', 'deaths_ts')}
+    frames = {collection: pd.read_csv(path, dtype=csv_dtypes(path)) for collection, path in paths.items()}
+    county_matrix = CovidCounties.ts_matrix_counties(frames['confirmed_ts'], frames['deaths_ts'])
+    Snapshot.write(dict(frames, **county_matrix.snapshot_frames()))
+
+    if backend == 'auto':
+        # 'auto' reads the stats the snapshot does not hold from MongoDB
+        for collection in ('states_stats', 'counties_stats'):
+            Database.insert(collection, pd.read_csv(DataSource.csv_path(collection)).to_dict('records'))
+
+
+@pytest.fixture
+def csv_frames(data_dir, monkeypatch):
+    monkeypatch.setattr(DataSource, 'BACKEND', 'csv')
+    pipeline = ModelPipeline()
+    return {name: pipeline.get(name) for name in ('states_ts', 'counties_agg')}
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_backends_build_the_same_frames(backend, csv_frames, database, monkeypatch):
+    use_backend(backend, monkeypatch)
+
+    pipeline = ModelPipeline()
+
+    for name, expected in csv_frames.items():
+        pd.testing.assert_frame_equal(pipeline.get(name), expected)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_start_prunes_the_date_columns(backend, data_dir, database, monkeypatch):
+    use_backend(backend, monkeypatch)
+    all_dates = split_columns(pd.read_csv(DataSource.csv_path('confirmed_ts'), nrows=0).columns.tolist())[1]
+
+    df = DataSource.read('confirmed_ts', start='2021-01-01')
+
+    meta_columns, date_columns = split_columns(df.columns.tolist())
+    assert meta_columns == DataSource.COLUMNS['confirmed_ts']
+    assert date_columns == [date for date in all_dates if pd.Timestamp(date) >= pd.Timestamp('2021-01-01')]
+    assert len(date_columns) < len(all_dates)
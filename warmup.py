@@ -0,0 +1,107 @@
+import os
+import time
+import json
+import logging
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import plotly
+import dash_core_components as dcc
+
+# build the model frames on import, before the render processes fork
+os.environ.setdefault('DATA_PRELOAD', 'fork')
+
+from common.cache import FigureCache
+from index import app
+from apps import app_counties, app_states
+
+
+def memoized_callback(callback: Callable) -> Optional[Callable]:
+    # the FigureCache.memoize wrapper under the dash callback wrapper, None for uncached callbacks
+    while callback is not None and not hasattr(callback, 'cache_key'):
+        callback = getattr(callback, '__wrapped__', None)
+    return callback
+
+
+def layout_domains(layouts: List) -> Dict[Tuple[str, str], List]:
+    """
+    Every value a callback input can take, read from the layouts: all options of a dropdown's value,
+    the initial value of any other property (e.g. a button's n_clicks)
+    :return: {(component id, property): [values]}
+    """
+    domains = {}
+    for layout in layouts:
+        for component in layout._traverse():
+            component_id = getattr(component, 'id', None)
+            if component_id is None:
+                continue
+            if isinstance(component, dcc.Dropdown):
+                domains[(component_id, 'value')] = [option['value'] for option in component.options]
+            for prop in component._prop_names:
+                domains.setdefault((component_id, prop), [getattr(component, prop, None)])
+
+    return domains
+
+
+def warmup_tasks(version: str) -> List[Tuple[str, Tuple, str]]:
+    """
+    :return: (output, callback arguments, cache key) for every input combination of every cached callback
+    """
+    domains = layout_domains([app_counties.serve_layout(), app_states.serve_layout()])
+
+    tasks = []
+    for output, spec in app.callback_map.items():
+        # clientside callbacks have no server function
+        callback = memoized_callback(spec.get('callback'))
+        if callback is None:
+            continue
+
+        arguments = [domains.get((dependency['id'], dependency['property']), [None])
+                     for dependency in spec['inputs'] + spec.get('state', [])]
+        keys = set()
+        for args in itertools.product(*arguments):
+            # arguments left out of the key (n_clicks) would render the same figure twice
+            key = callback.cache_key(*args, version=version)
+            if key not in keys:
+                keys.add(key)
+                tasks.append((output, args, key))
+
+    return tasks
+
+
+def render(task: Tuple[str, Tuple, str]) -> Tuple[str, str]:
+    output, args, key = task
+    callback = memoized_callback(app.callback_map[output]['callback'])
+    payload = json.dumps(callback.__wrapped__(*args), cls=plotly.utils.PlotlyJSONEncoder)
+    return key, payload
+
+
+def warmup(workers: int = None) -> int:
+    """
+    Render every cached figure and datatable of the current data version and write them to the
+    prebuilt artifact that dashboard workers serve from.
+    :param workers: processes rendering figures, os.cpu_count() if None
+    :return: number of payloads written
+    """
+    version = FigureCache.data_version()
+    tasks = warmup_tasks(version)
+    logging.info('prebuilding %s figures for data version %s', len(tasks), version)
+
+    start = time.perf_counter()
+    # workers are forked after the model frames are built, so every render reads the same data
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        written = FigureCache.write_prebuilt(version, executor.map(render, tasks, chunksize=4))
+
+    logging.info('prebuilt %s figures in %.1fs', written, time.perf_counter() - start)
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prebuild every dashboard figure for the current data version.')
+    parser.add_argument('--workers', type=int, default=None, help='render processes (default: one per CPU)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    warmup(args.workers)